@@ -0,0 +1,22 @@
+# gunicorn.conf.py
+#
+# Picked up automatically by gunicorn (see Procfile). Only needed for the
+# multiprocess metrics mode (PROMETHEUS_MULTIPROC_DIR, see main/metrics.py).
+
+import os
+import shutil
+
+
+def on_starting(server):
+    # Start every deploy from empty metric files
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
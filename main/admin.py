@@ -6,7 +6,10 @@ from .models import (
     UserProfile,
     MembershipPlan,
     UserMembership,
-    Invite
+    Invite,
+    EmailOutbox,
+    StripeEvent,
+    StripeSubscription,
 )
 
 @admin.register(PendingSessionRequest)
@@ -35,6 +38,8 @@ class BookedSessionAdmin(admin.ModelAdmin):
     )
     list_filter = ("status", "booked_date", "created_at")
     search_fields = ("booked_by__username",)
+    # booked_by is nullable, so the changelist wouldn't join it on its own
+    list_select_related = ("booked_by",)
 
 
 # If you still have a separate Operator table, uncomment these:
@@ -56,7 +61,7 @@ class UserProfileAdmin(admin.ModelAdmin):
 
 @admin.register(MembershipPlan)
 class MembershipPlanAdmin(admin.ModelAdmin):
-    list_display = ("name", "stripe_product_id")
+    list_display = ("name", "stripe_product_id", "stripe_price_id", "price_synced_at")
     search_fields = ("name",)
 
 
@@ -65,6 +70,15 @@ class UserMembershipAdmin(admin.ModelAdmin):
     list_display = ("user", "plan", "active", "credits", "start_date", "end_date")
     list_filter = ("active", "start_date", "end_date")
     search_fields = ("user__username", "plan__name")
+    # one-to-one fields aren't joined automatically
+    list_select_related = ("user", "plan")
+
+
+@admin.register(StripeSubscription)
+class StripeSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ("subscription_id", "customer_id", "status", "current_period_end", "cancel_at_period_end", "updated_at")
+    list_filter = ("status", "cancel_at_period_end")
+    search_fields = ("subscription_id", "customer_id")
 
 
 @admin.register(Invite)
@@ -73,3 +87,19 @@ class InviteAdmin(admin.ModelAdmin):
     list_filter = ("role", "is_used", "expires_at")
     search_fields = ("email", "token")
     readonly_fields = ("token",)
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ("subject", "status", "attempts", "next_attempt_at", "created_at", "sent_at")
+    list_filter = ("status", "created_at")
+    search_fields = ("subject", "to")
+    readonly_fields = ("created_at", "sent_at", "last_error")
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "event_type", "status", "attempts", "processing_ms", "received_at", "processed_at")
+    list_filter = ("status", "event_type")
+    search_fields = ("event_id", "subscription_id")
+    readonly_fields = ("payload", "received_at", "processed_at", "processing_ms", "last_error")
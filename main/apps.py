@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .instrumentation import install_query_timer, install_stripe_timer
+
+        # Per-request query, Stripe and SMTP timing (see instrumentation.py)
+        connection_created.connect(install_query_timer, dispatch_uid="main.query_timer")
+        install_stripe_timer()
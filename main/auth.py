@@ -0,0 +1,89 @@
+# main/auth.py
+#
+# Loads the signed-in user together with their profile and membership in one
+# query, and exposes a small access snapshot that views and decorators read
+# instead of touching user.profile / user.usermembership separately.
+
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+
+ROLE_PRIORITY = {
+    'public': 1,
+    'member': 2,
+    'operator': 3,
+    'admin': 4,
+}
+
+
+class StudioBackend(ModelBackend):
+    """
+    ModelBackend whose per-request user lookup also joins the profile,
+    membership and plan, so the reverse one-to-one accessors are cached.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = User._default_manager.select_related(
+                'profile', 'usermembership__plan'
+            ).get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        # ModelBackend.aget_user doesn't go through get_user
+        return await sync_to_async(self.get_user)(user_id)
+
+
+class AccessSnapshot:
+    """
+    Role, credits and access dates for one user, read once per request.
+    """
+    __slots__ = ('role', 'credits', 'active', 'access_until', 'has_membership')
+
+    def __init__(self, role='public', credits=0, active=False, access_until=None, has_membership=False):
+        self.role = role
+        self.credits = credits
+        self.active = active
+        self.access_until = access_until
+        self.has_membership = has_membership
+
+    def has_minimum_role(self, required_role):
+        return ROLE_PRIORITY[self.role] >= ROLE_PRIORITY[required_role]
+
+    @property
+    def has_access(self):
+        """
+        Same rule as services.has_membership_access.
+        """
+        if self.active:
+            return True
+        return bool(self.access_until and self.access_until >= date.today())
+
+
+def access_snapshot(user):
+    """
+    Returns the user's AccessSnapshot, built on first use and kept on the
+    user object for the rest of the request. Anonymous users get the
+    default (public, no membership) snapshot.
+    """
+    snapshot = getattr(user, '_access_snapshot', None)
+    if snapshot is not None:
+        return snapshot
+
+    snapshot = AccessSnapshot()
+    if user.is_authenticated:
+        profile = getattr(user, 'profile', None)
+        if profile is not None:
+            snapshot.role = profile.role
+        membership = getattr(user, 'usermembership', None)
+        if membership is not None:
+            snapshot.has_membership = True
+            snapshot.credits = membership.credits
+            snapshot.active = membership.active
+            snapshot.access_until = membership.valid_until
+    user._access_snapshot = snapshot
+    return snapshot
@@ -0,0 +1,473 @@
+# main/availability.py
+
+import calendar
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import CharField, Count, Max, Value
+from django.utils.timezone import make_aware, now
+
+from .models import BookedSession, PendingSessionRequest, StudioDay
+
+# Hours shown on the scheduler (first bookable hour, exclusive end)
+OPEN_HOUR = 8
+CLOSE_HOUR = 24
+HOURS_PER_DAY = 24
+
+# Cache lifetimes (seconds). Writes invalidate through signals, so these
+# only bound staleness for bulk updates that bypass them.
+DAY_CACHE_TIMEOUT = 60 * 60
+MONTH_CACHE_TIMEOUT = 60 * 60
+
+# Single-flight recompute lock
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+# In-process locks are shared by keys hashing to the same stripe, so their
+# number stays fixed however many dates get looked up
+LOCK_STRIPES = 64
+
+# Which rows occupy the calendar: confirmed bookings (paid reservations
+# included, see booking.confirm_paid_request) and the holds of open requests
+BOOKED_STATUSES = list(BookedSession.ACTIVE_STATUSES)
+PENDING_STATUSES = list(PendingSessionRequest.HOLD_STATUSES)
+
+
+# ----------------------------------------------------------------------------------
+# PER-DAY OCCUPANCY
+# ----------------------------------------------------------------------------------
+class DayAvailability:
+    """
+    Occupancy of a single studio day.
+
+    `mask` has bit H set when hour H is taken by a booking or a request,
+    `slots` keeps the display info (status, label) for each taken hour and
+    `sources` the id of the session or request holding it. `updated_at` is
+    the last rewrite of the day's StudioDay row (None without one).
+    """
+
+    def __init__(self, day):
+        self.day = day
+        self.mask = 0
+        self.slots = {}
+        self.sources = {}
+        self.updated_at = None
+
+    def occupy(self, hour, status, label, source_id=None):
+        """
+        Marks an hour as taken, replacing whatever was recorded for it.
+        """
+        if not 0 <= hour < HOURS_PER_DAY:
+            return
+        self.mask |= 1 << hour
+        self.slots[hour] = (status, label)
+        self.sources[hour] = source_id
+
+    @classmethod
+    def from_mask(cls, day, mask):
+        """
+        Rebuilds a day from a cached mask (no per-slot labels).
+        """
+        availability = cls(day)
+        availability.mask = mask
+        return availability
+
+    def is_free(self, hour):
+        return 0 <= hour < HOURS_PER_DAY and not self.mask & (1 << hour)
+
+    def free_hours(self, start_hour=OPEN_HOUR, end_hour=CLOSE_HOUR):
+        """
+        Returns the free hours in [start_hour, end_hour).
+        """
+        return [h for h in range(start_hour, end_hour) if not self.mask & (1 << h)]
+
+    def free_count(self, start_hour=OPEN_HOUR, end_hour=CLOSE_HOUR):
+        window = ((1 << end_hour) - 1) ^ ((1 << start_hour) - 1)
+        return bin(window & ~self.mask).count("1")
+
+    def free_runs(self, length, start_hour=OPEN_HOUR, end_hour=CLOSE_HOUR):
+        """
+        Returns every start hour in [start_hour, end_hour) that begins
+        `length` consecutive free hours. Single pass over the slots.
+        """
+        if length < 1:
+            return []
+        starts = []
+        run = 0
+        for h in range(start_hour, end_hour):
+            if self.mask & (1 << h):
+                run = 0
+                continue
+            run += 1
+            if run >= length:
+                starts.append(h - length + 1)
+        return starts
+
+    def is_range_free(self, start_hour, hours):
+        """
+        True if `hours` consecutive hours starting at `start_hour` are all free.
+        """
+        if start_hour < 0 or hours < 1 or start_hour + hours > HOURS_PER_DAY:
+            return False
+        window = ((1 << hours) - 1) << start_hour
+        return not self.mask & window
+
+    def time_slots(self, start_hour=OPEN_HOUR, end_hour=CLOSE_HOUR):
+        """
+        Builds the slot list rendered by the daily scheduler.
+        """
+        time_slots = []
+        for hour in range(start_hour, end_hour):
+            status, label = self.slots.get(hour, ("available", None))
+            time_slots.append({
+                "hour": hour,
+                "status": status,
+                "booked_by_name": label,
+            })
+        return time_slots
+
+
+# ----------------------------------------------------------------------------------
+# LOADING
+# ----------------------------------------------------------------------------------
+def _overlapping_sessions(start_date, end_date):
+    """
+    Bookings whose [starts_at, ends_at) range touches [start_date, end_date],
+    including sessions that started the day before and run past midnight.
+    No session lasts a day, so starts_at is bounded on both sides and the
+    range index is scanned only around the window.
+    """
+    window_start = make_aware(datetime.combine(start_date, dt_time.min))
+    window_end = make_aware(datetime.combine(end_date + timedelta(days=1), dt_time.min))
+    return BookedSession.objects.filter(
+        starts_at__gte=window_start - timedelta(days=1),
+        starts_at__lt=window_end,
+        ends_at__gt=window_start,
+    )
+
+
+def _occupying_rows(start_date, end_date):
+    """
+    One UNION query returning every booking and request that can touch
+    [start_date, end_date]. Requests are read from one day early so those
+    that run past midnight are carried into the first day of the range.
+    """
+    blank = Value("", output_field=CharField())
+    booked = _overlapping_sessions(start_date, end_date).filter(
+        status__in=BOOKED_STATUSES,
+    ).values_list(
+        "booked_date",
+        "booked_start_time",
+        "duration_hours",
+        "status",
+        "booked_by__first_name",
+        "booked_by__last_name",
+        "booked_by__username",
+        Value("booked", output_field=CharField()),
+        "id",
+    )
+    pending = PendingSessionRequest.objects.filter(
+        requested_date__range=(start_date - timedelta(days=1), end_date),
+        status__in=PENDING_STATUSES,
+    ).values_list(
+        "requested_date",
+        "requested_time",
+        "hours",
+        "status",
+        blank,
+        blank,
+        blank,
+        Value("pending", output_field=CharField()),
+        "id",
+    )
+    return booked.union(pending, all=True)
+
+
+def _display_name(first_name, last_name, username):
+    full_name = f"{first_name or ''} {last_name or ''}".strip()
+    return full_name or username or None
+
+
+def _pending_slot(status):
+    if status == "approved":
+        return "pending", "Pending"
+    return "requested", "Requested"
+
+
+def load_availability(start_date, end_date):
+    """
+    Returns {date: DayAvailability} for every day in [start_date, end_date],
+    computed from the bookings and requests with a single database query.
+    Pages read the StudioDay index instead (studio_days); this is what
+    the index is built from.
+    """
+    days = {}
+    day = start_date
+    while day <= end_date:
+        days[day] = DayAvailability(day)
+        day += timedelta(days=1)
+
+    # Bookings are applied after requests so they always win a shared hour
+    rows = sorted(_occupying_rows(start_date, end_date), key=lambda r: r[7] == "booked")
+    for row_date, start_time, hours, status, first, last, username, source, source_id in rows:
+        if source == "booked":
+            slot = ("reserved", _display_name(first, last, username))
+        else:
+            slot = _pending_slot(status)
+
+        for offset in range(hours or 1):
+            absolute = start_time.hour + offset
+            target = days.get(row_date + timedelta(days=absolute // HOURS_PER_DAY))
+            if target is not None:
+                target.occupy(absolute % HOURS_PER_DAY, *slot, source_id)
+
+    return days
+
+
+def day_availability(day):
+    """
+    Occupancy for a single date, from its StudioDay row.
+    """
+    return studio_days(day, day)[day]
+
+
+def availability_stamp(start_date, end_date):
+    """
+    Change stamp for [start_date, end_date]: the newest updated_at and the
+    row count of the StudioDay rows in the range. Every write that touches
+    a date rewrites its row (moving the max) or creates it (moving the count).
+    Returns a string suitable for an ETag.
+    """
+    stamp = StudioDay.objects.filter(date__range=(start_date, end_date)).aggregate(
+        latest=Max("updated_at"), rows=Count("date")
+    )
+    latest = stamp["latest"].timestamp() if stamp["latest"] else 0
+    return f"{start_date.isoformat()}.{end_date.isoformat()}.{latest:.6f}-{stamp['rows']}"
+
+
+# ----------------------------------------------------------------------------------
+# OCCUPANCY INDEX (StudioDay)
+# ----------------------------------------------------------------------------------
+def day_row(availability):
+    """
+    The (mask, slots) a StudioDay row stores for a computed day.
+    """
+    slots = {
+        str(hour): [status, label, availability.sources.get(hour)]
+        for hour, (status, label) in sorted(availability.slots.items())
+    }
+    return availability.mask, slots
+
+
+def _from_row(row):
+    availability = DayAvailability.from_mask(row.date, row.mask)
+    availability.updated_at = row.updated_at
+    for hour, (status, label, source_id) in row.slots.items():
+        availability.slots[int(hour)] = (status, label)
+        availability.sources[int(hour)] = source_id
+    return availability
+
+
+def studio_days(start_date, end_date):
+    """
+    Returns {date: DayAvailability} for every day in [start_date, end_date]
+    from the StudioDay index, one row per day. A date without a row has
+    never had anything on it.
+    """
+    days = {}
+    day = start_date
+    while day <= end_date:
+        days[day] = DayAvailability(day)
+        day += timedelta(days=1)
+    for row in StudioDay.objects.filter(date__range=(start_date, end_date)):
+        days[row.date] = _from_row(row)
+    return days
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_refresh():
+    """
+    Collects the dates refresh_days is asked for inside the block and
+    rewrites them once on the way out. For bulk deletes, which fire the
+    model signals once per row.
+    """
+    if getattr(_deferred, "dates", None) is not None:
+        yield
+        return
+    _deferred.dates = set()
+    try:
+        yield
+        dates = _deferred.dates
+    finally:
+        _deferred.dates = None
+    refresh_days(dates)
+
+
+def refresh_days(dates):
+    """
+    Rewrites the StudioDay rows for `dates` from the bookings and requests,
+    inside the caller's transaction. The rows are locked first, in date
+    order, so concurrent writers to one day take turns and each recomputes
+    with the other's rows committed.
+    """
+    if getattr(_deferred, "dates", None) is not None:
+        _deferred.dates.update(dates)
+        return
+    dates = sorted(set(dates))
+    if not dates:
+        return
+    with transaction.atomic():
+        StudioDay.objects.bulk_create([StudioDay(date=day) for day in dates], ignore_conflicts=True)
+        rows = list(StudioDay.objects.select_for_update().filter(date__in=dates).order_by("date"))
+        computed = load_availability(dates[0], dates[-1])
+        stamp = now()
+        for row in rows:
+            row.mask, row.slots = day_row(computed[row.date])
+            row.updated_at = stamp
+        StudioDay.objects.bulk_update(rows, ["mask", "slots", "updated_at"])
+
+
+def month_grid(year, month):
+    """
+    Dates shown on the monthly calendar (whole weeks, Sunday first).
+    """
+    return list(calendar.Calendar(firstweekday=6).itermonthdates(year, month))
+
+
+# ----------------------------------------------------------------------------------
+# CACHING
+# ----------------------------------------------------------------------------------
+# Every cached entry lives under a versioned key. Invalidation bumps the
+# version instead of deleting, so a recompute that raced with a write can
+# only ever store under the old (now unreachable) key.
+
+# Reentrant so a compute that reads another key on the same stripe
+# doesn't deadlock its own thread
+_local_locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+
+
+def _local_lock(key):
+    return _local_locks[hash(key) % LOCK_STRIPES]
+
+
+def _version(name):
+    version = cache.get(f"{name}:version")
+    if version is None:
+        # Seed from the clock so an evicted counter never revives old entries
+        cache.add(f"{name}:version", time.time_ns(), None)
+        version = cache.get(f"{name}:version", 0)
+    return version
+
+
+def _bump_version(name):
+    try:
+        cache.incr(f"{name}:version")
+    except ValueError:
+        cache.add(f"{name}:version", time.time_ns(), None)
+
+
+def _single_flight(name, compute, timeout):
+    """
+    Returns the cached value for `name`, computing it at most once per
+    miss. Threads in this process queue on a local lock; other workers
+    sharing the cache see the lock key and poll for the result instead of
+    hitting the database themselves.
+    """
+    key = f"{name}:v{_version(name)}"
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    with _local_lock(name):
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+        lock_key = f"{key}:lock"
+        if cache.add(lock_key, 1, LOCK_TIMEOUT):
+            try:
+                value = compute()
+                cache.set(key, value, timeout)
+            finally:
+                cache.delete(lock_key)
+            return value
+
+        # Another worker owns the recompute; wait for it, then give up and load
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+        return compute()
+
+
+def _day_name(day):
+    return f"availability:day:{day.isoformat()}"
+
+
+def _month_name(year, month):
+    return f"availability:month:{year}-{month:02d}"
+
+
+def cached_day_availability(day):
+    """
+    Cached occupancy for a single date (slot labels included).
+    """
+    def compute():
+        availability = day_availability(day)
+        return {"mask": availability.mask, "slots": availability.slots}
+
+    data = _single_flight(_day_name(day), compute, DAY_CACHE_TIMEOUT)
+    availability = DayAvailability.from_mask(day, data["mask"])
+    availability.slots = dict(data["slots"])
+    return availability
+
+
+def month_occupancy(year, month):
+    """
+    Occupancy for every date on the (year, month) calendar grid, memoized
+    per month so a burst of calendar views costs one query.
+    Returns {date: DayAvailability}.
+    """
+    grid = month_grid(year, month)
+
+    def compute():
+        masks = StudioDay.objects.filter(date__range=(grid[0], grid[-1])).values_list("date", "mask")
+        return {day.isoformat(): mask for day, mask in masks}
+
+    masks = _single_flight(_month_name(year, month), compute, MONTH_CACHE_TIMEOUT)
+    return {
+        day: DayAvailability.from_mask(day, masks.get(day.isoformat(), 0))
+        for day in grid
+    }
+
+
+def invalidate_dates(dates):
+    """
+    Drops cached availability for the given dates and for every month
+    grid they appear on (a grid shows the edges of adjacent months).
+    """
+    months = set()
+    for day in dates:
+        _bump_version(_day_name(day))
+        for edge in (day - timedelta(days=7), day, day + timedelta(days=7)):
+            months.add((edge.year, edge.month))
+    for year, month in months:
+        _bump_version(_month_name(year, month))
+
+
+def affected_dates(day, start_time, hours):
+    """
+    Dates covered by a session, including a spill past midnight.
+    """
+    if day is None:
+        return []
+    end_hour = (start_time.hour if start_time else 0) + max(int(hours or 1), 1)
+    return [day + timedelta(days=offset) for offset in range((end_hour - 1) // HOURS_PER_DAY + 1)]
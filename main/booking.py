@@ -0,0 +1,139 @@
+# main/booking.py
+
+from datetime import date, datetime
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+
+from .availability import day_availability, invalidate_dates, refresh_days
+from .live import publish_dates
+from .models import BookedSession, PendingSessionRequest, UserMembership
+
+
+class BookingError(Exception):
+    """
+    A booking was refused; the message is safe to show to the member.
+    """
+
+
+def _lock_day(day):
+    """
+    Serializes bookings for one studio date. Postgres takes a transaction
+    advisory lock; other backends rely on the credit UPDATE below, which
+    is the transaction's first write and so takes the database write lock.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [0x5354, day.toordinal()])
+
+
+def contiguous_runs(hours):
+    """
+    Groups start hours into (first hour, length) runs of back-to-back
+    hours: [9, 10, 11, 14] -> [(9, 3), (14, 1)].
+    """
+    runs = []
+    for hour in sorted(set(hours)):
+        if runs and runs[-1][0] + runs[-1][1] == hour:
+            runs[-1] = (runs[-1][0], runs[-1][1] + 1)
+        else:
+            runs.append((hour, 1))
+    return runs
+
+
+def book_hours(user, day, hours):
+    """
+    Books the given start hours on `day` for a member, all or nothing:
+    credits are deducted with an F() expression under the membership row
+    lock, every hour is checked against the day's StudioDay row (bookings
+    and request holds), and the sessions are inserted with one
+    bulk_create, one row per run of contiguous hours.
+    Returns the created sessions or raises BookingError.
+    """
+    hours = sorted(set(hours))
+    if not hours:
+        raise BookingError("No hours were selected.")
+
+    with transaction.atomic():
+        _lock_day(day)
+
+        # Deduct first: the UPDATE locks the membership row and fails if the
+        # member can't pay, so concurrent tabs can never spend the same credits.
+        charged = UserMembership.objects.filter(
+            Q(active=True) | Q(valid_until__gte=date.today()),
+            user=user,
+            credits__gte=len(hours),
+        ).update(credits=F("credits") - len(hours))
+        if not charged:
+            raise BookingError("You do not have enough credits or your membership is not active.")
+
+        availability = day_availability(day)
+        if not all(availability.is_free(hour) for hour in hours):
+            raise BookingError("One or more of the selected hours is no longer available.")
+
+        sessions = []
+        for hour, length in contiguous_runs(hours):
+            start = datetime.strptime(f"{hour}:00", "%H:%M").time()
+            sessions.append(BookedSession(
+                booked_by=user,
+                booked_date=day,
+                booked_start_time=start,
+                duration_hours=length,
+                status="booked",
+            ))
+            sessions[-1].fill_range()
+        try:
+            # Savepoint so the overlap constraint's error rolls back cleanly
+            with transaction.atomic():
+                sessions = BookedSession.objects.bulk_create(sessions)
+        except IntegrityError:
+            # The database's overlap constraint caught a booking the checks above missed
+            raise BookingError("One or more of the selected hours is no longer available.")
+
+        # bulk_create skips post_save, so update the day's StudioDay row,
+        # clear cached availability and notify open scheduler pages ourselves
+        refresh_days([day])
+        transaction.on_commit(lambda: invalidate_dates([day]))
+        transaction.on_commit(lambda: publish_dates([day]))
+
+    return sessions
+
+
+def confirm_paid_request(reservation_id):
+    """
+    Marks a reservation request paid and creates its confirmed
+    BookedSession in the same transaction. Replays of the payment event
+    return the existing session. If the hours were taken in the meantime
+    the request becomes "paid_conflict" (the money was collected but there
+    is no session) and the operators are alerted through the outbox.
+    Returns (request, session or None).
+    """
+    from .emails import send_paid_conflict_alert
+
+    with transaction.atomic():
+        reservation = PendingSessionRequest.objects.select_for_update().get(id=reservation_id)
+        existing = BookedSession.objects.filter(source_request=reservation).first()
+        if existing is not None or reservation.status == "paid_conflict":
+            return reservation, existing
+
+        session = BookedSession(
+            booked_by=User.objects.filter(email__iexact=reservation.requester_email).first(),
+            booked_date=reservation.requested_date,
+            booked_start_time=reservation.requested_time,
+            duration_hours=reservation.hours or 1,
+            status="paid",
+            notes=reservation.notes,
+            source_request=reservation,
+        )
+        try:
+            with transaction.atomic():
+                session.save()
+        except IntegrityError:
+            session = None
+
+        reservation.status = "paid" if session else "paid_conflict"
+        reservation.save(update_fields=["status", "updated_at"])
+        if session is None:
+            send_paid_conflict_alert(reservation)
+    return reservation, session
@@ -0,0 +1,68 @@
+# main/catalog.py
+
+from datetime import timedelta
+
+import stripe
+from django.conf import settings
+from django.utils.timezone import now
+
+from .models import MembershipPlan
+from .services import stripe_dict
+
+
+def _is_fresh(plan):
+    if not plan.stripe_price_id or not plan.price_synced_at:
+        return False
+    return now() - plan.price_synced_at < timedelta(seconds=settings.STRIPE_PRICE_CACHE_SECONDS)
+
+
+def refresh_plan_price(plan):
+    """
+    Looks up the plan's current active price on Stripe and stores it.
+    """
+    prices = stripe_dict(stripe.Price.list(product=plan.stripe_product_id, active=True))
+    plan.stripe_price_id = prices['data'][0]['id'] if prices['data'] else None
+    plan.price_synced_at = now()
+    plan.save(update_fields=['stripe_price_id', 'price_synced_at'])
+    return plan.stripe_price_id
+
+
+def get_checkout_price(stripe_product_id):
+    """
+    Returns (plan, price_id) for a product, using the cached price while
+    it's fresh. Raises MembershipPlan.DoesNotExist for unknown products.
+    """
+    plan = MembershipPlan.objects.get(stripe_product_id=stripe_product_id)
+    if _is_fresh(plan):
+        return plan, plan.stripe_price_id
+    return plan, refresh_plan_price(plan)
+
+
+def sync_catalog():
+    """
+    Refreshes the cached price of every plan. Returns {plan name: price id}.
+    """
+    return {plan.name: refresh_plan_price(plan) for plan in MembershipPlan.objects.all()}
+
+
+def handle_catalog_event(event):
+    """
+    Keeps cached prices current from price.* and product.* webhook events.
+    """
+    event_type = event['type']
+    obj = event['data']['object']
+
+    if event_type.startswith('price.'):
+        plans = MembershipPlan.objects.filter(stripe_product_id=obj.get('product'))
+        for plan in plans:
+            if event_type == 'price.created' and obj.get('active'):
+                # A new active price is the newest one, which is what checkout uses
+                plan.stripe_price_id = obj['id']
+                plan.price_synced_at = now()
+                plan.save(update_fields=['stripe_price_id', 'price_synced_at'])
+            else:
+                refresh_plan_price(plan)
+
+    elif event_type.startswith('product.'):
+        for plan in MembershipPlan.objects.filter(stripe_product_id=obj['id']):
+            refresh_plan_price(plan)
@@ -1,4 +1,7 @@
 # main/emails.py
+#
+# Every send_* helper queues its message in the EmailOutbox; nothing talks
+# to SMTP during a request. `manage.py run_outbox` does the delivery.
 
 from django.conf import settings
 from django.core.mail import EmailMessage
@@ -6,6 +9,8 @@ from django.utils.html import escape
 from django.contrib.auth.models import User
 import stripe  # only if you need it here
 from .models import UserMembership
+from .outbox import enqueue
+from .payment_links import BOOKING_FEE, ensure_payment_links, has_live_link
 
 def send_payment_failure_email(user):
     """
@@ -28,7 +33,7 @@ def send_payment_failure_email(user):
             to=[user.email],
         )
         msg.content_subtype = "html"
-        msg.send()
+        enqueue(msg)
     except Exception as e:
         print(f"Failed to send payment failure email: {e}")
 
@@ -64,7 +69,7 @@ def send_membership_confirmation_email(user, reactivation=False):
         settings.DEFAULT_FROM_EMAIL,
         [user.email],
     )
-    email.send()
+    enqueue(email)
 
 
 def send_cancelation_confirmation_email(user):
@@ -87,124 +92,120 @@ def send_cancelation_confirmation_email(user):
             to=[user.email],
         )
         msg.content_subtype = "html"
-        msg.send()
+        enqueue(msg)
     except Exception as e:
         print(f"Failed to send cancelation confirmation email: {e}")
 
 
-def send_payment_email_stripe(pending_req):
+def payment_email(pending_req):
     """
-    Sends a Stripe Checkout session link to the user after operator approval.
+    Builds the payment email for an approved request, creating its Stripe
+    Checkout session if it doesn't have a usable one yet.
     """
-    try:
-        import stripe
-        stripe.api_key = settings.STRIPE_SECRET_KEY
-
-        amount = 1.00  # Example $1
-        unit_amount = int(amount * 100)
-
-        # Create a Checkout Session for one-time payment
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            mode="payment",  # Use "payment" for one-time payments
-            line_items=[
-                {
-                    "price_data": {
-                        "currency": "usd",
-                        "product_data": {"name": "Studio Booking Fee"},
-                        "unit_amount": unit_amount,
-                    },
-                    "quantity": 1,
-                }
-            ],
-            metadata={
-                "reservation_id": pending_req.id,
-            },
-            success_url=f"{settings.BASE_URL}/payment-success/",
-            cancel_url=f"{settings.BASE_URL}/payment-cancelled/",
-        )
+    # Reuses the request's stored link while it's live (see payment_links.py)
+    if not has_live_link(pending_req):
+        batch = ensure_payment_links([pending_req], max_workers=1)
+        if batch.failed:
+            raise RuntimeError(batch.failed[pending_req.id])
+    amount = BOOKING_FEE
 
-        email_content = f"""
-        <div style="font-family: Arial, sans-serif; font-size:16px; color:#333; line-height:1.5; margin:0 auto; max-width:600px; padding:20px;">
-            <h2 style="font-size:24px; font-weight:bold; text-align:center; color:#333;">Complete Your Studio Reservation</h2>
-            <p>Hi {pending_req.requester_name},</p>
-            <p>Thank you for reserving the studio! Below are your request details:</p>
-            <ul style="list-style-type:none; padding:0;">
-                <li><strong>Date:</strong> {pending_req.requested_date.strftime("%b %d, %Y")}</li>
-                <li><strong>Time:</strong> {pending_req.requested_time.strftime("%I:%M %p")}</li>
-                <li><strong>Hours:</strong> {pending_req.hours} hour(s)</li>
-                <li><strong>Amount Due:</strong> ${amount:.2f}</li>
-            </ul>
-            <p style="margin-top:20px;">To confirm your reservation, please complete the payment by clicking below:</p>
-            <div style="text-align:center; margin:30px 0;">
-                <a href="{checkout_session.url}"
-                   style="background-color:#000; color:#fff; text-decoration:none; padding:15px 25px; border-radius:5px; font-size:18px; font-weight:bold;">
-                    Complete Payment
-                </a>
-            </div>
-            <p>If you have any questions, feel free to reply to this email.</p>
-            <p>Thank you,<br>AVEC Studios</p>
+    email_content = f"""
+    <div style="font-family: Arial, sans-serif; font-size:16px; color:#333; line-height:1.5; margin:0 auto; max-width:600px; padding:20px;">
+        <h2 style="font-size:24px; font-weight:bold; text-align:center; color:#333;">Complete Your Studio Reservation</h2>
+        <p>Hi {pending_req.requester_name},</p>
+        <p>Thank you for reserving the studio! Below are your request details:</p>
+        <ul style="list-style-type:none; padding:0;">
+            <li><strong>Date:</strong> {pending_req.requested_date.strftime("%b %d, %Y")}</li>
+            <li><strong>Time:</strong> {pending_req.requested_time.strftime("%I:%M %p")}</li>
+            <li><strong>Hours:</strong> {pending_req.hours} hour(s)</li>
+            <li><strong>Amount Due:</strong> ${amount:.2f}</li>
+        </ul>
+        <p style="margin-top:20px;">To confirm your reservation, please complete the payment by clicking below:</p>
+        <div style="text-align:center; margin:30px 0;">
+            <a href="{pending_req.checkout_url}"
+               style="background-color:#000; color:#fff; text-decoration:none; padding:15px 25px; border-radius:5px; font-size:18px; font-weight:bold;">
+                Complete Payment
+            </a>
         </div>
-        """
+        <p>If you have any questions, feel free to reply to this email.</p>
+        <p>Thank you,<br>AVEC Studios</p>
+    </div>
+    """
+
+    msg = EmailMessage(
+        subject="Complete Your Payment for Studio Reservation",
+        body=email_content,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[pending_req.requester_email],
+    )
+    msg.content_subtype = "html"
+    return msg
 
-        msg = EmailMessage(
-            subject="Complete Your Payment for Studio Reservation",
-            body=email_content,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[pending_req.requester_email],
-        )
-        msg.content_subtype = "html"
-        msg.send()
+
+def send_payment_email_stripe(pending_req):
+    """
+    Sends a Stripe Checkout session link to the user after operator approval.
+    """
+    try:
+        enqueue(payment_email(pending_req))
 
     except Exception as e:
         print(f"Failed to send Stripe payment email: {e}")
         raise
 
-def send_rejection_email(pending_req, suggested_times):
+
+def rejection_email(pending_req, suggested_times):
     """
-    Sends a rejection email with optional alternative times.
+    Builds the rejection email, with optional alternative times.
     """
-    try:
-        daily_scheduler_link = f"{settings.BASE_URL}/daily-scheduler/?date={pending_req.requested_date.isoformat()}"
-        suggested_html = ""
-        if suggested_times:
-            escaped_times = escape(suggested_times).replace("\n", "<br>")
-            suggested_html = f"""
-            <p>The operator has suggested the following alternative times:</p>
-            <ul><li>{escaped_times}</li></ul>
-            """
+    daily_scheduler_link = f"{settings.BASE_URL}/daily-scheduler/?date={pending_req.requested_date.isoformat()}"
+    suggested_html = ""
+    if suggested_times:
+        escaped_times = escape(suggested_times).replace("\n", "<br>")
+        suggested_html = f"""
+        <p>The operator has suggested the following alternative times:</p>
+        <ul><li>{escaped_times}</li></ul>
+        """
 
-        email_content = f"""
-        <div style="font-family:Arial, sans-serif; font-size:16px; color:#333; line-height:1.5; margin:0 auto; max-width:600px; padding:20px;">
-            <h2 style="font-size:24px; font-weight:bold; text-align:center; color:#333;">Reservation Request Declined</h2>
-            <p>Hi {pending_req.requester_name},</p>
-            <p>Unfortunately, your reservation request for:</p>
-            <ul style="list-style-type:none; padding:0;">
-                <li><strong>Date:</strong> {pending_req.requested_date.strftime("%b %d, %Y")}</li>
-                <li><strong>Time:</strong> {pending_req.requested_time.strftime("%I:%M %p")}</li>
-            </ul>
-            <p>has been declined.</p>
-            {suggested_html}
-            <p>You can view and book other available slots here:</p>
-            <div style="text-align:center; margin:30px 0;">
-                <a href="{daily_scheduler_link}"
-                   style="background-color:#000; color:#fff; text-decoration:none; padding:15px 25px; border-radius:5px; font-size:18px; font-weight:bold;">
-                    View Available Times
-                </a>
-            </div>
-            <p>If you have any questions, feel free to reply to this email.</p>
-            <p>Thank you,<br>AVEC Studios</p>
+    email_content = f"""
+    <div style="font-family:Arial, sans-serif; font-size:16px; color:#333; line-height:1.5; margin:0 auto; max-width:600px; padding:20px;">
+        <h2 style="font-size:24px; font-weight:bold; text-align:center; color:#333;">Reservation Request Declined</h2>
+        <p>Hi {pending_req.requester_name},</p>
+        <p>Unfortunately, your reservation request for:</p>
+        <ul style="list-style-type:none; padding:0;">
+            <li><strong>Date:</strong> {pending_req.requested_date.strftime("%b %d, %Y")}</li>
+            <li><strong>Time:</strong> {pending_req.requested_time.strftime("%I:%M %p")}</li>
+        </ul>
+        <p>has been declined.</p>
+        {suggested_html}
+        <p>You can view and book other available slots here:</p>
+        <div style="text-align:center; margin:30px 0;">
+            <a href="{daily_scheduler_link}"
+               style="background-color:#000; color:#fff; text-decoration:none; padding:15px 25px; border-radius:5px; font-size:18px; font-weight:bold;">
+                View Available Times
+            </a>
         </div>
-        """
+        <p>If you have any questions, feel free to reply to this email.</p>
+        <p>Thank you,<br>AVEC Studios</p>
+    </div>
+    """
 
-        msg = EmailMessage(
-            subject="Your Reservation Request Has Been Declined",
-            body=email_content,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[pending_req.requester_email],
-        )
-        msg.content_subtype = "html"
-        msg.send()
+    msg = EmailMessage(
+        subject="Your Reservation Request Has Been Declined",
+        body=email_content,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[pending_req.requester_email],
+    )
+    msg.content_subtype = "html"
+    return msg
+
+
+def send_rejection_email(pending_req, suggested_times):
+    """
+    Sends a rejection email with optional alternative times.
+    """
+    try:
+        enqueue(rejection_email(pending_req, suggested_times))
 
     except Exception as e:
         print(f"Failed to send rejection email: {e}")
@@ -245,7 +246,7 @@ def send_invite_email(invite, role):
         to=[invite.email],
     )
     msg.content_subtype = "html"
-    msg.send()
+    enqueue(msg)
 
 
 def notify_operators_of_new_request(name, email, phone, date_str, time_str, hours, notes, operator_emails):
@@ -284,7 +285,7 @@ def notify_operators_of_new_request(name, email, phone, date_str, time_str, hour
         to=operator_emails
     )
     msg.content_subtype = "html"
-    msg.send()
+    enqueue(msg)
 
 def send_reservation_payment_confirmation_email(reservation):
     """
@@ -314,7 +315,7 @@ def send_reservation_payment_confirmation_email(reservation):
             to=[reservation.requester_email],
         )
         user_msg.content_subtype = "html"
-        user_msg.send()
+        enqueue(user_msg)
 
         # Email to the operators
         operators = User.objects.filter(groups__name="Operator")
@@ -350,11 +351,54 @@ def send_reservation_payment_confirmation_email(reservation):
             to=operator_emails,
         )
         operator_msg.content_subtype = "html"
-        operator_msg.send()
+        enqueue(operator_msg)
 
     except Exception as e:
         print(f"Failed to send reservation confirmation email: {e}")
 
+def send_paid_conflict_alert(reservation):
+    """
+    Tells the operators a reservation was paid for hours that were booked
+    in the meantime, so they can reschedule or refund it.
+    """
+    operators = User.objects.filter(groups__name="Operator")
+    operator_emails = [op.email for op in operators if op.email]
+
+    email_content = f"""
+    <div style="font-family: Arial, sans-serif; color: #333; line-height: 1.5; max-width: 600px; margin: auto;">
+        <h2 style="color: #c00;">Paid Reservation Needs Attention</h2>
+        <p>This reservation was paid, but its hours were booked before the payment arrived.
+           No session was created. Please reschedule or refund it:</p>
+        <ul style="padding-left: 20px; color: #555;">
+            <li><strong>Request:</strong> #{reservation.id}</li>
+            <li><strong>Name:</strong> {reservation.requester_name}</li>
+            <li><strong>Email:</strong> {reservation.requester_email}</li>
+            <li><strong>Phone:</strong> {reservation.requester_phone}</li>
+            <li><strong>Date:</strong> {reservation.requested_date.strftime("%b %d, %Y")}</li>
+            <li><strong>Time:</strong> {reservation.requested_time.strftime("%I:%M %p")}</li>
+            <li><strong>Hours:</strong> {reservation.hours} hour(s)</li>
+        </ul>
+        <div style="text-align: center; margin: 20px 0;">
+            <a href="{settings.BASE_URL}/operator-console/?status=paid_conflict"
+               style="background-color: #007bff; color: #fff; text-decoration: none;
+                      padding: 10px 20px; border-radius: 5px; font-size: 16px;">
+                View in the Operator Console
+            </a>
+        </div>
+        <p style="color: #777;">AVEC Studios</p>
+    </div>
+    """
+
+    msg = EmailMessage(
+        subject=f"Paid reservation #{reservation.id} needs attention",
+        body=email_content,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=operator_emails or [settings.DEFAULT_FROM_EMAIL],
+    )
+    msg.content_subtype = "html"
+    enqueue(msg)
+
+
 def send_recurring_payment_confirmation_email(user, credits, next_billing_date):
     """
     Sends an email confirmation for a successful recurring payment.
@@ -380,7 +424,7 @@ def send_recurring_payment_confirmation_email(user, credits, next_billing_date):
             to=[user.email],
         )
         msg.content_subtype = "html"
-        msg.send()
+        enqueue(msg)
     except Exception as e:
         print(f"Failed to send recurring payment confirmation email: {e}")
 
@@ -398,4 +442,10 @@ def send_cancellation_scheduled_email(user, valid_until):
     Thank you,
     The Team
     """
-    user.email_user(subject, message)
+    msg = EmailMessage(
+        subject,
+        message,
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+    )
+    enqueue(msg)
@@ -0,0 +1,274 @@
+# main/fake_stripe.py
+#
+# Offline stand-in for the parts of the Stripe API this project uses, plus a
+# generator for signed webhook events. Point the client at it with
+# STRIPE_API_BASE=http://127.0.0.1:<port> (or FakeStripeServer.install()).
+
+import hashlib
+import hmac
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import stripe
+
+_ids = itertools.count(1)
+
+
+def fake_id(prefix):
+    return f"{prefix}_fake{next(_ids):08d}"
+
+
+class FakeStripeState:
+    """
+    In-memory objects served by the fake API.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.customers = {}
+        self.subscriptions = {}
+        self.prices = {}  # product id -> price object
+        self.checkout_sessions = {}
+        self.portal_sessions = {}
+        self.request_count = 0
+        self.latency = 0.0  # seconds added to every response, like a remote API
+
+    def subscription(self, subscription_id):
+        # Unknown ids are treated as active subscriptions so any fixture works
+        if subscription_id not in self.subscriptions:
+            self.subscriptions[subscription_id] = {
+                "id": subscription_id,
+                "object": "subscription",
+                "status": "active",
+                "customer": None,
+                "cancel_at_period_end": False,
+                "current_period_end": int(time.time()) + 30 * 86400,
+            }
+        return self.subscriptions[subscription_id]
+
+    def price_for(self, product_id):
+        if product_id not in self.prices:
+            self.prices[product_id] = {
+                "id": f"price_{product_id}",
+                "object": "price",
+                "product": product_id,
+                "active": True,
+                "unit_amount": 10000,
+                "currency": "usd",
+            }
+        return self.prices[product_id]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeStripe/1.0"
+
+    ROUTES = [
+        ("POST", r"/v1/customers", "create_customer"),
+        ("GET", r"/v1/customers/(?P<id>[^/]+)", "get_customer"),
+        ("GET", r"/v1/subscriptions/(?P<id>[^/]+)", "get_subscription"),
+        ("DELETE", r"/v1/subscriptions/(?P<id>[^/]+)", "cancel_subscription"),
+        ("GET", r"/v1/prices", "list_prices"),
+        ("POST", r"/v1/checkout/sessions", "create_checkout_session"),
+        ("POST", r"/v1/billing_portal/sessions", "create_portal_session"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode() if length else ""
+        params = dict(parse_qsl(url.query or body, keep_blank_values=True))
+
+        state = self.server.state
+        if state.latency:
+            time.sleep(state.latency)
+        with state.lock:
+            state.request_count += 1
+            for route_method, pattern, name in self.ROUTES:
+                match = re.fullmatch(pattern, url.path)
+                if route_method == method and match:
+                    status, payload = getattr(self, name)(state, params, **match.groupdict())
+                    break
+            else:
+                status, payload = 404, {"error": {"type": "invalid_request_error",
+                                                  "message": f"Unrecognized request URL ({method}: {url.path})"}}
+
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Request-Id", fake_id("req"))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # ---- Customer ----
+    def create_customer(self, state, params):
+        customer = {
+            "id": fake_id("cus"),
+            "object": "customer",
+            "email": params.get("email"),
+            "name": params.get("name"),
+        }
+        state.customers[customer["id"]] = customer
+        return 200, customer
+
+    def get_customer(self, state, params, id):
+        if id not in state.customers:
+            return 404, {"error": {"type": "invalid_request_error", "message": f"No such customer: '{id}'"}}
+        return 200, state.customers[id]
+
+    # ---- Subscription ----
+    def get_subscription(self, state, params, id):
+        return 200, state.subscription(id)
+
+    def cancel_subscription(self, state, params, id):
+        subscription = state.subscription(id)
+        subscription["status"] = "canceled"
+        return 200, subscription
+
+    # ---- Price ----
+    def list_prices(self, state, params):
+        product = params.get("product")
+        prices = [state.price_for(product)] if product else list(state.prices.values())
+        return 200, {"object": "list", "data": prices, "has_more": False, "url": "/v1/prices"}
+
+    # ---- checkout.Session / billing_portal.Session ----
+    def create_checkout_session(self, state, params):
+        session_id = fake_id("cs")
+        metadata = {key[9:-1]: value for key, value in params.items() if key.startswith("metadata[")}
+        session = {
+            "id": session_id,
+            "object": "checkout.session",
+            "mode": params.get("mode"),
+            "customer": params.get("customer"),
+            "metadata": metadata,
+            "url": f"https://checkout.stripe.fake/pay/{session_id}",
+            "expires_at": int(time.time()) + 24 * 3600,
+        }
+        state.checkout_sessions[session_id] = session
+        return 200, session
+
+    def create_portal_session(self, state, params):
+        session_id = fake_id("bps")
+        session = {
+            "id": session_id,
+            "object": "billing_portal.session",
+            "customer": params.get("customer"),
+            "return_url": params.get("return_url"),
+            "url": f"https://billing.stripe.fake/session/{session_id}",
+        }
+        state.portal_sessions[session_id] = session
+        return 200, session
+
+
+class FakeStripeServer:
+    """
+    Runs the fake API on a background thread.
+
+        server = FakeStripeServer().start()
+        server.install()      # point the stripe client at it
+        ...
+        server.stop()
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = FakeStripeState()
+        self.httpd.state.latency = latency
+        self._thread = None
+        self._previous_api_base = None
+
+    @property
+    def state(self):
+        return self.httpd.state
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def install(self):
+        self._previous_api_base = stripe.api_base
+        stripe.api_base = self.url
+        return self
+
+    def stop(self):
+        if self._previous_api_base is not None:
+            stripe.api_base = self._previous_api_base
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# ----------------------------------------------------------------------------------
+# SIGNED WEBHOOK EVENTS
+# ----------------------------------------------------------------------------------
+def build_event(event_type, obj, created=None, event_id=None):
+    return {
+        "id": event_id or fake_id("evt"),
+        "object": "event",
+        "type": event_type,
+        "created": created or int(time.time()),
+        "data": {"object": obj},
+    }
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """
+    Returns the Stripe-Signature header value for a raw payload.
+    """
+    timestamp = timestamp or int(time.time())
+    signed = f"{timestamp}.{payload.decode() if isinstance(payload, bytes) else payload}"
+    signature = hmac.new(secret.encode(), signed.encode(), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def signed_event(event_type, obj, secret, created=None, event_id=None):
+    """
+    Returns (payload bytes, Stripe-Signature header) for a webhook event.
+    """
+    payload = json.dumps(build_event(event_type, obj, created, event_id)).encode()
+    return payload, sign_payload(payload, secret)
+
+
+def invoice_payment_succeeded(subscription_id, customer_id=None, period_end=None):
+    return {
+        "id": fake_id("in"),
+        "object": "invoice",
+        "subscription": subscription_id,
+        "customer": customer_id,
+        "metadata": {},
+        "lines": {"data": [{"period": {"end": period_end or int(time.time()) + 30 * 86400}}]},
+    }
+
+
+def checkout_session_completed(user_id, plan_id, subscription_id, customer_id=None):
+    return {
+        "id": fake_id("cs"),
+        "object": "checkout.session",
+        "mode": "subscription",
+        "customer": customer_id,
+        "subscription": subscription_id,
+        "metadata": {"user_id": str(user_id), "plan_id": str(plan_id)},
+    }
@@ -0,0 +1,290 @@
+# main/instrumentation.py
+#
+# Per-request timing: database queries, Stripe API calls and SMTP, recorded
+# into the current request's RequestTimings (a contextvar, so it follows the
+# request through sync_to_async and into worker threads started with
+# copy_context). RequestTimingMiddleware turns each record into a
+# Server-Timing header and a JSON log line, and feeds a rolling per-URL
+# window that the admin performance page reads.
+
+import contextvars
+import json
+import logging
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+logger = logging.getLogger("main.perf")
+
+WINDOW_SECONDS = 15 * 60
+WINDOW_MAX_SAMPLES = 1000  # per URL name
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """
+    Counters for one request (or one worker batch). Thread-safe, since
+    Stripe calls may run on a pool while the request thread waits.
+    """
+
+    CATEGORIES = ("db", "stripe", "smtp")
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.counts = dict.fromkeys(self.CATEGORIES, 0)
+        self.seconds = dict.fromkeys(self.CATEGORIES, 0.0)
+        self._lock = threading.Lock()
+
+    def add(self, category, seconds):
+        with self._lock:
+            self.counts[category] += 1
+            self.seconds[category] += seconds
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total):
+        parts = [
+            f'{category};dur={self.seconds[category] * 1000:.1f};desc="{self.counts[category]} call(s)"'
+            for category in self.CATEGORIES
+            if self.counts[category]
+        ]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+    def as_dict(self, total):
+        data = {"name": self.name, "total_ms": round(total * 1000, 2)}
+        for category in self.CATEGORIES:
+            data[f"{category}_count"] = self.counts[category]
+            data[f"{category}_ms"] = round(self.seconds[category] * 1000, 2)
+        return data
+
+
+def current_timings():
+    return _current.get()
+
+
+class timed:
+    """
+    Context manager adding the elapsed time of the block to the current
+    request's `category`. A no-op outside a request.
+    """
+
+    def __init__(self, category):
+        self.category = category
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        timings = _current.get()
+        if timings is not None:
+            timings.add(self.category, time.perf_counter() - self.started)
+        return False
+
+
+class track:
+    """
+    Opens a RequestTimings scope for work outside the request cycle
+    (management commands, worker batches) and logs it on exit.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.timings = RequestTimings(self.name)
+        self._token = _current.set(self.timings)
+        return self.timings
+
+    def __exit__(self, *exc_info):
+        _current.reset(self._token)
+        total = self.timings.total()
+        logger.info(json.dumps(self.timings.as_dict(total)))
+        window.add(self.name, self.timings, total)
+        return False
+
+
+# ----------------------------------------------------------------------------------
+# ROLLING WINDOW
+# ----------------------------------------------------------------------------------
+class RollingWindow:
+    """
+    Recent samples per URL name, kept for WINDOW_SECONDS in this process.
+    """
+
+    def __init__(self, seconds=WINDOW_SECONDS, max_samples=WINDOW_MAX_SAMPLES):
+        self.seconds = seconds
+        self._samples = defaultdict(lambda: deque(maxlen=max_samples))
+        self._lock = threading.Lock()
+
+    def add(self, name, timings, total):
+        sample = (time.monotonic(), total, dict(timings.counts), dict(timings.seconds))
+        with self._lock:
+            self._samples[name].append(sample)
+
+    def _recent(self):
+        cutoff = time.monotonic() - self.seconds
+        with self._lock:
+            for samples in self._samples.values():
+                while samples and samples[0][0] < cutoff:
+                    samples.popleft()
+            return {name: list(samples) for name, samples in self._samples.items() if samples}
+
+    def snapshot(self):
+        """
+        Per-URL stats over the window, slowest p95 first.
+        """
+        rows = []
+        for name, samples in self._recent().items():
+            totals = sorted(sample[1] for sample in samples)
+            row = {
+                "name": name,
+                "requests": len(samples),
+                "p50_ms": statistics.median(totals) * 1000,
+                "p95_ms": totals[min(len(totals) - 1, int(len(totals) * 0.95))] * 1000,
+            }
+            for category in RequestTimings.CATEGORIES:
+                row[f"{category}_count"] = sum(s[2][category] for s in samples) / len(samples)
+                row[f"{category}_ms"] = sum(s[3][category] for s in samples) / len(samples) * 1000
+            rows.append(row)
+        return sorted(rows, key=lambda row: row["p95_ms"], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+window = RollingWindow()
+
+
+# ----------------------------------------------------------------------------------
+# WRAPPERS
+# ----------------------------------------------------------------------------------
+def query_timer(execute, sql, params, many, context):
+    """
+    Database execute_wrapper installed on every connection (see apps.py).
+    """
+    if _current.get() is None:
+        return execute(sql, params, many, context)
+    with timed("db"):
+        return execute(sql, params, many, context)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+def install_stripe_timer():
+    """
+    Wraps the Stripe client's HTTP layer so every API call (retries
+    included) is timed and failed calls are counted in the metrics.
+    """
+    import stripe
+
+    if stripe.default_http_client is None:
+        stripe.default_http_client = stripe.new_default_http_client(
+            verify_ssl_certs=stripe.verify_ssl_certs, proxy=stripe.proxy,
+        )
+    client = stripe.default_http_client
+    if getattr(client, "_timed", False):
+        return
+    request_with_retries = client.request_with_retries
+
+    def timed_request_with_retries(*args, **kwargs):
+        with timed("stripe"):
+            try:
+                result = request_with_retries(*args, **kwargs)
+            except stripe.error.APIConnectionError:
+                metrics.stripe_errors.labels("network").inc()
+                raise
+        metrics.observe_stripe_response(result)
+        return result
+
+    client.request_with_retries = timed_request_with_retries
+    client._timed = True
+
+
+class TimedEmailConnection:
+    """
+    Wraps an email backend so connection setup and sends count as SMTP time.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def open(self):
+        with timed("smtp"):
+            return self.connection.open()
+
+    def close(self):
+        return self.connection.close()
+
+    def send_messages(self, messages):
+        with timed("smtp"):
+            return self.connection.send_messages(messages)
+
+    def __getattr__(self, name):
+        # copy.copy() (the locmem backend copies each message with its
+        # connection) builds the wrapper without __init__
+        if name == "connection":
+            raise AttributeError(name)
+        return getattr(self.connection, name)
+
+
+# ----------------------------------------------------------------------------------
+# MIDDLEWARE
+# ----------------------------------------------------------------------------------
+class RequestTimingMiddleware:
+    """
+    Times every request; adds Server-Timing, logs one JSON line and records
+    the sample under the resolved URL name (rolling window and metrics).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings(request.path)
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings(request.path)
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    def _finish(self, request, response, timings):
+        total = timings.total()
+        match = getattr(request, "resolver_match", None)
+        timings.name = (match.url_name or match.view_name) if match else "unresolved"
+        response["Server-Timing"] = timings.server_timing(total)
+        record = timings.as_dict(total)
+        record.update(method=request.method, path=request.path, status=response.status_code)
+        logger.info(json.dumps(record))
+        window.add(timings.name, timings, total)
+        metrics.observe_request(timings.name, request.method, response.status_code, total)
+        return response
@@ -0,0 +1,258 @@
+# main/live.py
+#
+# Live updates for the scheduler and operator console, streamed as
+# Server-Sent Events from the ASGI app. Each process keeps one in-process
+# broker; every open page holds one subscription on it. A fan-out backend
+# carries published events to the brokers of every process:
+#
+#   LocalFanout  - same process only (single worker, tests)
+#   RedisFanout  - Redis pub/sub; one listener connection per process that
+#                  serves streams (started by the first SSE view, not by
+#                  publishing, so web and worker processes that only
+#                  publish hold no extra connection)
+#
+# Pick one with settings.LIVE_FANOUT_BACKEND (dotted path).
+
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+OPERATORS_TOPIC = "operators"
+SUBSCRIBER_QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 20
+# Listener reconnects: 1s, 2s, 4s ... capped
+RECONNECT_BASE_SECONDS = 1
+RECONNECT_MAX_SECONDS = 30
+
+logger = logging.getLogger(__name__)
+
+
+def date_topic(day):
+    return f"date:{day.isoformat()}"
+
+
+# ----------------------------------------------------------------------------------
+# IN-PROCESS BROKER
+# ----------------------------------------------------------------------------------
+class Subscription:
+    """
+    One client's queue on the broker. Events are handed over from any
+    thread onto the event loop the subscriber is waiting on.
+    """
+
+    def __init__(self, broker, topics):
+        self.broker = broker
+        self.topics = topics
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, message):
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # A stalled client doesn't need every event, only to resync
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """
+    Topic -> subscriptions for this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._topics = {}
+
+    def subscribe(self, topics):
+        subscription = Subscription(self, list(topics))
+        with self._lock:
+            for topic in subscription.topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+
+    def dispatch(self, topic, message):
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        for subscription in subscribers:
+            try:
+                subscription.deliver(message)
+            except RuntimeError:
+                # Its event loop is gone
+                self.unsubscribe(subscription)
+
+    def broadcast(self, message):
+        """
+        Sends a message to every subscription on every topic.
+        """
+        with self._lock:
+            topics = list(self._topics)
+        for topic in topics:
+            self.dispatch(topic, message)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({s for subscribers in self._topics.values() for s in subscribers})
+
+
+broker = Broker()
+
+
+# ----------------------------------------------------------------------------------
+# FAN-OUT BACKENDS
+# ----------------------------------------------------------------------------------
+class LocalFanout:
+    """
+    Delivers straight to this process's broker.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, topic, message):
+        self.broker.dispatch(topic, message)
+
+
+class RedisFanout:
+    """
+    Publishes to Redis; once start() is called, a daemon thread relays
+    every event from the shared channel into the local broker.
+    """
+    CHANNEL_PREFIX = "studio:live:"
+
+    def __init__(self, broker):
+        import redis
+
+        self.broker = broker
+        self.client = redis.Redis.from_url(settings.LIVE_FANOUT_URL)
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def publish(self, topic, message):
+        self.client.publish(self.CHANNEL_PREFIX + topic, json.dumps(message))
+
+    def start(self):
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        failures = 0
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.CHANNEL_PREFIX + "*")
+                if failures:
+                    logger.info("Live update listener reconnected after %s attempt(s)", failures)
+                    # Events published while disconnected are lost; pages reload instead
+                    self.broker.broadcast({"type": "resync"})
+                failures = 0
+                for item in pubsub.listen():
+                    topic = item["channel"].decode()[len(self.CHANNEL_PREFIX):]
+                    self.broker.dispatch(topic, json.loads(item["data"]))
+                logger.warning("Live update listener stream ended")
+            except Exception:
+                logger.warning("Live update listener lost Redis", exc_info=True)
+            failures += 1
+            delay = min(RECONNECT_BASE_SECONDS * 2 ** (failures - 1), RECONNECT_MAX_SECONDS)
+            logger.info("Live update listener reconnecting in %ss", delay)
+            time.sleep(delay)
+
+
+_fanout = None
+_fanout_lock = threading.Lock()
+
+
+def get_fanout():
+    global _fanout
+    with _fanout_lock:
+        if _fanout is None:
+            _fanout = import_string(settings.LIVE_FANOUT_BACKEND)(broker)
+        return _fanout
+
+
+# ----------------------------------------------------------------------------------
+# PUBLISHING
+# ----------------------------------------------------------------------------------
+def publish(topic, message):
+    try:
+        get_fanout().publish(topic, message)
+    except Exception as e:
+        # Live updates are best-effort; the pages still work on reload
+        logger.warning("Live update for %s not published: %s", topic, e)
+
+
+def publish_dates(dates):
+    """
+    Tells scheduler pages that availability on these dates changed.
+    """
+    for day in dates:
+        publish(date_topic(day), {"type": "availability", "date": day.isoformat()})
+
+
+def publish_request(request_row, created):
+    """
+    Tells operator consoles about a new or updated reservation request.
+    """
+    publish(OPERATORS_TOPIC, {
+        "type": "request",
+        "id": request_row.id,
+        "status": request_row.status,
+        "created": created,
+        "date": request_row.requested_date.isoformat() if request_row.requested_date else None,
+    })
+
+
+# ----------------------------------------------------------------------------------
+# STREAMING
+# ----------------------------------------------------------------------------------
+def _sse(message):
+    return f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+
+
+async def event_stream(topics):
+    """
+    Async iterator of SSE frames for the given topics, with keepalive
+    comments so proxies don't close idle connections.
+    """
+    subscription = broker.subscribe(topics)
+    # Make sure this process also hears events published by others
+    fanout = get_fanout()
+    if hasattr(fanout, "start"):
+        fanout.start()
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                message = await subscription.get(KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield _sse(message)
+    finally:
+        subscription.close()
@@ -0,0 +1,101 @@
+# main/management/commands/backfill_booking_ranges.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from main.availability import affected_dates, invalidate_dates, refresh_days
+from main.models import BookedSession
+
+RANGE_FIELDS = ["starts_at", "ends_at", "booked_datetime"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills starts_at/ends_at (and booked_datetime) on bookings saved before "
+        "those columns existed. Works through the table by id in small batches, "
+        "each committed on its own, so writers are never blocked for long. "
+        "Safe to interrupt and re-run: only rows still missing a range are read. "
+        "Migration 0024 runs the same backfill; this is for re-runs and big tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows updated per transaction.")
+        parser.add_argument("--sleep", type=float, default=0.0, help="Seconds to pause between batches.")
+        parser.add_argument("--start-id", type=int, default=0, help="Skip rows with a lower id.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the rows to fill.")
+
+    def handle(self, *args, **options):
+        missing = self._missing()
+        if options["dry_run"]:
+            self.stdout.write(f"{missing.count()} bookings have no starts_at/ends_at.")
+            return
+
+        last_id = options["start_id"] - 1
+        filled = skipped = 0
+        while True:
+            ids = list(
+                missing.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:options["batch_size"]]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            done, conflicts = self._fill(ids)
+            filled += done
+            skipped += len(conflicts)
+            for row in conflicts:
+                self.stderr.write(f"Booking {row.id} ({row.booked_date} {row.booked_start_time}) overlaps another; left empty.")
+            self.stdout.write(f"  up to id {last_id}: {filled} filled")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Filled {filled} bookings; {skipped} overlapping left empty; {self._missing().count()} still missing."
+        ))
+
+    # ------------------------------------------------------------------------------
+    def _missing(self):
+        return BookedSession.objects.filter(Q(starts_at__isnull=True) | Q(ends_at__isnull=True))
+
+    def _fill(self, ids):
+        """
+        Fills one batch. Rows are locked only for this transaction and only
+        if still empty, so a booking saved meanwhile isn't overwritten.
+        Returns (rows filled, rows that overlap an active booking).
+        """
+        conflicts = []
+        with transaction.atomic():
+            rows = list(
+                self._missing().filter(id__in=ids).select_for_update()
+                .only("id", "booked_date", "booked_start_time", "duration_hours", *RANGE_FIELDS)
+            )
+            for row in rows:
+                row.fill_range()
+            try:
+                with transaction.atomic():
+                    BookedSession.objects.bulk_update(rows, RANGE_FIELDS)
+                filled = rows
+            except IntegrityError:
+                # The overlap constraint now sees these rows; find the culprits
+                filled = []
+                for row in rows:
+                    try:
+                        with transaction.atomic():
+                            BookedSession.objects.filter(id=row.id).update(
+                                **{field: getattr(row, field) for field in RANGE_FIELDS}
+                            )
+                        filled.append(row)
+                    except IntegrityError:
+                        conflicts.append(row)
+
+            # bulk_update skips the signals; availability reads rows by range,
+            # so these only now count towards their days
+            dates = {
+                day for row in filled
+                for day in affected_dates(row.booked_date, row.booked_start_time, row.duration_hours)
+            }
+            refresh_days(dates)
+            transaction.on_commit(lambda: invalidate_dates(dates))
+        return len(filled), conflicts
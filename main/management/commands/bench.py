@@ -0,0 +1,215 @@
+# main/management/commands/bench.py
+
+import json
+import logging
+import platform
+import statistics
+import time
+from datetime import date, timedelta
+
+import django
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from main.fake_stripe import FakeStripeServer
+from main.models import Invite
+
+from .seed_studio import SEED_PREFIX
+
+# How each URL name is requested. Anything not listed is a plain GET as admin.
+#   user   - "admin", "operator", "member" or None (anonymous)
+#   query  - callable returning the query string
+#   skip   - reason the URL isn't benchmarked
+SCENARIOS = {
+    "home": {"user": "member"},
+    "monthly_calendar": {"user": "member", "query": lambda: f"year={date.today().year}&month={date.today().month}"},
+    "daily_scheduler": {"user": "member", "query": lambda: f"date={date.today() + timedelta(days=7)}"},
+    "availability_api": {
+        "user": "member",
+        "query": lambda: f"from={date.today()}&to={date.today() + timedelta(days=30)}",
+    },
+    "reservation_form": {"user": "member"},
+    "member_login": {"user": None},
+    "guest_login": {"user": None},
+    "member_dashboard": {"user": "member"},
+    "member_profile": {"user": "member"},
+    "membership_management": {"user": "member"},
+    "session_manager": {"user": "member"},
+    "pay_membership": {"user": "member"},
+    "customer_portal": {"user": "member"},
+    "payment_success": {"user": "member"},
+    "operator_dashboard": {"user": "operator"},
+    "operator_console": {"user": "operator"},
+    "operator_events": {"user": "operator"},
+    "scheduler_events": {"user": "member", "query": lambda: f"date={date.today()}"},
+    "member_logout": {"skip": "ends the session"},
+    "cancel_membership": {"skip": "cancels the membership on GET"},
+    "stripe_webhook": {"skip": "needs a signed Stripe payload"},
+}
+
+
+def percentile(sorted_values, share):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * share))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests every URL in myproject/urls.py (plus the admin changelists) "
+        "through the test client against the current database and reports "
+        "latency percentiles and query counts. Run seed_studio first; use "
+        "--json to keep a result and --baseline to compare against one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2, help="Untimed requests per URL first.")
+        parser.add_argument("--only", nargs="*", default=[], help="URL names to run (default: all).")
+        parser.add_argument("--json", dest="json_path", help="Write the results to this file.")
+        parser.add_argument("--baseline", help="Earlier --json output to compare against.")
+        parser.add_argument("--stripe-latency-ms", type=float, default=0.0, help="Fake Stripe API latency.")
+
+    def handle(self, *args, **options):
+        self.users = self._users()
+        targets = self._targets(options["only"])
+
+        # One JSON log line per request would drown the report
+        perf_logger = logging.getLogger("main.perf")
+        perf_level = perf_logger.level
+        perf_logger.setLevel(logging.WARNING)
+        server = FakeStripeServer(latency=options["stripe_latency_ms"] / 1000).start().install()
+        try:
+            results = {}
+            for name, path, scenario in targets:
+                if "skip" in scenario:
+                    results[name] = {"path": path, "skipped": scenario["skip"]}
+                    continue
+                results[name] = self._run(path, scenario, options["warmup"], options["iterations"])
+        finally:
+            server.stop()
+            perf_logger.setLevel(perf_level)
+
+        baseline = self._load(options["baseline"]) if options["baseline"] else None
+        self._print(results, baseline)
+
+        if options["json_path"]:
+            report = {
+                "meta": {
+                    "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "iterations": options["iterations"],
+                    "database": connection.vendor,
+                    "python": platform.python_version(),
+                    "django": django.get_version(),
+                    "settings": settings.SETTINGS_MODULE,
+                },
+                "results": results,
+            }
+            with open(options["json_path"], "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Wrote {options['json_path']}")
+
+    # ------------------------------------------------------------------------------
+    def _users(self):
+        users = {
+            "admin": User.objects.filter(username=f"{SEED_PREFIX}admin").first(),
+            "operator": User.objects.filter(username=f"{SEED_PREFIX}operator-0").first(),
+            "member": User.objects.filter(username=f"{SEED_PREFIX}member-0").first(),
+        }
+        if not all(users.values()):
+            raise CommandError("Seeded accounts not found; run `manage.py seed_studio` first.")
+        return users
+
+    def _targets(self, only):
+        """
+        (name, path, scenario) for every named route, walking includes.
+        The admin include contributes its index and one changelist per
+        registered model.
+        """
+        targets = []
+        for pattern in get_resolver().url_patterns:
+            if isinstance(pattern, URLResolver):
+                if getattr(pattern, "app_name", None) == "admin":
+                    targets.append(("admin:index", reverse("admin:index"), {"user": "admin"}))
+                    for model in admin.site._registry:
+                        name = f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist"
+                        targets.append((name, reverse(name), {"user": "admin"}))
+                continue
+            if not isinstance(pattern, URLPattern) or not pattern.name:
+                continue
+            scenario = SCENARIOS.get(pattern.name, {"user": "admin"})
+            if pattern.name == "register":
+                invite = Invite.objects.filter(is_used=False).order_by("-expires_at").first()
+                if invite is None:
+                    targets.append((pattern.name, str(pattern.pattern), {"skip": "no unused invite"}))
+                    continue
+                path = reverse("register", args=[invite.token])
+                scenario = {"user": None}
+            else:
+                path = reverse(pattern.name)
+            targets.append((pattern.name, path, scenario))
+
+        if only:
+            targets = [target for target in targets if target[0] in only]
+        return targets
+
+    def _run(self, path, scenario, warmup, iterations):
+        client = Client()
+        user = scenario.get("user")
+        if user:
+            client.force_login(self.users[user])
+        url = path + ("?" + scenario["query"]() if "query" in scenario else "")
+
+        for _ in range(warmup):
+            client.get(url)
+
+        timings, queries, statuses = [], [], set()
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append(time.perf_counter() - started)
+            queries.append(len(captured))
+            statuses.add(response.status_code)
+
+        timings.sort()
+        return {
+            "path": url,
+            "user": user,
+            "status": sorted(statuses),
+            "p50_ms": round(statistics.median(timings) * 1000, 2),
+            "p95_ms": round(percentile(timings, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(timings, 0.99) * 1000, 2),
+            "max_ms": round(timings[-1] * 1000, 2),
+            "queries": round(statistics.mean(queries), 1),
+            "queries_max": max(queries),
+        }
+
+    def _load(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)["results"]
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Can't read baseline {path}: {e}")
+
+    def _print(self, results, baseline):
+        header = f"{'URL name':<42} {'status':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}"
+        if baseline:
+            header += f" {'Δp50':>8} {'Δqueries':>9}"
+        self.stdout.write(header)
+        for name, row in results.items():
+            if "skipped" in row:
+                self.stdout.write(f"{name:<42} skipped: {row['skipped']}")
+                continue
+            line = (
+                f"{name:<42} {','.join(map(str, row['status'])):<10} {row['p50_ms']:8.1f} "
+                f"{row['p95_ms']:8.1f} {row['p99_ms']:8.1f} {row['queries']:8.1f}"
+            )
+            before = (baseline or {}).get(name)
+            if before and "p50_ms" in before:
+                line += f" {row['p50_ms'] - before['p50_ms']:+8.1f} {row['queries'] - before['queries']:+9.1f}"
+            self.stdout.write(line)
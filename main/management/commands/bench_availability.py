@@ -0,0 +1,138 @@
+# main/management/commands/bench_availability.py
+
+import random
+import time
+from datetime import date, time as dtime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from main.availability import day_availability, load_availability, refresh_days, studio_days
+from main.models import BookedSession, PendingSessionRequest
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the availability engine against a synthetic year of bookings. "
+        "All generated rows are rolled back when the run finishes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=365, help="Number of days to generate.")
+        parser.add_argument("--per-day", type=int, default=6, help="Bookings generated per day.")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options["days"], options["per_day"], options["seed"])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _run(self, days, per_day, seed):
+        rng = random.Random(seed)
+        user = User.objects.create_user(username=f"bench-{seed}-{time.time_ns()}")
+        # Far enough ahead to stay clear of the database's own bookings
+        start = date.today() + timedelta(days=3650)
+        end = start + timedelta(days=days - 1)
+
+        booked, pending = [], []
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            hour = 8
+            for _ in range(per_day):
+                # Laid out back to back: the database rejects overlapping bookings
+                hour += rng.randint(0, 1)
+                hours = min(rng.randint(1, 4), 24 - hour)
+                if hours < 1:
+                    break
+                if rng.random() < 0.7:
+                    booked.append(BookedSession(
+                        booked_by=user,
+                        booked_date=day,
+                        booked_start_time=dtime(hour),
+                        duration_hours=hours,
+                        status=rng.choice(["booked", "paid", "canceled"]),
+                    ))
+                else:
+                    pending.append(PendingSessionRequest(
+                        requester_name="Bench",
+                        requester_email="bench@example.com",
+                        requested_date=day,
+                        requested_time=dtime(hour),
+                        hours=hours,
+                        status=rng.choice(["pending", "approved", "declined"]),
+                    ))
+                hour += hours
+        for session in booked:
+            session.fill_range()
+        BookedSession.objects.bulk_create(booked, batch_size=1000)
+        PendingSessionRequest.objects.bulk_create(pending, batch_size=1000)
+        self.stdout.write(f"Seeded {len(booked)} bookings and {len(pending)} requests over {days} days.")
+        self._report("refresh_days for range", days, lambda: refresh_days(
+            [start + timedelta(days=i) for i in range(days + 1)]
+        ))
+
+        self._report("legacy per-day loops", days, lambda: [
+            self._legacy_day(start + timedelta(days=i)) for i in range(days)
+        ])
+        self._report("day_availability per day", days, lambda: [
+            day_availability(start + timedelta(days=i)) for i in range(days)
+        ])
+        self._report("load_availability for range", days, lambda: load_availability(start, end))
+        self._report("studio_days for range", days, lambda: studio_days(start, end))
+
+        year = load_availability(start, end)
+        self._report("free_runs(3) over loaded range", days, lambda: [
+            d.free_runs(3) for d in year.values()
+        ], queries=False)
+
+    def _report(self, label, days, fn, queries=True):
+        started = time.perf_counter()
+        with _query_counter() as counter:
+            fn()
+        elapsed = time.perf_counter() - started
+        line = f"{label:<34} {elapsed * 1000:9.1f} ms total  {elapsed * 1e6 / days:9.1f} us/day"
+        if queries:
+            line += f"  {counter['count']} queries"
+        self.stdout.write(line)
+
+    @staticmethod
+    def _legacy_day(day):
+        # Previous daily_scheduler_view logic: two querysets, one hour per booking
+        booked_map = {}
+        for session in BookedSession.objects.filter(booked_date=day, status__in=["booked", "paid"]):
+            booked_map[session.booked_start_time.hour] = session.booked_by
+        pending_map = {}
+        for req in PendingSessionRequest.objects.filter(
+            requested_date=day, status__in=["pending", "approved", "paid"]
+        ):
+            for h in range(req.requested_time.hour, req.requested_time.hour + req.hours):
+                pending_map[h] = req.status
+        return booked_map, pending_map
+
+
+class _query_counter:
+    """
+    Counts queries executed inside the block without needing DEBUG=True.
+    """
+
+    def __enter__(self):
+        self.state = {"count": 0}
+
+        def wrapper(execute, sql, params, many, context):
+            self.state["count"] += 1
+            return execute(sql, params, many, context)
+
+        self._ctx = connection.execute_wrapper(wrapper)
+        self._ctx.__enter__()
+        return self.state
+
+    def __exit__(self, *exc):
+        return self._ctx.__exit__(*exc)
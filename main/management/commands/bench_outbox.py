@@ -0,0 +1,118 @@
+# main/management/commands/bench_outbox.py
+
+import statistics
+import time
+
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from main.outbox import drain, enqueue
+
+# Simulated SMTP costs, set from the command line
+_latency = {"connect": 0.0, "message": 0.0}
+
+
+class SlowLocmemBackend(LocmemBackend):
+    """
+    locmem backend that sleeps like a remote SMTP server would:
+    once per connection handshake and once per message.
+    """
+
+    _open = False
+
+    def open(self):
+        if self._open:
+            return False
+        time.sleep(_latency["connect"])
+        self._open = True
+        return True
+
+    def close(self):
+        self._open = False
+
+    def send_messages(self, messages):
+        new_connection = self.open()
+        time.sleep(_latency["message"] * len(messages))
+        try:
+            return super().send_messages(messages)
+        finally:
+            if new_connection:
+                self.close()
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares request-side email latency with direct SMTP sends against the "
+        "EmailOutbox, using a locmem backend with simulated SMTP latency. "
+        "Queued rows are rolled back when the run finishes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=200)
+        parser.add_argument("--connect-ms", type=float, default=150.0, help="Simulated SMTP handshake.")
+        parser.add_argument("--send-ms", type=float, default=50.0, help="Simulated per-message send.")
+
+    def handle(self, *args, **options):
+        _latency["connect"] = options["connect_ms"] / 1000
+        _latency["message"] = options["send_ms"] / 1000
+        count = options["messages"]
+        backend = f"{__name__}.SlowLocmemBackend"
+
+        with override_settings(EMAIL_BACKEND=backend):
+            # Old path: every helper opened its own SMTP connection inside the request
+            direct = []
+            for i in range(count):
+                started = time.perf_counter()
+                self._message(i).send()
+                direct.append(time.perf_counter() - started)
+            self._report("direct send (per request)", direct)
+
+            try:
+                with transaction.atomic():
+                    queued = []
+                    for i in range(count):
+                        started = time.perf_counter()
+                        with transaction.atomic():
+                            enqueue(self._message(i))
+                        queued.append(time.perf_counter() - started)
+                    self._report("outbox enqueue (per request)", queued)
+
+                    started = time.perf_counter()
+                    total_sent = 0
+                    while True:
+                        sent, failed = drain(batch_size=50)
+                        total_sent += sent
+                        if not sent and not failed:
+                            break
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f"{'outbox worker drain':<30} {total_sent} messages in {elapsed * 1000:.1f} ms "
+                        f"({elapsed * 1000 / max(total_sent, 1):.2f} ms/message)"
+                    )
+                    raise _Rollback()
+            except _Rollback:
+                pass
+
+    @staticmethod
+    def _message(i):
+        msg = EmailMessage(
+            subject=f"Benchmark {i}",
+            body="<p>Benchmark message</p>",
+            from_email="bench@example.com",
+            to=[f"bench{i}@example.com"],
+        )
+        msg.content_subtype = "html"
+        return msg
+
+    def _report(self, label, samples):
+        samples = sorted(samples)
+        p50 = statistics.median(samples)
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        self.stdout.write(f"{label:<30} p50 {p50 * 1000:8.2f} ms  p99 {p99 * 1000:8.2f} ms")
@@ -0,0 +1,72 @@
+# main/management/commands/bench_payment_links.py
+
+import time
+from datetime import date, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.fake_stripe import FakeStripeServer
+from main.models import PendingSessionRequest
+from main.payment_links import ensure_payment_links
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Times Checkout link creation for a batch of approvals against the fake "
+        "Stripe API with simulated latency: one at a time versus the thread pool, "
+        "then a resend that reuses the stored links. Rolls back its data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--latency-ms", type=float, default=200.0, help="Simulated Stripe API latency.")
+
+    def handle(self, *args, **options):
+        server = FakeStripeServer(latency=options["latency_ms"] / 1000).start().install()
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback()
+        except _Rollback:
+            pass
+        finally:
+            server.stop()
+
+    def _requests(self, count):
+        day = date.today() + timedelta(days=30)
+        return PendingSessionRequest.objects.bulk_create([
+            PendingSessionRequest(
+                requester_name=f"Bench {i}",
+                requester_email=f"bench{i}@example.com",
+                requester_phone="5550000000",
+                requested_date=day,
+                requested_time=dt_time(8 + i % 16),
+                hours=1,
+            )
+            for i in range(count)
+        ])
+
+    def _run(self, options):
+        count = options["requests"]
+        for label, workers in (("sequential", 1), (f"pool of {options['workers']}", options["workers"])):
+            rows = self._requests(count)
+            started = time.perf_counter()
+            batch = ensure_payment_links(rows, max_workers=workers)
+            self._report(label, batch, time.perf_counter() - started)
+
+        # Resend: every link is stored and still live
+        started = time.perf_counter()
+        batch = ensure_payment_links(rows, max_workers=options["workers"])
+        self._report("resend", batch, time.perf_counter() - started)
+
+    def _report(self, label, batch, elapsed):
+        self.stdout.write(
+            f"{label:<12} {elapsed * 1000:8.0f} ms  created {batch.created:4}  "
+            f"reused {batch.reused:4}  failed {len(batch.failed):3}"
+        )
@@ -0,0 +1,126 @@
+# main/management/commands/coalesce_bookings.py
+
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils.timezone import localdate, make_aware
+
+from main.availability import deferred_refresh, invalidate_dates, load_availability, refresh_days
+from main.models import BookedSession
+
+
+def merge_plan(rows):
+    """
+    Given sessions ordered by member and start, returns
+    (keep, absorbed) pairs: `keep` is the first row of a back-to-back run
+    by the same member with the same status and no notes, its duration
+    already extended; `absorbed` are the rows it replaces. Sessions that
+    confirm a reservation request stay as they are.
+    """
+    plan = []
+    keep, absorbed, end = None, [], None
+    for row in rows:
+        if (
+            keep is not None
+            and row.booked_by_id == keep.booked_by_id
+            and row.booked_date == keep.booked_date
+            and row.status == keep.status
+            and not row.notes
+            and row.source_request_id is None
+            and row.starts_at == end
+        ):
+            absorbed.append(row)
+            keep.duration_hours += row.duration_hours
+            end = row.ends_at
+            continue
+        if absorbed:
+            plan.append((keep, absorbed))
+        standalone = row.notes or row.source_request_id is not None
+        keep, absorbed, end = (None, [], None) if standalone else (row, [], row.ends_at)
+    if absorbed:
+        plan.append((keep, absorbed))
+    return plan
+
+
+class Command(BaseCommand):
+    help = (
+        "Merges back-to-back booked/paid sessions of the same member into one "
+        "row with the combined duration, a few days per transaction. Prints row "
+        "counts and availability load times before and after."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-days", type=int, default=31, help="Dates merged per transaction.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be merged.")
+
+    def handle(self, *args, **options):
+        sessions = BookedSession.objects.filter(status__in=BookedSession.ACTIVE_STATUSES)
+        bounds = sessions.aggregate(first=Min("starts_at"), last=Max("starts_at"))
+        if bounds["first"] is None:
+            self.stdout.write("No bookings to merge.")
+            return
+
+        first, last = localdate(bounds["first"]), localdate(bounds["last"])
+        rows_before = BookedSession.objects.count()
+        load_before = self._time_load(first, last)
+
+        merged = absorbed = 0
+        day = first
+        while day <= last:
+            batch_end = min(day + timedelta(days=options["batch_days"] - 1), last)
+            runs, rows = self._merge(day, batch_end, options["dry_run"])
+            merged += runs
+            absorbed += rows
+            day = batch_end + timedelta(days=1)
+
+        verb = "Would merge" if options["dry_run"] else "Merged"
+        self.stdout.write(f"{verb} {absorbed} rows into {merged} sessions between {first} and {last}.")
+        if options["dry_run"]:
+            return
+
+        rows_after = BookedSession.objects.count()
+        load_after = self._time_load(first, last)
+        self.stdout.write(f"booked_sessions rows: {rows_before} -> {rows_after}")
+        self.stdout.write(
+            f"load_availability({first}..{last}): {load_before * 1000:.1f} ms -> {load_after * 1000:.1f} ms"
+        )
+
+    def _merge(self, start, end, dry_run):
+        with transaction.atomic():
+            rows = list(
+                BookedSession.objects.select_for_update()
+                .filter(
+                    starts_at__gte=make_aware(datetime.combine(start, dt_time.min)),
+                    starts_at__lt=make_aware(datetime.combine(end + timedelta(days=1), dt_time.min)),
+                    status__in=BookedSession.ACTIVE_STATUSES,
+                )
+                .order_by("booked_by_id", "starts_at", "id")
+            )
+            plan = merge_plan(rows)
+            if dry_run or not plan:
+                return len(plan), sum(len(absorbed) for _, absorbed in plan)
+
+            # Delete first: widening a row over its neighbours while they
+            # still exist would trip the overlap constraint
+            kept = [keep for keep, _ in plan]
+            with deferred_refresh():
+                BookedSession.objects.filter(id__in=[row.id for _, absorbed in plan for row in absorbed]).delete()
+                for row in kept:
+                    row.fill_range()
+                BookedSession.objects.bulk_update(kept, ["duration_hours", "starts_at", "ends_at", "booked_datetime"])
+
+                # bulk_update skips the signals; the occupied hours are
+                # unchanged but the StudioDay rows and cached availability
+                # still name the deleted rows
+                dates = {row.booked_date for row in kept}
+                refresh_days(dates)
+            transaction.on_commit(lambda: invalidate_dates(dates))
+        return len(plan), sum(len(absorbed) for _, absorbed in plan)
+
+    def _time_load(self, start, end):
+        started = time.perf_counter()
+        load_availability(start, end)
+        return time.perf_counter() - started
@@ -0,0 +1,30 @@
+# main/management/commands/fake_stripe.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.fake_stripe import FakeStripeServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs an offline fake of the Stripe API (Customer, Subscription, Price, "
+        "checkout.Session, billing_portal.Session). Start the site with "
+        "STRIPE_API_BASE set to the printed URL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=12111)
+
+    def handle(self, *args, **options):
+        server = FakeStripeServer(options["host"], options["port"]).start()
+        self.stdout.write(f"Fake Stripe API listening on {server.url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
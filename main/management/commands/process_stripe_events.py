@@ -0,0 +1,28 @@
+# main/management/commands/process_stripe_events.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.stripe_events import process_events
+
+
+class Command(BaseCommand):
+    help = "Applies stored Stripe webhook events in order, skipping events already processed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds to sleep when no events are waiting.")
+        parser.add_argument("--once", action="store_true", help="Process everything that is waiting, then exit.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        while True:
+            processed, failed = process_events(batch_size)
+            if processed or failed:
+                self.stdout.write(f"Stripe events: {processed} processed, {failed} failed")
+            if processed + failed >= batch_size:
+                continue  # more may be waiting
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
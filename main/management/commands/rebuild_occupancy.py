@@ -0,0 +1,99 @@
+# main/management/commands/rebuild_occupancy.py
+
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from main.availability import day_row, invalidate_dates, load_availability, refresh_days
+from main.models import BookedSession, PendingSessionRequest, StudioDay
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}; use YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks the StudioDay occupancy index against the bookings and requests "
+        "it is built from and rewrites the days that differ. Use --check to only "
+        "report (exits with an error if anything differs). Covers every date with "
+        "a booking, request or StudioDay row unless --from/--to are given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", help="First date (YYYY-MM-DD).")
+        parser.add_argument("--to", dest="end", help="Last date (YYYY-MM-DD).")
+        parser.add_argument("--batch-days", type=int, default=31, help="Dates checked per query.")
+        parser.add_argument("--check", action="store_true", help="Report differences without repairing.")
+
+    def handle(self, *args, **options):
+        bounds = self._bounds()
+        start = _parse_date(options["start"]) if options["start"] else bounds[0]
+        end = _parse_date(options["end"]) if options["end"] else bounds[1]
+        if start is None or end is None:
+            self.stdout.write("Nothing to check.")
+            return
+        if end < start:
+            raise CommandError("--to is before --from.")
+
+        checked, stale = 0, []
+        day = start
+        while day <= end:
+            batch_end = min(day + timedelta(days=options["batch_days"] - 1), end)
+            differing = self._compare(day, batch_end)
+            for changed in differing:
+                self.stdout.write(f"  {changed}: index differs from bookings")
+            if differing and not options["check"]:
+                # Recomputed under the rows' locks, so a write that landed
+                # since the comparison is taken into account
+                refresh_days(differing)
+                invalidate_dates(differing)
+            stale += differing
+            checked += (batch_end - day).days + 1
+            day = batch_end + timedelta(days=1)
+
+        if options["check"]:
+            if stale:
+                raise CommandError(f"{len(stale)} of {checked} days differ from the bookings.")
+            self.stdout.write(self.style.SUCCESS(f"All {checked} days match ({start} to {end})."))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} days ({start} to {end}); rewrote {len(stale)}."))
+
+    # ------------------------------------------------------------------------------
+    def _bounds(self):
+        """
+        Earliest and latest date that has a booking, request or index row.
+        """
+        firsts, lasts = [], []
+        for queryset, field in (
+            (BookedSession.objects.all(), "booked_date"),
+            (PendingSessionRequest.objects.all(), "requested_date"),
+            (StudioDay.objects.all(), "date"),
+        ):
+            bounds = queryset.aggregate(first=Min(field), last=Max(field))
+            if bounds["first"] is not None:
+                firsts.append(bounds["first"])
+                lasts.append(bounds["last"])
+        if not firsts:
+            return None, None
+        # A session late on the last date can spill into the next one
+        return min(firsts), max(lasts) + timedelta(days=1)
+
+    def _compare(self, start, end):
+        """
+        Dates in [start, end] whose StudioDay row doesn't match what the
+        source tables give. A missing row matches an empty day.
+        """
+        computed = load_availability(start, end)
+        stored = {
+            row.date: (row.mask, row.slots)
+            for row in StudioDay.objects.filter(date__range=(start, end))
+        }
+        return [
+            day for day, availability in computed.items()
+            if stored.get(day, (0, {})) != day_row(availability)
+        ]
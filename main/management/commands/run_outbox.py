@@ -0,0 +1,28 @@
+# main/management/commands/run_outbox.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.outbox import drain
+
+
+class Command(BaseCommand):
+    help = "Delivers queued emails from the EmailOutbox in batches over one SMTP connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument("--once", action="store_true", help="Drain everything that is due, then exit.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        while True:
+            sent, failed = drain(batch_size)
+            if sent or failed:
+                self.stdout.write(f"Outbox batch: {sent} sent, {failed} failed")
+            if sent + failed >= batch_size:
+                continue  # more may be waiting
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,200 @@
+# main/management/commands/seed_studio.py
+
+import random
+import time
+from datetime import date, time as dt_time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.crypto import get_random_string
+from django.utils.timezone import now
+
+from main.availability import CLOSE_HOUR, OPEN_HOUR, deferred_refresh, invalidate_dates, refresh_days
+from main.models import (
+    BookedSession,
+    Invite,
+    MembershipPlan,
+    PendingSessionRequest,
+    UserMembership,
+    UserProfile,
+)
+
+SEED_PREFIX = "seed-"
+SEED_DOMAIN = "seed.example.com"
+SEED_PASSWORD = "studio-seed"
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with synthetic studio data: members with memberships, "
+        "operators, an admin, a year of bookings and reservation requests around "
+        "today, and invites. Re-running replaces the previous seed data. "
+        "Every seeded account's password is '" + SEED_PASSWORD + "'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--members", type=int, default=2000)
+        parser.add_argument("--operators", type=int, default=5)
+        parser.add_argument("--invites", type=int, default=200)
+        parser.add_argument("--days", type=int, default=365, help="Days of schedule, centred on today.")
+        parser.add_argument("--occupancy", type=float, default=0.5, help="Share of open hours that are taken.")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            self._clear()
+            plan = MembershipPlan.objects.get_or_create(name="Seed monthly", stripe_product_id="prod_seed")[0]
+            members = self._users(rng, options["members"], options["operators"], plan)
+            first_day = date.today() - timedelta(days=options["days"] // 2)
+            days = [first_day + timedelta(days=i) for i in range(options["days"])]
+            sessions, requests = self._schedule(rng, days, members, options["occupancy"])
+            invites = self._invites(rng, options["invites"])
+            # bulk_create skips the signals that keep StudioDay current
+            refresh_days(days + [days[-1] + timedelta(days=1)])
+
+        invalidate_dates(days)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(members)} members, {options['operators']} operators, 1 admin, "
+            f"{sessions} bookings, {requests} requests and {invites} invites "
+            f"from {days[0]} to {days[-1]} in {time.perf_counter() - started:.1f}s."
+        ))
+        self.stdout.write(f"Log in as {SEED_PREFIX}admin / {SEED_PREFIX}operator-0 / {SEED_PREFIX}member-0.")
+
+    # ------------------------------------------------------------------------------
+    def _clear(self):
+        with deferred_refresh():
+            # Sessions outlive their user (SET_NULL), so delete them explicitly
+            BookedSession.objects.filter(booked_by__username__startswith=SEED_PREFIX).delete()
+            User.objects.filter(username__startswith=SEED_PREFIX).delete()
+            PendingSessionRequest.objects.filter(requester_email__endswith="@" + SEED_DOMAIN).delete()
+        Invite.objects.filter(email__endswith="@" + SEED_DOMAIN).delete()
+
+    def _users(self, rng, member_count, operator_count, plan):
+        """
+        Creates the accounts with bulk inserts (the profile signal doesn't
+        fire, so profiles are inserted alongside). Returns the members.
+        """
+        password = make_password(SEED_PASSWORD)  # hashing once keeps this fast
+        accounts = [("admin", "admin")]
+        accounts += [(f"operator-{i}", "operator") for i in range(operator_count)]
+        accounts += [(f"member-{i}", "member") for i in range(member_count)]
+
+        users = User.objects.bulk_create([
+            User(
+                username=SEED_PREFIX + name,
+                email=f"{name}@{SEED_DOMAIN}",
+                first_name=name.split("-")[0].title(),
+                last_name=name.split("-")[-1],
+                password=password,
+                is_staff=role == "admin",
+                is_superuser=role == "admin",
+            )
+            for name, role in accounts
+        ], batch_size=BATCH_SIZE)
+        if users[0].pk is None:
+            # Backends that can't return ids from bulk inserts
+            users = list(User.objects.filter(username__startswith=SEED_PREFIX).order_by("id"))
+
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, role=role, phone=f"555{i:07d}", discount=rng.random() < 0.1)
+            for i, (user, (_, role)) in enumerate(zip(users, accounts))
+        ], batch_size=BATCH_SIZE)
+
+        members = users[1 + operator_count:]
+        today = date.today()
+        memberships = []
+        for user in members:
+            active = rng.random() < 0.8
+            memberships.append(UserMembership(
+                user=user,
+                plan=plan,
+                active=active,
+                credits=rng.randint(0, 20),
+                next_billing_date=today + timedelta(days=rng.randint(1, 30)) if active else None,
+                valid_until=None if active else today + timedelta(days=rng.randint(-60, 20)),
+            ))
+        UserMembership.objects.bulk_create(memberships, batch_size=BATCH_SIZE)
+        return members
+
+    def _schedule(self, rng, days, members, occupancy):
+        """
+        Lays out each day hour by hour so booked/paid sessions and live
+        requests never overlap; canceled sessions and declined requests
+        are sprinkled on top. Returns (session count, request count).
+        """
+        today = date.today()
+        sessions, requests = [], []
+
+        def session(day, hour, hours, status, member=None, source_request=None):
+            start = dt_time(hour)
+            row = BookedSession(
+                booked_by=member or rng.choice(members),
+                booked_date=day,
+                booked_start_time=start,
+                duration_hours=hours,
+                status=status,
+                source_request=source_request,
+            )
+            row.fill_range()
+            sessions.append(row)
+
+        def request(day, hour, hours, status):
+            member = rng.choice(members)
+            requests.append(PendingSessionRequest(
+                requester_name=f"{member.first_name} {member.last_name}",
+                requester_email=member.email,
+                requester_phone="5550000000",
+                requested_date=day,
+                requested_time=dt_time(hour),
+                hours=hours,
+                notes=rng.choice(["", "", "Bringing a drummer.", "Need the vocal booth."]),
+                status=status,
+            ))
+            if status == "paid":
+                # Paid requests are confirmed on the calendar
+                session(day, hour, hours, "paid", member, requests[-1])
+
+        for day in days:
+            past = day < today
+            hour = OPEN_HOUR
+            while hour < CLOSE_HOUR:
+                hours = min(rng.randint(1, 3), CLOSE_HOUR - hour)
+                if rng.random() < occupancy / hours:
+                    if rng.random() < 0.75:
+                        session(day, hour, hours, "paid" if past and rng.random() < 0.5 else "booked")
+                    else:
+                        request(day, hour, hours, rng.choice(["approved", "paid"]) if past else "pending")
+                    hour += hours
+                else:
+                    hour += 1
+            for _ in range(rng.randint(0, 2)):
+                start = rng.randrange(OPEN_HOUR, CLOSE_HOUR)
+                if rng.random() < 0.5:
+                    session(day, start, 1, "canceled")
+                else:
+                    request(day, start, 1, "declined")
+
+        # Requests first, so paid sessions can point at them
+        PendingSessionRequest.objects.bulk_create(requests, batch_size=BATCH_SIZE)
+        BookedSession.objects.bulk_create(sessions, batch_size=BATCH_SIZE)
+        return len(sessions), len(requests)
+
+    def _invites(self, rng, count):
+        Invite.objects.bulk_create([
+            Invite(
+                email=f"invitee-{i}@{SEED_DOMAIN}",
+                token=get_random_string(64),
+                role="operator" if rng.random() < 0.1 else "member",
+                expires_at=now() + timedelta(days=rng.randint(-7, 7)),
+                is_used=rng.random() < 0.3,
+            )
+            for i in range(count)
+        ], batch_size=BATCH_SIZE)
+        return count
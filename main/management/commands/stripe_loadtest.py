@@ -0,0 +1,192 @@
+# main/management/commands/stripe_loadtest.py
+
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import stripe
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from main.fake_stripe import (
+    FakeStripeServer,
+    checkout_session_completed,
+    invoice_payment_succeeded,
+    signed_event,
+)
+from main.models import MembershipPlan, StripeEvent, UserMembership
+from main.stripe_events import process_events
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Fires signed invoice.payment_succeeded / checkout.session.completed events "
+        "at stripe_webhook and reports throughput and p50/p99 latency. Runs in-process "
+        "against the fake Stripe API and rolls back its data, or targets a running "
+        "server with --url. That server must itself use a fake Stripe API: start "
+        "`manage.py fake_stripe`, run the server with STRIPE_API_BASE set to its URL "
+        "and pass the same URL as --stripe-api-base. Only events this run created "
+        "are processed and removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=500)
+        parser.add_argument("--members", type=int, default=50)
+        parser.add_argument("--checkout-ratio", type=float, default=0.2,
+                            help="Share of events that are checkout.session.completed.")
+        parser.add_argument("--url", help="Webhook URL of a running server (fixtures are committed, then removed).")
+        parser.add_argument("--stripe-api-base",
+                            help="URL of the fake Stripe API the --url server uses (required with --url).")
+        parser.add_argument("--concurrency", type=int, default=8, help="Parallel senders in --url mode.")
+        parser.add_argument("--process", action="store_true",
+                            help="Also apply the stored events and report processing latency.")
+
+    def handle(self, *args, **options):
+        if options["url"]:
+            self._handle_remote(options)
+            return
+
+        server = FakeStripeServer().start().install()
+        try:
+            try:
+                with transaction.atomic():
+                    self._run(options, self._create_fixtures(options["members"]))
+                    raise _Rollback()
+            except _Rollback:
+                pass
+            self.stdout.write(f"Fake Stripe API served {server.state.request_count} request(s)")
+        finally:
+            server.stop()
+
+    def _handle_remote(self, options):
+        # The server handles these events with its own Stripe settings; a fake
+        # started here would never see its calls, so insist on a shared one
+        api_base = options["stripe_api_base"]
+        if not api_base:
+            raise CommandError(
+                "--url needs --stripe-api-base: run `manage.py fake_stripe`, start the server "
+                "with STRIPE_API_BASE set to its URL and pass that URL here."
+            )
+        if "api.stripe.com" in api_base:
+            raise CommandError("--stripe-api-base must point at a fake Stripe API, not api.stripe.com.")
+
+        previous_api_base = stripe.api_base
+        stripe.api_base = api_base
+        fixtures = self._create_fixtures(options["members"])
+        try:
+            self._run(options, fixtures)
+        finally:
+            self._delete_fixtures(fixtures)
+            stripe.api_base = previous_api_base
+
+    # ---- Fixtures ----
+    def _create_fixtures(self, count):
+        stamp = time.time_ns()
+        plan = MembershipPlan.objects.create(name=f"loadtest-{stamp}", stripe_product_id=f"prod_loadtest{stamp}")
+        members = []
+        for i in range(count):
+            user = User.objects.create_user(username=f"loadtest-{stamp}-{i}", email=f"loadtest{i}@example.com")
+            UserMembership.objects.create(
+                user=user, plan=plan, active=True, credits=0,
+                stripe_subscription_id=f"sub_loadtest{stamp}_{i}",
+            )
+            members.append(user)
+        return {"plan": plan, "members": members, "stamp": stamp, "event_prefix": f"evt_loadtest{stamp}_"}
+
+    def _delete_fixtures(self, fixtures):
+        StripeEvent.objects.filter(event_id__startswith=fixtures["event_prefix"]).delete()
+        User.objects.filter(username__startswith=f"loadtest-{fixtures['stamp']}-").delete()
+        fixtures["plan"].delete()
+
+    def _events(self, options, fixtures):
+        secret = settings.STRIPE_WEBHOOK_SECRET
+        members = fixtures["members"]
+        plan = fixtures["plan"]
+        every = round(1 / options["checkout_ratio"]) if options["checkout_ratio"] > 0 else 0
+        for i in range(options["events"]):
+            user = members[i % len(members)]
+            subscription_id = user.usermembership.stripe_subscription_id
+            event_id = f"{fixtures['event_prefix']}{i}"
+            if every and i % every == 0:
+                obj = checkout_session_completed(user.id, plan.id, subscription_id)
+                yield signed_event("checkout.session.completed", obj, secret, event_id=event_id)
+            else:
+                obj = invoice_payment_succeeded(subscription_id)
+                yield signed_event("invoice.payment_succeeded", obj, secret, event_id=event_id)
+
+    # ---- Run ----
+    def _run(self, options, fixtures):
+        events = list(self._events(options, fixtures))
+        if options["url"]:
+            latencies, errors, elapsed = self._fire_http(options["url"], events, options["concurrency"])
+        else:
+            latencies, errors, elapsed = self._fire_in_process(events)
+        self._report("webhook", latencies, elapsed, errors)
+
+        if options["process"]:
+            # Only this run's events; anything else pending is left for the real worker
+            started = time.perf_counter()
+            while any(process_events(batch_size=100, event_id_prefix=fixtures["event_prefix"])):
+                pass
+            elapsed = time.perf_counter() - started
+            timings = list(
+                StripeEvent.objects.filter(event_id__startswith=fixtures["event_prefix"])
+                .exclude(processing_ms=None).values_list("processing_ms", flat=True)
+            )
+            self._report("processing", [ms / 1000 for ms in timings], elapsed, 0)
+
+    def _fire_in_process(self, events):
+        client = Client()
+        url = reverse("stripe_webhook")
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for payload, signature in events:
+            t0 = time.perf_counter()
+            response = client.post(url, payload, content_type="application/json", HTTP_STRIPE_SIGNATURE=signature)
+            latencies.append(time.perf_counter() - t0)
+            errors += response.status_code != 200
+        return latencies, errors, time.perf_counter() - started
+
+    def _fire_http(self, url, events, concurrency):
+        def send(event):
+            payload, signature = event
+            request = urllib.request.Request(url, data=payload, method="POST", headers={
+                "Content-Type": "application/json",
+                "Stripe-Signature": signature,
+            })
+            t0 = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    ok = response.status == 200
+            except urllib.error.URLError:
+                ok = False
+            return time.perf_counter() - t0, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(send, events))
+        elapsed = time.perf_counter() - started
+        return [latency for latency, _ in results], sum(not ok for _, ok in results), elapsed
+
+    def _report(self, label, latencies, elapsed, errors):
+        if not latencies:
+            self.stdout.write(f"{label}: no samples")
+            return
+        ordered = sorted(latencies)
+        p50 = statistics.median(ordered)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        self.stdout.write(
+            f"{label:<11} {len(ordered)} events in {elapsed:.2f}s  "
+            f"{len(ordered) / elapsed:8.1f} events/s  p50 {p50 * 1000:7.2f} ms  "
+            f"p99 {p99 * 1000:7.2f} ms  errors {errors}"
+        )
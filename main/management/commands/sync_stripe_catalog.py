@@ -0,0 +1,13 @@
+# main/management/commands/sync_stripe_catalog.py
+
+from django.core.management.base import BaseCommand
+
+from main.catalog import sync_catalog
+
+
+class Command(BaseCommand):
+    help = "Refreshes the cached Stripe price of every MembershipPlan."
+
+    def handle(self, *args, **options):
+        for name, price_id in sync_catalog().items():
+            self.stdout.write(f"{name}: {price_id or 'no active price'}")
@@ -0,0 +1,136 @@
+# main/metrics.py
+#
+# Operational metrics in Prometheus format, served by metrics_view at
+# /metrics. Counters and histograms are plain in-process prometheus_client
+# objects, so recording one costs a lock and an add.
+#
+# Multiprocess mode: set PROMETHEUS_MULTIPROC_DIR for every process (web
+# workers and the manage.py workers). Each process then writes its samples
+# to mmap-backed files in that directory and a scrape of any worker merges
+# them (gunicorn.conf.py clears the directory at startup and retires the
+# files of exited workers).
+#
+# Rates such as bookings or credits per hour are left to the query, e.g.
+# increase(studio_credits_consumed_total[1h]).
+
+import os
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def multiprocess_mode():
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+# ----------------------------------------------------------------------------------
+# METRICS
+# ----------------------------------------------------------------------------------
+http_requests = Counter(
+    "studio_http_requests", "Requests handled, by URL name.",
+    ["view", "method", "status"],
+)
+http_latency = Histogram(
+    "studio_http_request_duration_seconds", "Request latency, by URL name.",
+    ["view"], buckets=LATENCY_BUCKETS,
+)
+
+webhook_events = Counter(
+    "studio_stripe_webhook_events", "Stripe webhook deliveries, by event type and outcome.",
+    ["type", "outcome"],
+)
+event_processing = Histogram(
+    "studio_stripe_event_processing_seconds", "Time to apply one stored Stripe event.",
+    ["type", "status"], buckets=LATENCY_BUCKETS,
+)
+stripe_errors = Counter(
+    "studio_stripe_errors", "Failed Stripe API calls, by HTTP status (or 'network').",
+    ["code"],
+)
+
+booking_attempts = Counter(
+    "studio_booking_attempts", "Member bookings from the daily scheduler, by result.",
+    ["result"],
+)
+bookings = Counter("studio_bookings", "Booked sessions created by members.")
+credits_consumed = Counter("studio_credits_consumed", "Credits spent on bookings.")
+
+emails = Counter(
+    "studio_emails", "Outbox emails, by outcome (queued, sent, failed).",
+    ["outcome"],
+)
+
+
+# ----------------------------------------------------------------------------------
+# RECORDING
+# ----------------------------------------------------------------------------------
+def observe_request(view, method, status, seconds):
+    http_requests.labels(view, method, status).inc()
+    http_latency.labels(view).observe(seconds)
+
+
+def observe_stripe_response(result):
+    """
+    Counts a Stripe HTTP response as an error if its status is 4xx/5xx.
+    `result` is the (body, status, headers) tuple from the HTTP client.
+    """
+    status = result[1]
+    if status >= 400:
+        stripe_errors.labels(str(status)).inc()
+
+
+def observe_booking(sessions, credits):
+    booking_attempts.labels("booked").inc()
+    bookings.inc(sessions)
+    credits_consumed.inc(credits)
+
+
+# ----------------------------------------------------------------------------------
+# SCRAPE
+# ----------------------------------------------------------------------------------
+class QueueCollector:
+    """
+    Outbox and Stripe event backlogs, counted from the database at scrape
+    time so every process reports the same numbers.
+    """
+
+    def collect(self):
+        from django.db.models import Count
+
+        from .models import EmailOutbox, StripeEvent
+
+        outbox = GaugeMetricFamily("studio_outbox_depth", "Outbox emails waiting, by status.", labels=["status"])
+        counts = dict(
+            EmailOutbox.objects.filter(status__in=["pending", "sending", "failed"])
+            .values_list("status").annotate(n=Count("id"))
+        )
+        for status in ("pending", "sending", "failed"):
+            outbox.add_metric([status], counts.get(status, 0))
+        yield outbox
+
+        events = GaugeMetricFamily("studio_stripe_event_backlog", "Stored Stripe events not yet applied, by status.", labels=["status"])
+        counts = dict(
+            StripeEvent.objects.filter(status__in=["pending", "failed"])
+            .values_list("status").annotate(n=Count("id"))
+        )
+        for status in ("pending", "failed"):
+            events.add_metric([status], counts.get(status, 0))
+        yield events
+
+
+def render():
+    """
+    Returns the exposition text for a scrape of this process (or of all
+    processes sharing PROMETHEUS_MULTIPROC_DIR).
+    """
+    registry = CollectorRegistry()
+    if multiprocess_mode():
+        from prometheus_client import multiprocess
+
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry.register(REGISTRY)
+    registry.register(QueueCollector())
+    return generate_latest(registry)
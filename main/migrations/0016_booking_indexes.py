@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_userprofile_discount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookedsession',
+            index=models.Index(fields=['booked_date', 'status'], name='booked_date_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookedsession',
+            index=models.Index(fields=['booked_by', 'status', 'booked_datetime'], name='booked_user_status_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pendingsessionrequest',
+            index=models.Index(fields=['requested_date', 'status'], name='pending_date_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pendingsessionrequest',
+            index=models.Index(fields=['status', 'created_at'], name='pending_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pendingsessionrequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['-created_at'], name='pending_open_created_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('event_type', models.CharField(max_length=100)),
+                ('subscription_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('stripe_created', models.PositiveBigIntegerField(default=0)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('processing_ms', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'stripe_events',
+                'indexes': [models.Index(fields=['status', 'stripe_created', 'id'], name='stripe_event_queue_idx'), models.Index(fields=['subscription_id', 'stripe_created'], name='stripe_event_sub_idx')],
+            },
+        ),
+    ]
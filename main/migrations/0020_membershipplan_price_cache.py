@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_stripesubscription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='membershipplan',
+            name='price_synced_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='membershipplan',
+            name='stripe_price_id',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
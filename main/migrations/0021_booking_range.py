@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Active bookings may not overlap. Rows without a range (written before
+# starts_at/ends_at existed) are skipped until they are backfilled.
+PG_CONSTRAINT = """
+    ALTER TABLE booked_sessions ADD CONSTRAINT booked_sessions_no_overlap
+    EXCLUDE USING gist (tstzrange(starts_at, ends_at, '[)') WITH &&)
+    WHERE (starts_at IS NOT NULL AND ends_at IS NOT NULL AND status IN ('booked', 'paid'))
+"""
+
+# No session runs a whole day, so the lower bound on starts_at keeps the
+# check to an index range of about a day instead of every earlier booking
+SQLITE_TRIGGER = """
+    CREATE TRIGGER booked_sessions_no_overlap_{event}
+    BEFORE {event} ON booked_sessions
+    WHEN NEW.starts_at IS NOT NULL AND NEW.ends_at IS NOT NULL AND NEW.status IN ('booked', 'paid')
+    BEGIN
+        SELECT RAISE(ABORT, 'booked_sessions_no_overlap')
+        WHERE EXISTS (
+            SELECT 1 FROM booked_sessions
+            WHERE status IN ('booked', 'paid')
+              AND starts_at < NEW.ends_at
+              AND starts_at > datetime(NEW.starts_at, '-1 day')
+              AND ends_at > NEW.starts_at
+              AND id IS NOT NEW.id
+        );
+    END
+"""
+
+
+def add_overlap_constraint(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(PG_CONSTRAINT)
+    elif vendor == "sqlite":
+        for event in ("INSERT", "UPDATE"):
+            schema_editor.execute(SQLITE_TRIGGER.format(event=event))
+
+
+def drop_overlap_constraint(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("ALTER TABLE booked_sessions DROP CONSTRAINT IF EXISTS booked_sessions_no_overlap")
+    elif vendor == "sqlite":
+        for event in ("INSERT", "UPDATE"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS booked_sessions_no_overlap_{event}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_membershipplan_price_cache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookedsession',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bookedsession',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='bookedsession',
+            index=models.Index(fields=['starts_at', 'ends_at'], name='booked_range_idx'),
+        ),
+        migrations.RunPython(add_overlap_constraint, drop_overlap_constraint),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0021_booking_range'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingsessionrequest',
+            name='checkout_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pendingsessionrequest',
+            name='checkout_session_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='pendingsessionrequest',
+            name='checkout_url',
+            field=models.URLField(blank=True, max_length=1000, null=True),
+        ),
+    ]
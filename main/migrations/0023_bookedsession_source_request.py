@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:47
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def restore_sqlite_overlap_triggers(apps, schema_editor):
+    # Adding or removing a column rebuilds the table on SQLite, which drops
+    # the overlap triggers from 0021
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    booking_range = import_module("main.migrations.0021_booking_range")
+    for event in ("INSERT", "UPDATE"):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS booked_sessions_no_overlap_{event}")
+        schema_editor.execute(booking_range.SQLITE_TRIGGER.format(event=event))
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0022_pendingsessionrequest_checkout_link'),
+    ]
+
+    operations = [
+        # Reversed last, after the column is dropped again
+        migrations.RunPython(migrations.RunPython.noop, restore_sqlite_overlap_triggers),
+        migrations.AddField(
+            model_name='bookedsession',
+            name='source_request',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='booked_session', to='main.pendingsessionrequest'),
+        ),
+        migrations.AlterField(
+            model_name='pendingsessionrequest',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('declined', 'Declined'), ('paid', 'Paid')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(restore_sqlite_overlap_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,116 @@
+# Gives every historical paid reservation request its confirmed
+# BookedSession, so availability no longer has to read paid requests.
+#
+# Bookings saved before migration 0021 get their starts_at/ends_at range
+# filled in first: the overlap constraint only sees rows with a range, so
+# promoting before the backfill would let a paid request take hours a
+# legacy booking already holds. A paid request that overlaps a booking is
+# marked paid_conflict for the operators, as payments does at runtime.
+#
+# Non-atomic on purpose: each batch commits on its own, so a large table is
+# never locked for the whole run and an interrupted run resumes where it
+# stopped (filled rows and promoted requests are skipped).
+
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, migrations, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils.timezone import make_aware
+
+BATCH_SIZE = 500
+
+
+def backfill_ranges(apps, schema_editor):
+    BookedSession = apps.get_model("main", "BookedSession")
+    missing = BookedSession.objects.filter(Q(starts_at__isnull=True) | Q(ends_at__isnull=True))
+
+    last_id = 0
+    while True:
+        batch = list(missing.filter(id__gt=last_id).order_by("id")[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        for row in batch:
+            row.starts_at = make_aware(datetime.combine(row.booked_date, row.booked_start_time))
+            row.ends_at = row.starts_at + timedelta(hours=row.duration_hours or 1)
+            row.booked_datetime = row.starts_at
+        try:
+            with transaction.atomic():
+                BookedSession.objects.bulk_update(batch, ["starts_at", "ends_at", "booked_datetime"])
+        except IntegrityError:
+            # Some of these overlap an active booking; fill the rest
+            for row in batch:
+                try:
+                    with transaction.atomic():
+                        row.save(update_fields=["starts_at", "ends_at", "booked_datetime"])
+                except IntegrityError:
+                    print(f"\n  Booking {row.id} overlaps another booking; range left empty.")
+
+
+def _session_for(BookedSession, request_row, user_id):
+    starts_at = make_aware(datetime.combine(request_row.requested_date, request_row.requested_time))
+    return BookedSession(
+        booked_by_id=user_id,
+        booked_date=request_row.requested_date,
+        booked_start_time=request_row.requested_time,
+        booked_datetime=starts_at,
+        duration_hours=request_row.hours or 1,
+        status="paid",
+        notes=request_row.notes,
+        starts_at=starts_at,
+        ends_at=starts_at + timedelta(hours=request_row.hours or 1),
+        source_request=request_row,
+    )
+
+
+def promote_paid_requests(apps, schema_editor):
+    PendingSessionRequest = apps.get_model("main", "PendingSessionRequest")
+    BookedSession = apps.get_model("main", "BookedSession")
+    User = apps.get_model("auth", "User")
+
+    last_id = 0
+    while True:
+        batch = list(
+            PendingSessionRequest.objects.filter(status="paid", booked_session__isnull=True, id__gt=last_id)
+            .order_by("id")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        # Link the booking to the requester's account when there is one
+        users = {
+            email: user_id
+            for user_id, email in User.objects.annotate(email_lower=Lower("email"))
+            .filter(email_lower__in={row.requester_email.lower() for row in batch})
+            .values_list("id", "email_lower")
+        }
+        sessions = [_session_for(BookedSession, row, users.get(row.requester_email.lower())) for row in batch]
+
+        try:
+            with transaction.atomic():
+                BookedSession.objects.bulk_create(sessions)
+        except IntegrityError:
+            # Something else holds some of these hours; keep the rest
+            for session in sessions:
+                try:
+                    with transaction.atomic():
+                        session.save()
+                except IntegrityError:
+                    PendingSessionRequest.objects.filter(id=session.source_request_id).update(status="paid_conflict")
+                    print(f"\n  Paid request {session.source_request_id} overlaps a booking; marked paid_conflict.")
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('main', '0023_bookedsession_source_request'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_ranges, migrations.RunPython.noop),
+        migrations.RunPython(promote_paid_requests, migrations.RunPython.noop),
+    ]
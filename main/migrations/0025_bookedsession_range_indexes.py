@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:51
+#
+# starts_at/ends_at become the canonical booking time: every query filters
+# on them, so the indexes move over. Migration 0024 has already filled the
+# range of rows saved before migration 0021.
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0024_promote_paid_requests'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bookedsession',
+            name='booked_date_status_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='bookedsession',
+            name='booked_user_status_dt_idx',
+        ),
+        migrations.AddIndex(
+            model_name='bookedsession',
+            index=models.Index(fields=['booked_by', 'status', 'starts_at'], name='booked_user_status_start_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:55
+#
+# StudioDay indexes each date's occupancy. Filled here from the bookings
+# and request holds the same way availability.load_availability computes
+# it; `manage.py rebuild_occupancy` checks and repairs it afterwards.
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def _occupy(days, day, start_time, hours, slot):
+    for offset in range(hours or 1):
+        absolute = start_time.hour + offset
+        row = days.setdefault(day + timedelta(days=absolute // 24), {"mask": 0, "slots": {}})
+        row["mask"] |= 1 << (absolute % 24)
+        row["slots"][str(absolute % 24)] = slot
+
+
+def build_studio_days(apps, schema_editor):
+    BookedSession = apps.get_model("main", "BookedSession")
+    PendingSessionRequest = apps.get_model("main", "PendingSessionRequest")
+    StudioDay = apps.get_model("main", "StudioDay")
+
+    days = {}
+    # Holds first, so a booking wins an hour it shares with a request
+    holds = PendingSessionRequest.objects.filter(status__in=("pending", "approved")).values_list(
+        "id", "requested_date", "requested_time", "hours", "status"
+    )
+    for request_id, day, start_time, hours, status in holds.iterator(chunk_size=2000):
+        slot = ["pending", "Pending", request_id] if status == "approved" else ["requested", "Requested", request_id]
+        _occupy(days, day, start_time, hours, slot)
+
+    sessions = BookedSession.objects.filter(status__in=("booked", "paid"), starts_at__isnull=False).values_list(
+        "id", "booked_date", "booked_start_time", "duration_hours",
+        "booked_by__first_name", "booked_by__last_name", "booked_by__username",
+    )
+    for session_id, day, start_time, hours, first, last, username in sessions.iterator(chunk_size=2000):
+        label = f"{first or ''} {last or ''}".strip() or username or None
+        _occupy(days, day, start_time, hours, ["reserved", label, session_id])
+
+    StudioDay.objects.bulk_create(
+        [StudioDay(date=day, mask=row["mask"], slots=row["slots"]) for day, row in sorted(days.items())],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0025_bookedsession_range_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudioDay',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('mask', models.PositiveIntegerField(default=0)),
+                ('slots', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'studio_days',
+            },
+        ),
+        migrations.RunPython(build_studio_days, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.utils.timezone import now, timedelta
-from django.db.models.signals import post_save
+from django.utils.timezone import now, timedelta, make_aware
+from datetime import datetime
+from django.db.models.signals import post_save, post_delete, post_init
 from django.dispatch import receiver
 
 # ----------------------------------------------------------------------------------
@@ -15,13 +16,33 @@ class PendingSessionRequest(models.Model):
 
     class Meta:
         db_table = "pending_sessions"
+        indexes = [
+            # Availability lookups by day
+            models.Index(fields=["requested_date", "status"], name="pending_date_status_idx"),
+            # Operator console: newest requests per status
+            models.Index(fields=["status", "created_at"], name="pending_status_created_idx"),
+            # Operator console default view only ever lists open requests
+            models.Index(
+                fields=["-created_at"],
+                name="pending_open_created_idx",
+                condition=models.Q(status="pending"),
+            ),
+        ]
 
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('approved', 'Approved'),
         ('declined', 'Declined'),
+        # Paid requests have their confirmed BookedSession (booked_session)
+        ('paid', 'Paid'),
+        # Paid, but the hours were taken before the payment landed; an
+        # operator has been alerted to reschedule or refund
+        ('paid_conflict', 'Paid, hours taken'),
     ]
 
+    # Requests in these statuses hold their hours until paid or declined
+    HOLD_STATUSES = ('pending', 'approved')
+
     requester_name = models.CharField(max_length=255)
     requester_email = models.EmailField()
     requester_phone = models.CharField(max_length=50, blank=True)
@@ -33,6 +54,11 @@ class PendingSessionRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Stripe Checkout link sent on approval; reused by resends until it expires
+    checkout_session_id = models.CharField(max_length=255, null=True, blank=True)
+    checkout_url = models.URLField(max_length=1000, null=True, blank=True)
+    checkout_expires_at = models.DateTimeField(null=True, blank=True)
+
     def __str__(self):
         return f"Request by {self.requester_name} on {self.requested_date} at {self.requested_time}"
 
@@ -46,6 +72,15 @@ class BookedSession(models.Model):
     """
     class Meta:
         db_table = "booked_sessions"
+        indexes = [
+            # Session manager: a member's upcoming bookings
+            models.Index(
+                fields=["booked_by", "status", "starts_at"],
+                name="booked_user_status_start_idx",
+            ),
+            # Availability and overlap probes: starts_at < end AND ends_at > start
+            models.Index(fields=["starts_at", "ends_at"], name="booked_range_idx"),
+        ]
 
     STATUS_CHOICES = [
         ('booked', 'Booked'),
@@ -53,6 +88,9 @@ class BookedSession(models.Model):
         ('canceled', 'Canceled'),
     ]
 
+    # Statuses that occupy the studio; the overlap constraint only covers these
+    ACTIVE_STATUSES = ('booked', 'paid')
+
     booked_by = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
@@ -62,13 +100,29 @@ class BookedSession(models.Model):
     )
     booked_date = models.DateField()
     booked_start_time = models.TimeField()
-    # New field
+    # Legacy copy of starts_at, kept in step by fill_range(); query starts_at
     booked_datetime = models.DateTimeField(null=True, blank=True)
 
     duration_hours = models.PositiveIntegerField(default=1)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='booked')
     notes = models.TextField(blank=True, null=True)
 
+    # Half-open [starts_at, ends_at) range: the canonical time of a booking,
+    # and what every query filters on. The database rejects overlaps between
+    # active bookings (see migration 0021). Older rows are filled in by
+    # `manage.py backfill_booking_ranges`.
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+
+    # The reservation request this booking confirms, if it came from one
+    source_request = models.OneToOneField(
+        PendingSessionRequest,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='booked_session'
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -76,6 +130,49 @@ class BookedSession(models.Model):
         user_str = self.booked_by.username if self.booked_by else "Unknown"
         return f"Session on {self.booked_date} at {self.booked_start_time} by {user_str}"
 
+    def fill_range(self):
+        """
+        Derives starts_at/ends_at (and the legacy booked_datetime) from the
+        date, start time and duration. Called by save(); bulk_create and
+        bulk_update callers must call it themselves.
+        """
+        if self.booked_date and self.booked_start_time:
+            self.starts_at = make_aware(datetime.combine(self.booked_date, self.booked_start_time))
+            self.ends_at = self.starts_at + timedelta(hours=int(self.duration_hours or 1))
+            self.booked_datetime = self.starts_at
+
+    def save(self, *args, **kwargs):
+        self.fill_range()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = set(update_fields) | {"starts_at", "ends_at", "booked_datetime"}
+        super().save(*args, **kwargs)
+
+
+# ----------------------------------------------------------------------------------
+# STUDIO DAYS (OCCUPANCY INDEX)
+# ----------------------------------------------------------------------------------
+class StudioDay(models.Model):
+    """
+    Occupancy of one studio date, derived from the bookings and requests.
+    Rewritten in the same transaction as every write that touches the date
+    (see availability.refresh_days), so readers get a whole day from one
+    row. `manage.py rebuild_occupancy` checks it against the source tables.
+    """
+    class Meta:
+        db_table = "studio_days"
+
+    date = models.DateField(primary_key=True)
+    # Bit H set when hour H is taken
+    mask = models.PositiveIntegerField(default=0)
+    # {"H": [status, label, id]} for each taken hour: the BookedSession id
+    # for "reserved", the PendingSessionRequest id for "pending"/"requested"
+    slots = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Occupancy of {self.date}"
+
 
 # ----------------------------------------------------------------------------------
 # OPERATOR (OPTIONAL TABLE)
@@ -106,6 +203,9 @@ class MembershipPlan(models.Model):
 
     name = models.CharField(max_length=100)
     stripe_product_id = models.CharField(max_length=100, default="prod_123")  # Reference to Stripe product
+    # Cached active price for checkout (see main/catalog.py)
+    stripe_price_id = models.CharField(max_length=100, null=True, blank=True)
+    price_synced_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.name
@@ -135,6 +235,27 @@ class UserMembership(models.Model):
 
 
 
+class StripeSubscription(models.Model):
+    """
+    Local mirror of a Stripe subscription, kept current from webhook
+    payloads so handlers don't need to call the Stripe API.
+    """
+    class Meta:
+        db_table = "stripe_subscription"
+
+    subscription_id = models.CharField(max_length=100, unique=True)
+    customer_id = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(max_length=30, blank=True)
+    current_period_end = models.PositiveBigIntegerField(null=True, blank=True)  # Unix timestamp
+    cancel_at_period_end = models.BooleanField(default=False)
+    # Stripe `created` of the last event applied, so late events can't roll it back
+    source_created = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.subscription_id} ({self.status})"
+
+
 # ----------------------------------------------------------------------------------
 # INVITES
 # ----------------------------------------------------------------------------------
@@ -214,6 +335,89 @@ class UserProfile(models.Model):
         return role_priority[self.role] >= role_priority[required_role]
 
 
+# ----------------------------------------------------------------------------------
+# EMAIL OUTBOX
+# ----------------------------------------------------------------------------------
+class EmailOutbox(models.Model):
+    """
+    Outbound email, written in the same transaction as the change that
+    triggered it and delivered later by `manage.py run_outbox`.
+    """
+    class Meta:
+        db_table = "email_outbox"
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_status_due_idx"),
+        ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    content_subtype = models.CharField(max_length=20, default="plain")
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # When the row is due; while `sending`, when the worker's claim expires
+    next_attempt_at = models.DateTimeField(default=now)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+
+# ----------------------------------------------------------------------------------
+# STRIPE WEBHOOK EVENTS
+# ----------------------------------------------------------------------------------
+class StripeEvent(models.Model):
+    """
+    Every verified Stripe webhook event, stored once by its Stripe id.
+    The webhook only records the event; `manage.py process_stripe_events`
+    applies it, so Stripe retries can never apply the same event twice.
+    """
+    class Meta:
+        db_table = "stripe_events"
+        indexes = [
+            models.Index(fields=["status", "stripe_created", "id"], name="stripe_event_queue_idx"),
+            models.Index(fields=["subscription_id", "stripe_created"], name="stripe_event_sub_idx"),
+        ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    # Events touching the same subscription are applied in Stripe's order
+    subscription_id = models.CharField(max_length=100, null=True, blank=True)
+    stripe_created = models.PositiveBigIntegerField(default=0)
+    payload = models.JSONField()
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # When a failed event is retried (see stripe_events.backoff)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    processing_ms = models.FloatField(null=True, blank=True)  # Handler run time
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} ({self.status})"
+
+
 # ----------------------------------------------------------------------------------
 # CREATE / SAVE USER PROFILE SIGNALS
 # ----------------------------------------------------------------------------------
@@ -226,3 +430,67 @@ def create_user_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     instance.profile.save()
+
+
+# ----------------------------------------------------------------------------------
+# OCCUPANCY INDEX & AVAILABILITY CACHE SIGNALS
+# ----------------------------------------------------------------------------------
+# Fields whose change can alter a StudioDay row
+OCCUPANCY_FIELDS = {
+    "booked_date", "booked_start_time", "duration_hours", "booked_by", "starts_at", "ends_at",
+    "requested_date", "requested_time", "hours", "status",
+}
+
+
+def _session_span(instance):
+    # Read from __dict__ so deferred fields never trigger a query here
+    if isinstance(instance, BookedSession):
+        fields = ("booked_date", "booked_start_time", "duration_hours")
+    else:
+        fields = ("requested_date", "requested_time", "hours")
+    span = tuple(instance.__dict__.get(field) for field in fields)
+    return span if span[0] is not None else None
+
+
+@receiver(post_init, sender=BookedSession)
+@receiver(post_init, sender=PendingSessionRequest)
+def remember_session_span(sender, instance, **kwargs):
+    # Kept so a save that moves a session also clears the date it left
+    instance._loaded_span = _session_span(instance)
+
+
+@receiver(post_save, sender=BookedSession)
+@receiver(post_save, sender=PendingSessionRequest)
+@receiver(post_delete, sender=BookedSession)
+@receiver(post_delete, sender=PendingSessionRequest)
+def invalidate_session_availability(sender, instance, update_fields=None, **kwargs):
+    from .availability import affected_dates, invalidate_dates, refresh_days
+    from .live import publish_dates
+
+    spans = {_session_span(instance), getattr(instance, "_loaded_span", None)}
+    dates = set()
+    for span in filter(None, spans):
+        dates.update(affected_dates(*span))
+    # Saves that only touch e.g. the checkout link leave occupancy as it is
+    if update_fields is None or not OCCUPANCY_FIELDS.isdisjoint(update_fields):
+        refresh_days(dates)
+    invalidate_dates(dates)
+
+    # Again after commit: a reader between the write and the commit may
+    # have cached (or stamped a page with) the pre-write state
+    def after_commit():
+        invalidate_dates(dates)
+        publish_dates(dates)
+
+    transaction.on_commit(after_commit)
+    instance._loaded_span = _session_span(instance)
+
+
+# ----------------------------------------------------------------------------------
+# LIVE UPDATE SIGNALS
+# ----------------------------------------------------------------------------------
+@receiver(post_save, sender=PendingSessionRequest)
+def publish_request_change(sender, instance, created, **kwargs):
+    from .live import publish_request
+
+    transaction.on_commit(lambda: publish_request(instance, created))
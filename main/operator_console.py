@@ -0,0 +1,128 @@
+# main/operator_console.py
+#
+# Listing and bulk review of reservation requests for operator_console_view.
+
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from .availability import affected_dates, invalidate_dates, refresh_days
+from .emails import payment_email, rejection_email
+from .live import publish_dates, publish_request
+from .models import PendingSessionRequest
+from .outbox import enqueue_many
+from .payment_links import ensure_payment_links
+
+PAGE_SIZE = 25
+STATUS_FILTERS = ["pending", "approved", "paid", "paid_conflict", "declined", "all"]
+
+
+# ----------------------------------------------------------------------------------
+# KEYSET PAGINATION
+# ----------------------------------------------------------------------------------
+def encode_cursor(row):
+    return f"{row.created_at.isoformat()}~{row.id}"
+
+
+def decode_cursor(cursor):
+    """
+    Returns (created_at, id) from a cursor, or None if it's malformed.
+    """
+    try:
+        created_at, row_id = cursor.rsplit("~", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def request_page(status="pending", requested_date=None, cursor=None, page_size=PAGE_SIZE):
+    """
+    One page of requests, newest first, ordered on (created_at, id) so a
+    page is an index range scan no matter how deep it is.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    rows = list(_page_queryset(status, requested_date, cursor)[:page_size + 1])
+    if len(rows) > page_size:
+        return rows[:page_size], encode_cursor(rows[page_size - 1])
+    return rows, None
+
+
+def _page_queryset(status, requested_date, cursor):
+    queryset = PendingSessionRequest.objects.order_by("-created_at", "-id")
+    if status != "all":
+        queryset = queryset.filter(status=status)
+    if requested_date:
+        queryset = queryset.filter(requested_date=requested_date)
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, row_id = position
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=row_id))
+    return queryset
+
+
+# ----------------------------------------------------------------------------------
+# BULK REVIEW
+# ----------------------------------------------------------------------------------
+def _pending(request_ids):
+    return list(PendingSessionRequest.objects.filter(id__in=request_ids, status="pending"))
+
+
+def _review(candidates, status, build_email):
+    """
+    Moves the still-pending requests among `candidates` to `status` with
+    one UPDATE and queues their emails with one INSERT, in one transaction.
+    Emails are built first so no Stripe call runs while rows are locked;
+    requests another operator handled in the meantime are skipped.
+    Returns the updated requests.
+    """
+    emails = {row.id: build_email(row) for row in candidates}
+
+    with transaction.atomic():
+        locked = set(
+            PendingSessionRequest.objects.select_for_update()
+            .filter(id__in=emails, status="pending")
+            .values_list("id", flat=True)
+        )
+        # .update() bypasses auto_now and the model signals; the occupancy
+        # index, cache and live notifications are handled below
+        PendingSessionRequest.objects.filter(id__in=locked).update(status=status, updated_at=now())
+        enqueue_many(emails[row_id] for row_id in sorted(locked))
+
+        updated = [row for row in candidates if row.id in locked]
+        dates = set()
+        for row in updated:
+            row.status = status
+            dates.update(affected_dates(row.requested_date, row.requested_time, row.hours))
+        refresh_days(dates)
+
+        def after_commit():
+            invalidate_dates(dates)
+            publish_dates(dates)
+            for row in updated:
+                publish_request(row, created=False)
+
+        transaction.on_commit(after_commit)
+
+    return updated
+
+
+def approve_requests(request_ids):
+    """
+    Approves pending requests and queues their payment emails. Checkout
+    links are created concurrently first; requests whose link failed stay
+    pending so they can be retried.
+    """
+    candidates = _pending(request_ids)
+    links = ensure_payment_links(candidates)
+    ready = [row for row in candidates if row.id not in links.failed]
+    return _review(ready, "approved", payment_email)
+
+
+def reject_requests(request_ids, suggested_times=""):
+    """
+    Declines pending requests and queues their rejection emails.
+    """
+    return _review(_pending(request_ids), "declined", lambda row: rejection_email(row, suggested_times))
@@ -0,0 +1,163 @@
+# main/outbox.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils.timezone import now
+
+from . import metrics
+from .instrumentation import TimedEmailConnection, track
+from .models import EmailOutbox
+
+# Retry schedule: 30s, 1m, 2m, 4m ... capped at one hour, then give up
+MAX_ATTEMPTS = 8
+BASE_BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 60 * 60
+
+# How long a claimed batch may take to send before other workers retry it
+LEASE_SECONDS = 10 * 60
+
+
+def enqueue(message):
+    """
+    Stores an EmailMessage in the outbox instead of sending it. Call it
+    inside the transaction that makes the change the email talks about,
+    so the email exists if and only if that change is committed.
+    """
+    recipients = list(message.to)
+    if not recipients:
+        return None
+    row = EmailOutbox.objects.create(
+        subject=message.subject,
+        body=message.body,
+        content_subtype=message.content_subtype,
+        from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=recipients,
+    )
+    _count_queued(1)
+    return row
+
+
+def enqueue_many(messages):
+    """
+    Stores several EmailMessages with one INSERT. Same transaction rule
+    as enqueue().
+    """
+    rows = EmailOutbox.objects.bulk_create([
+        EmailOutbox(
+            subject=message.subject,
+            body=message.body,
+            content_subtype=message.content_subtype,
+            from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+            to=list(message.to),
+        )
+        for message in messages
+        if message.to
+    ])
+    _count_queued(len(rows))
+    return rows
+
+
+def _count_queued(count):
+    # Only emails whose transaction commits were really queued
+    if count:
+        transaction.on_commit(lambda: metrics.emails.labels("queued").inc(count))
+
+
+def to_message(row, connection=None):
+    """
+    Rebuilds the EmailMessage stored in an outbox row.
+    """
+    msg = EmailMessage(
+        subject=row.subject,
+        body=row.body,
+        from_email=row.from_email,
+        to=row.to,
+        connection=connection,
+    )
+    msg.content_subtype = row.content_subtype
+    return msg
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BASE_BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+def drain(batch_size=50):
+    """
+    Sends one batch of due emails over a single SMTP connection.
+    Returns (sent, failed) counts for the batch.
+    """
+    rows = _claim(batch_size)
+    if not rows:
+        return 0, 0
+
+    sent = failed = 0
+    # One timing record (and log line) per non-empty batch
+    with track("outbox.drain"):
+        connection = TimedEmailConnection(get_connection())
+        try:
+            connection.open()
+        except Exception as e:
+            # Nothing could be delivered; push the whole batch back
+            for row in rows:
+                _record_failure(row, e)
+            EmailOutbox.objects.bulk_update(rows, ["status", "attempts", "next_attempt_at", "last_error"])
+            metrics.emails.labels("failed").inc(len(rows))
+            return sent, len(rows)
+
+        try:
+            for row in rows:
+                try:
+                    connection.send_messages([to_message(row, connection)])
+                    row.status = "sent"
+                    row.sent_at = now()
+                    row.attempts += 1
+                    row.last_error = ""
+                    sent += 1
+                except Exception as e:
+                    _record_failure(row, e)
+                    failed += 1
+        finally:
+            connection.close()
+
+        EmailOutbox.objects.bulk_update(
+            rows, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"]
+        )
+    metrics.emails.labels("sent").inc(sent)
+    metrics.emails.labels("failed").inc(failed)
+    return sent, failed
+
+
+def _claim(batch_size):
+    """
+    Marks up to `batch_size` due rows as `sending` and returns them. The
+    row locks last only for this short transaction, not for the SMTP
+    conversation. While sending, next_attempt_at is the lease expiry: a
+    worker that dies mid-batch leaves rows that are picked up again once
+    the lease runs out (so they may be delivered twice, never lost).
+    """
+    with transaction.atomic():
+        rows = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status__in=("pending", "sending"), next_attempt_at__lte=now())
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        lease_expires = now() + timedelta(seconds=LEASE_SECONDS)
+        for row in rows:
+            row.status = "sending"
+            row.next_attempt_at = lease_expires
+        EmailOutbox.objects.bulk_update(rows, ["status", "next_attempt_at"])
+    return rows
+
+
+def _record_failure(row, error):
+    row.attempts += 1
+    row.last_error = str(error)
+    if row.attempts >= MAX_ATTEMPTS:
+        row.status = "failed"
+    else:
+        row.status = "pending"
+        row.next_attempt_at = now() + backoff(row.attempts)
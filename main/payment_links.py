@@ -0,0 +1,131 @@
+# main/payment_links.py
+#
+# Stripe Checkout links for approved reservation requests. Sessions are
+# created concurrently on a bounded thread pool and stored on the request,
+# so a resent payment email reuses the link until it is close to expiring.
+
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import stripe
+from django.conf import settings
+from django.utils.timezone import now
+
+from .models import PendingSessionRequest
+
+logger = logging.getLogger("main.perf")
+
+BOOKING_FEE = 1.00  # Example $1
+# Don't send a link that would expire before the client gets to it
+LINK_REUSE_MARGIN = timedelta(hours=1)
+
+
+class LinkBatch:
+    """
+    Outcome and timing of one ensure_payment_links() call.
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.reused = 0
+        self.failed = {}  # request id -> error message
+        self.latencies = []  # seconds per Stripe call
+        self.elapsed = 0.0
+
+    def summary(self):
+        slowest = max(self.latencies, default=0)
+        return (
+            f"Payment links: {self.created} created, {self.reused} reused, "
+            f"{len(self.failed)} failed in {self.elapsed * 1000:.0f} ms "
+            f"(slowest Stripe call {slowest * 1000:.0f} ms)"
+        )
+
+
+def has_live_link(pending_req):
+    return bool(
+        pending_req.checkout_url
+        and pending_req.checkout_expires_at
+        and pending_req.checkout_expires_at > now() + LINK_REUSE_MARGIN
+    )
+
+
+def create_checkout_session(pending_req):
+    """
+    Creates the one-time payment Checkout Session for a request.
+    Returns (session id, url, expires_at).
+    """
+    checkout_session = stripe.checkout.Session.create(
+        payment_method_types=["card"],
+        mode="payment",  # Use "payment" for one-time payments
+        line_items=[
+            {
+                "price_data": {
+                    "currency": "usd",
+                    "product_data": {"name": "Studio Booking Fee"},
+                    "unit_amount": int(BOOKING_FEE * 100),
+                },
+                "quantity": 1,
+            }
+        ],
+        metadata={
+            "reservation_id": pending_req.id,
+        },
+        success_url=f"{settings.BASE_URL}/payment-success/",
+        cancel_url=f"{settings.BASE_URL}/payment-cancelled/",
+    )
+    expires_at = datetime.fromtimestamp(checkout_session.expires_at, tz=timezone.utc)
+    return checkout_session.id, checkout_session.url, expires_at
+
+
+def _timed_create(pending_req):
+    started = time.perf_counter()
+    try:
+        return pending_req, create_checkout_session(pending_req), None, time.perf_counter() - started
+    except Exception as e:
+        return pending_req, None, e, time.perf_counter() - started
+
+
+def ensure_payment_links(pending_requests, max_workers=None):
+    """
+    Makes sure every request has a live Checkout link, creating the
+    missing ones concurrently (at most `max_workers` Stripe calls in
+    flight) and saving them with one bulk UPDATE. Requests whose session
+    could not be created are listed in the returned LinkBatch.failed.
+    """
+    batch = LinkBatch()
+    started = time.perf_counter()
+    max_workers = max_workers or settings.STRIPE_CHECKOUT_WORKERS
+
+    missing = [req for req in pending_requests if not has_live_link(req)]
+    batch.reused = len(pending_requests) - len(missing)
+
+    if missing:
+        # Threads only talk to Stripe; all database work stays on this thread
+        # (each task runs in a copy of this context so its Stripe time is
+        # counted on the current request)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, _timed_create, req) for req in missing]
+            results = [future.result() for future in futures]
+
+        created = []
+        for pending_req, link, error, latency in results:
+            batch.latencies.append(latency)
+            if error is not None:
+                logger.warning("Checkout session for request %s failed: %s", pending_req.id, error)
+                batch.failed[pending_req.id] = str(error)
+                continue
+            pending_req.checkout_session_id, pending_req.checkout_url, pending_req.checkout_expires_at = link
+            created.append(pending_req)
+
+        PendingSessionRequest.objects.bulk_update(
+            created, ["checkout_session_id", "checkout_url", "checkout_expires_at"]
+        )
+        batch.created = len(created)
+
+    batch.elapsed = time.perf_counter() - started
+    if missing:
+        logger.info(batch.summary())
+    return batch
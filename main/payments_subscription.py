@@ -4,8 +4,10 @@ from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.models import User
+from django.db import transaction
 import stripe
 from datetime import date
+import json
 
 from .emails import (
     send_payment_failure_email,
@@ -14,7 +16,11 @@ from .emails import (
     send_cancelation_confirmation_email,
     send_cancellation_scheduled_email,
 )
+from . import metrics
 from .models import UserMembership, MembershipPlan
+from .stripe_events import record_event
+from .services import get_subscription, sync_subscription_mirror
+from .catalog import handle_catalog_event
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
@@ -23,18 +29,37 @@ stripe.api_key = settings.STRIPE_SECRET_KEY
 def stripe_webhook(request):
     """
     Receives Stripe Webhook events for subscription management and session reservations.
+    Events are verified and stored; `manage.py process_stripe_events` applies them.
     """
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
     endpoint_secret = settings.STRIPE_WEBHOOK_SECRET
 
     try:
-        event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
+        stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
+        event = json.loads(payload)
     except ValueError:
+        metrics.webhook_events.labels('unknown', 'invalid_payload').inc()
         return JsonResponse({'error': 'Invalid payload'}, status=400)
     except stripe.error.SignatureVerificationError:
+        metrics.webhook_events.labels('unknown', 'invalid_signature').inc()
         return JsonResponse({'error': 'Invalid signature'}, status=400)
 
+    # Stripe retries and duplicate deliveries land on the same row
+    _, created = record_event(event)
+    metrics.webhook_events.labels(event['type'], 'stored' if created else 'duplicate').inc()
+    return JsonResponse({'status': 'success'})
+
+
+def dispatch_event(event):
+    """
+    Applies one stored Stripe event to memberships and reservations.
+    Handlers only swallow errors retrying can't fix (unknown user, plan or
+    reservation); anything else raises so process_events retries the event.
+    """
+    # Keep the local subscription mirror current before any handler reads it
+    sync_subscription_mirror(event)
+
     # Handle specific event types
     if event['type'] == 'checkout.session.completed':
         session = event['data']['object']
@@ -76,8 +101,9 @@ def stripe_webhook(request):
         subscription = event['data']['object']
         handle_subscription_update(subscription)
 
-
-    return JsonResponse({'status': 'success'})
+    # Price/product changes refresh the cached checkout prices
+    if event['type'].startswith(('price.', 'product.')):
+        handle_catalog_event(event)
 
 
 def handle_successful_payment(session):
@@ -102,9 +128,9 @@ def handle_successful_payment(session):
         membership.plan = plan  # Assign the membership plan
         membership.stripe_subscription_id = session.get('subscription', None)
 
-        # Retrieve subscription details from Stripe
-        subscription = stripe.Subscription.retrieve(membership.stripe_subscription_id)
-        next_billing_unix = subscription['current_period_end']
+        # Subscription details come from the local mirror (API only on a miss)
+        subscription = get_subscription(membership.stripe_subscription_id)
+        next_billing_unix = subscription.current_period_end
         next_billing_date = date.fromtimestamp(next_billing_unix)
 
         # Set billing dates and default credits
@@ -114,15 +140,16 @@ def handle_successful_payment(session):
         # Assign credits if new or reactivating with zero credits
         if created or membership.credits == 0:
             membership.credits = 100
-            
-        membership.save()
 
-        # Send confirmation email
-        if reactivation:
-            # You could create a specific reactivation email
-            send_membership_confirmation_email(user, reactivation=True)
-        else:
-            send_membership_confirmation_email(user)
+        with transaction.atomic():
+            membership.save()
+
+            # Send confirmation email
+            if reactivation:
+                # You could create a specific reactivation email
+                send_membership_confirmation_email(user, reactivation=True)
+            else:
+                send_membership_confirmation_email(user)
 
     except KeyError:
         print("No 'user_id' or 'plan_id' in checkout.session.metadata.")
@@ -130,8 +157,6 @@ def handle_successful_payment(session):
         print(f"User with ID {session['metadata'].get('user_id')} not found.")
     except MembershipPlan.DoesNotExist:
         print(f"Membership plan with ID {session['metadata'].get('plan_id')} not found.")
-    except Exception as e:
-        print(f"Error in handle_successful_payment: {e}")
 
 def handle_recurring_payment(subscription_id):
     """
@@ -142,16 +167,16 @@ def handle_recurring_payment(subscription_id):
         # Find the membership associated with this subscription
         membership = UserMembership.objects.get(stripe_subscription_id=subscription_id)
 
-        # Retrieve the subscription from Stripe
-        subscription = stripe.Subscription.retrieve(subscription_id)
+        # Subscription details come from the local mirror (API only on a miss)
+        subscription = get_subscription(subscription_id)
 
         # Verify the subscription status
-        if subscription['status'] != 'active':
+        if subscription.status != 'active':
             print(f"Subscription {subscription_id} is not active.")
             return
 
         # Calculate the next billing date
-        next_billing_unix = subscription['current_period_end']
+        next_billing_unix = subscription.current_period_end
         next_billing_date = date.fromtimestamp(next_billing_unix)
 
         # Update membership details
@@ -167,22 +192,22 @@ def handle_recurring_payment(subscription_id):
 
         # Add recurring credits
         membership.credits += 100  # Add 100 credits each billing cycle
-        membership.save()
 
-        # Send notification email
-        if was_inactive:
-            # Send reactivation email
-            send_membership_confirmation_email(membership.user)  # Or create a specific reactivation email
-        else:
-            # Send regular recurring payment email
-            send_recurring_payment_confirmation_email(membership.user, membership.credits, next_billing_date)
+        with transaction.atomic():
+            membership.save()
+
+            # Send notification email
+            if was_inactive:
+                # Send reactivation email
+                send_membership_confirmation_email(membership.user)  # Or create a specific reactivation email
+            else:
+                # Send regular recurring payment email
+                send_recurring_payment_confirmation_email(membership.user, membership.credits, next_billing_date)
 
         print(f"Recurring payment processed for user {membership.user.username}")
 
     except UserMembership.DoesNotExist:
         print(f"No membership found for subscription ID: {subscription_id}")
-    except Exception as e:
-        print(f"Error in handle_recurring_payment: {e}")
 
 
 def handle_failed_payment(subscription_id):
@@ -191,37 +216,36 @@ def handle_failed_payment(subscription_id):
     """
     try:
         membership = UserMembership.objects.get(stripe_subscription_id=subscription_id)
-        membership.active = False
-        membership.save()
+        with transaction.atomic():
+            membership.active = False
+            membership.save()
 
-        send_payment_failure_email(membership.user)
+            send_payment_failure_email(membership.user)
     except UserMembership.DoesNotExist:
         print(f"No membership found for subscription ID: {subscription_id}")
-    except Exception as e:
-        print(f"Error in handle_failed_payment: {e}")
 
 def handle_reservation_payment(session):
     """
-    Marks a session reservation as paid.
+    Marks a session reservation as paid and books it on the calendar.
     """
+    from .booking import confirm_paid_request
+    from .models import PendingSessionRequest
+
     try:
         reservation_id = session['metadata']['reservation_id']
 
-        from .models import PendingSessionRequest
-        reservation = PendingSessionRequest.objects.get(id=reservation_id)
-        reservation.status = "paid"
-        reservation.save()
+        with transaction.atomic():
+            reservation, session = confirm_paid_request(reservation_id)
 
-        # Optionally, send a confirmation email
-        from .emails import send_reservation_payment_confirmation_email
-        send_reservation_payment_confirmation_email(reservation)
+            # Without a session the operators were alerted instead
+            if session is not None:
+                from .emails import send_reservation_payment_confirmation_email
+                send_reservation_payment_confirmation_email(reservation)
 
     except KeyError:
         print("No 'reservation_id' in checkout.session.metadata.")
     except PendingSessionRequest.DoesNotExist:
         print(f"Reservation with ID {session['metadata'].get('reservation_id')} not found.")
-    except Exception as e:
-        print(f"Error in handle_reservation_payment: {e}")
 
 
 def handle_subscription_cancellation(subscription):
@@ -231,18 +255,17 @@ def handle_subscription_cancellation(subscription):
     try:
         # Find the associated membership
         membership = UserMembership.objects.get(stripe_subscription_id=subscription['id'])
-        membership.active = False  # Deactivate the membership
-        membership.valid_until = None  # Clear the valid_until date
-        membership.save()
+        with transaction.atomic():
+            membership.active = False  # Deactivate the membership
+            membership.valid_until = None  # Clear the valid_until date
+            membership.save()
 
-        # Optional: Notify the user about the cancellation
-        send_cancelation_confirmation_email(membership.user)
+            # Optional: Notify the user about the cancellation
+            send_cancelation_confirmation_email(membership.user)
 
         print(f"Membership for user {membership.user.username} has been canceled.")
     except UserMembership.DoesNotExist:
         print(f"No membership found for subscription ID: {subscription['id']}")
-    except Exception as e:
-        print(f"Error handling subscription cancellation: {e}")
 
 
 def handle_subscription_update(subscription):
@@ -255,12 +278,13 @@ def handle_subscription_update(subscription):
         # Check if cancellation is scheduled
         if subscription['cancel_at_period_end']:
             # Handle scheduled cancellation
-            membership.active = False  # Membership is still active until the end of the cycle
-            membership.valid_until = date.fromtimestamp(subscription['current_period_end'])
-            membership.save()
+            with transaction.atomic():
+                membership.active = False  # Membership is still active until the end of the cycle
+                membership.valid_until = date.fromtimestamp(subscription['current_period_end'])
+                membership.save()
 
-            # Notify the user
-            send_cancellation_scheduled_email(membership.user, membership.valid_until)
+                # Notify the user
+                send_cancellation_scheduled_email(membership.user, membership.valid_until)
 
             print(f"Scheduled cancellation for user {membership.user.username}. Membership valid until {membership.valid_until}.")
         else:
@@ -269,6 +293,3 @@ def handle_subscription_update(subscription):
 
     except UserMembership.DoesNotExist:
         print(f"No membership found for subscription ID: {subscription['id']}")
-    except Exception as e:
-        print(f"Error handling subscription update: {e}")
-
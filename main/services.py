@@ -2,8 +2,9 @@
 
 import stripe
 from django.conf import settings
-from .models import UserMembership
-from datetime import date
+from django.db import transaction
+from .models import UserMembership, StripeSubscription
+from .auth import access_snapshot
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
@@ -11,15 +12,7 @@ def has_membership_access(user):
     """
     Determines if a user has valid membership access.
     """
-    try:
-        membership = user.usermembership
-        if membership.active:
-            return True
-        elif membership.valid_until and membership.valid_until >= date.today():
-            return True
-        return False
-    except UserMembership.DoesNotExist:
-        return False
+    return access_snapshot(user).has_access
 
 def cancel_stripe_subscription(user):
     """
@@ -61,4 +54,109 @@ def create_stripe_customer(email, first_name, last_name):
         raise e
     except Exception as e:
         print(f"Unexpected error: {e}")
-        raise e
\ No newline at end of file
+        raise e
+
+
+# ----------------------------------------------------------------------------------
+# SUBSCRIPTION MIRROR
+# ----------------------------------------------------------------------------------
+def stripe_dict(obj):
+    # StripeObject stopped subclassing dict in newer stripe releases
+    if isinstance(obj, dict):
+        return obj
+    to_dict = getattr(obj, "to_dict", None) or getattr(obj, "to_dict_recursive")
+    return to_dict()
+
+
+def _subscription_period_end(subscription):
+    if subscription.get('current_period_end'):
+        return subscription['current_period_end']
+    # Newer API versions report the period per subscription item
+    items = (subscription.get('items') or {}).get('data') or []
+    ends = [item['current_period_end'] for item in items if item.get('current_period_end')]
+    return max(ends) if ends else None
+
+
+def _invoice_period_end(invoice):
+    lines = (invoice.get('lines') or {}).get('data') or []
+    ends = [line['period']['end'] for line in lines if (line.get('period') or {}).get('end')]
+    return max(ends) if ends else None
+
+
+def _subscription_changed_at(subscription):
+    # Newest Stripe timestamp on the object: API data ranks against events
+    # on Stripe's clock, so a later event always wins over it
+    items = (subscription.get('items') or {}).get('data') or []
+    stamps = [
+        subscription.get(key)
+        for key in ('created', 'start_date', 'current_period_start', 'canceled_at', 'ended_at')
+    ]
+    stamps += [item.get('current_period_start') for item in items]
+    return max(filter(None, stamps), default=0)
+
+
+def _subscription_fields(subscription):
+    return {
+        'customer_id': subscription.get('customer'),
+        'status': subscription.get('status') or '',
+        'current_period_end': _subscription_period_end(subscription),
+        'cancel_at_period_end': bool(subscription.get('cancel_at_period_end')),
+    }
+
+
+def _apply_to_mirror(subscription_id, fields, source_created):
+    """
+    Writes fields onto the mirror row unless a newer event already did.
+    """
+    fields = {key: value for key, value in fields.items() if value is not None}
+    with transaction.atomic():
+        mirror, _ = StripeSubscription.objects.select_for_update().get_or_create(
+            subscription_id=subscription_id
+        )
+        if source_created < mirror.source_created:
+            return mirror
+        for key, value in fields.items():
+            setattr(mirror, key, value)
+        mirror.source_created = source_created
+        mirror.save()
+    return mirror
+
+
+def sync_subscription_mirror(event):
+    """
+    Updates the StripeSubscription mirror from a customer.subscription.*
+    or invoice.* event payload. Other events are ignored.
+    """
+    event_type = event.get('type', '')
+    obj = event['data']['object']
+    created = event.get('created') or 0
+
+    if event_type.startswith('customer.subscription.'):
+        return _apply_to_mirror(obj['id'], _subscription_fields(obj), created)
+
+    if event_type.startswith('invoice.') and obj.get('subscription'):
+        fields = {
+            'customer_id': obj.get('customer'),
+            'current_period_end': _invoice_period_end(obj),
+        }
+        # A paid invoice is what moves Stripe's subscription to active
+        if event_type == 'invoice.payment_succeeded':
+            fields['status'] = 'active'
+        return _apply_to_mirror(obj['subscription'], fields, created)
+
+    return None
+
+
+def get_subscription(subscription_id):
+    """
+    Returns the mirrored subscription, calling the Stripe API only when the
+    mirror has never seen a full subscription payload for this id.
+    """
+    mirror = StripeSubscription.objects.filter(subscription_id=subscription_id).first()
+    if mirror and mirror.status and mirror.current_period_end:
+        return mirror
+
+    subscription = stripe_dict(stripe.Subscription.retrieve(subscription_id))
+    return _apply_to_mirror(
+        subscription_id, _subscription_fields(subscription), _subscription_changed_at(subscription)
+    )
@@ -0,0 +1,114 @@
+# main/stripe_events.py
+
+import logging
+import time
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from . import metrics
+from .models import StripeEvent
+
+# Events that raise are retried after 30s, 1m, 2m ... (capped at one hour),
+# this many times in all before being left as failed
+MAX_ATTEMPTS = 8
+BASE_BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 60 * 60
+
+logger = logging.getLogger(__name__)
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BASE_BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+def _subscription_of(event):
+    obj = event.get('data', {}).get('object', {}) or {}
+    if obj.get('object') == 'subscription':
+        return obj.get('id')
+    return obj.get('subscription')
+
+
+def record_event(event):
+    """
+    Stores a verified event by its Stripe id. Returns (row, created);
+    a redelivered event returns the existing row untouched.
+    """
+    try:
+        with transaction.atomic():
+            row = StripeEvent.objects.create(
+                event_id=event['id'],
+                event_type=event['type'],
+                subscription_id=_subscription_of(event),
+                stripe_created=event.get('created') or 0,
+                payload=event,
+            )
+            return row, True
+    except IntegrityError:
+        return StripeEvent.objects.get(event_id=event['id']), False
+
+
+def process_events(batch_size=50, event_id_prefix=None):
+    """
+    Applies one batch of due events in Stripe order. A failed event is
+    retried after its backoff; until then, later events for the same
+    subscription wait so they are never applied out of order.
+    `event_id_prefix` limits the batch to matching events (load tests).
+    Returns (processed, failed).
+    """
+    from .payments_subscription import dispatch_event
+
+    processed = failed = 0
+    retrying = StripeEvent.objects.filter(status='failed', attempts__lt=MAX_ATTEMPTS)
+    waiting = retrying.filter(next_attempt_at__gt=now(), subscription_id__isnull=False)
+    # Left out before the batch is cut, so a backlog behind one failing
+    # subscription can't fill every batch and stall the others
+    due = (
+        StripeEvent.objects.filter(status__in=['pending', 'failed'], attempts__lt=MAX_ATTEMPTS)
+        .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now()))
+        .exclude(subscription_id__in=waiting.values('subscription_id'))
+    )
+    if event_id_prefix:
+        due = due.filter(event_id__startswith=event_id_prefix)
+    rows = list(due.order_by('stripe_created', 'id')[:batch_size])
+    # Subscriptions whose event fails during this batch
+    blocked = set()
+
+    for row in rows:
+        if row.subscription_id and row.subscription_id in blocked:
+            continue
+
+        with transaction.atomic():
+            # Lock and re-check so two workers never apply the same event
+            row = StripeEvent.objects.select_for_update().get(pk=row.pk)
+            if row.status == 'processed':
+                continue
+
+            started = time.perf_counter()
+            row.attempts += 1
+            try:
+                with transaction.atomic():
+                    dispatch_event(row.payload)
+                row.status = 'processed'
+                row.processed_at = now()
+                row.next_attempt_at = None
+                row.last_error = ""
+                processed += 1
+            except Exception as e:
+                logger.exception("Error processing Stripe event %s", row.event_id)
+                row.status = 'failed'
+                row.last_error = str(e)
+                row.next_attempt_at = now() + backoff(row.attempts)
+                failed += 1
+                if row.subscription_id:
+                    blocked.add(row.subscription_id)
+            elapsed = time.perf_counter() - started
+            row.processing_ms = elapsed * 1000
+            metrics.event_processing.labels(row.event_type, row.status).observe(elapsed)
+            row.save(update_fields=[
+                'status', 'attempts', 'last_error', 'next_attempt_at', 'processed_at', 'processing_ms',
+            ])
+
+    return processed, failed
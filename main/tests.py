@@ -1,3 +1,1798 @@
-from django.test import TestCase
+import asyncio
+import json
+import random
+import tempfile
+import threading
+from importlib import import_module
+from datetime import date, time, timedelta
+from io import StringIO
+from time import sleep
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import stripe
+from asgiref.sync import sync_to_async
+from prometheus_client import REGISTRY
+from django.apps import apps as django_apps
+from django.contrib import admin
+from django.contrib.auth.models import Group, User
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils.timezone import localtime, now
+
+from . import live
+from .auth import access_snapshot
+from .availability import (
+    LOCK_STRIPES,
+    DayAvailability,
+    _local_locks,
+    _occupying_rows,
+    cached_day_availability,
+    deferred_refresh,
+    load_availability,
+    month_occupancy,
+    refresh_days,
+)
+from .booking import BookingError, book_hours
+from .catalog import get_checkout_price, handle_catalog_event
+from .models import (
+    BookedSession,
+    EmailOutbox,
+    Invite,
+    MembershipPlan,
+    PendingSessionRequest,
+    StripeEvent,
+    StripeSubscription,
+    StudioDay,
+    UserMembership,
+    UserProfile,
+)
+from .emails import send_payment_email_stripe
+from .fake_stripe import FakeStripeServer
+from .instrumentation import TimedEmailConnection, track, window as timing_window
+from .operator_console import PAGE_SIZE, _page_queryset, approve_requests, reject_requests, request_page
+from .outbox import MAX_ATTEMPTS as OUTBOX_MAX_ATTEMPTS, backoff, drain, enqueue
+from .payment_links import ensure_payment_links
+from .payments_subscription import handle_reservation_payment
+from .services import create_stripe_customer, get_subscription, sync_subscription_mirror
+from .stripe_events import process_events
+
+
+# ----------------------------------------------------------------------------------
+# QUERY PLANS
+# ----------------------------------------------------------------------------------
+@skipUnless(connection.vendor in ("sqlite", "postgresql"), "EXPLAIN checks cover SQLite and Postgres only")
+class BookingQueryPlanTests(TestCase):
+    """
+    Seeds enough history that a table scan would be the planner's worst
+    choice, then checks the hot booking queries are served by an index.
+    """
+    ROWS = 20000
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(7)
+        cls.members = [User.objects.create_user(username=f"plan-member-{i}") for i in range(50)]
+        start = date.today() - timedelta(days=365)
+        statuses = ["booked", "paid", "canceled"]
+        # One hour each, back to back, so the overlap constraint holds
+        sessions = [
+            BookedSession(
+                booked_by=rng.choice(cls.members),
+                booked_date=start + timedelta(days=i // 16),
+                booked_start_time=time(8 + i % 16),
+                duration_hours=1,
+                status=rng.choice(statuses),
+            )
+            for i in range(cls.ROWS)
+        ]
+        for session in sessions:
+            session.fill_range()
+        BookedSession.objects.bulk_create(sessions, batch_size=2000)
+        PendingSessionRequest.objects.bulk_create(
+            [
+                PendingSessionRequest(
+                    requester_name="Plan",
+                    requester_email="plan@example.com",
+                    requested_date=start + timedelta(days=i % 730),
+                    requested_time=time(8 + i % 16),
+                    hours=1,
+                    status=rng.choice(["pending", "approved", "declined", "paid"]),
+                )
+                for i in range(cls.ROWS)
+            ],
+            batch_size=2000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == "sqlite":
+            scans = [line for line in plan.splitlines() if "SCAN" in line and "USING" not in line]
+            self.assertIn("USING", plan, plan)
+            self.assertFalse(scans, f"Table scan in plan:\n{plan}")
+        else:
+            self.assertIn("Index", plan, plan)
+            self.assertNotIn("Seq Scan", plan, plan)
+
+    def test_availability_query_uses_index(self):
+        day = date.today()
+        self.assertUsesIndex(_occupying_rows(day, day))
+
+    def test_session_manager_query_uses_index(self):
+        # session_manager_view
+        queryset = BookedSession.objects.filter(
+            booked_by=self.members[0],
+            status='booked',
+            starts_at__gte=now()
+        ).order_by('starts_at')
+        self.assertUsesIndex(queryset)
+
+    def test_operator_console_query_uses_index(self):
+        # operator_console_view: first page, then a page deep into the history
+        self.assertUsesIndex(_page_queryset("pending", None, None)[:PAGE_SIZE + 1])
+        _, cursor = request_page("pending")
+        for _ in range(20):
+            _, cursor = request_page("pending", cursor=cursor)
+        self.assertIsNotNone(cursor)
+        deep = _page_queryset("pending", None, cursor)[:PAGE_SIZE + 1]
+        self.assertUsesIndex(deep)
+        if connection.vendor == "sqlite":
+            # The index order is the page order: no sort step
+            self.assertNotIn("TEMP B-TREE", deep.explain())
+
+
+# ----------------------------------------------------------------------------------
+# CONCURRENT BOOKING
+# ----------------------------------------------------------------------------------
+class ConcurrentBookingTests(TransactionTestCase):
+    """
+    Many threads race to book the same hours; the studio must never be
+    double-booked and credits must match what was actually booked.
+    """
+    THREADS = 8
+    ATTEMPTS = 3
+
+    def setUp(self):
+        self.day = date.today() + timedelta(days=10)
+        self.members = []
+        for i in range(self.THREADS // 2):
+            user = User.objects.create_user(username=f"racer-{i}")
+            UserMembership.objects.create(user=user, active=True, credits=10)
+            self.members.append(user)
+
+    def _race(self, attempts):
+        barrier = threading.Barrier(len(attempts))
+        outcomes = []
+
+        def attempt(user, hours):
+            try:
+                barrier.wait()
+                book_hours(user, self.day, hours)
+                outcomes.append("booked")
+            except BookingError:
+                outcomes.append("refused")
+            except OperationalError:
+                # SQLite may report "database is locked" instead of waiting
+                outcomes.append("locked")
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=attempt, args=args) for args in attempts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def booked_hours(self, rows):
+        # One row per run of contiguous hours
+        return [h for row in rows for h in range(row.booked_start_time.hour, row.booked_start_time.hour + row.duration_hours)]
+
+    def assertNoOverbooking(self):
+        rows = BookedSession.objects.filter(booked_date=self.day, status="booked")
+        hours = self.booked_hours(rows)
+        self.assertEqual(len(hours), len(set(hours)), f"Double-booked hours: {sorted(hours)}")
+        for user in self.members:
+            membership = UserMembership.objects.get(user=user)
+            booked = len(self.booked_hours(rows.filter(booked_by=user)))
+            self.assertEqual(membership.credits, 10 - booked)
+
+    def test_same_hours_from_many_members(self):
+        attempts = [(self.members[i % len(self.members)], [14, 15]) for i in range(self.THREADS)]
+        for _ in range(self.ATTEMPTS):
+            outcomes = self._race(attempts)
+            self.assertLessEqual(outcomes.count("booked"), 1)
+        self.assertEqual(len(self.booked_hours(BookedSession.objects.filter(booked_date=self.day))), 2)
+        self.assertNoOverbooking()
+
+    def test_overlapping_selections_from_two_tabs(self):
+        user = self.members[0]
+        attempts = [(user, [10, 11, 12]), (user, [12, 13]), (user, [9, 10]), (user, [13, 14])]
+        self._race(attempts)
+        self.assertNoOverbooking()
+
+    def test_credits_never_go_negative(self):
+        user = self.members[0]
+        UserMembership.objects.filter(user=user).update(credits=3)
+        attempts = [(user, [8 + 2 * i, 9 + 2 * i]) for i in range(self.THREADS)]
+        outcomes = self._race(attempts)
+        self.assertLessEqual(outcomes.count("booked"), 1)
+        membership = UserMembership.objects.get(user=user)
+        booked = len(self.booked_hours(BookedSession.objects.filter(booked_by=user)))
+        self.assertEqual(membership.credits, 3 - booked)
+
+
+# ----------------------------------------------------------------------------------
+# OVERLAP CONSTRAINT
+# ----------------------------------------------------------------------------------
+@skipUnless(connection.vendor in ("sqlite", "postgresql"), "Overlap constraint exists on SQLite and Postgres only")
+class BookingOverlapConstraintTests(TestCase):
+    """
+    The database itself refuses overlapping active bookings.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="overlap")
+        self.day = date.today() + timedelta(days=3)
+        BookedSession.objects.create(
+            booked_by=self.user, booked_date=self.day, booked_start_time=time(14), duration_hours=2,
+        )
+
+    def test_overlapping_insert_is_rejected(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            BookedSession.objects.create(
+                booked_by=self.user, booked_date=self.day, booked_start_time=time(15), duration_hours=1,
+            )
+
+    def test_adjacent_and_canceled_rows_are_allowed(self):
+        BookedSession.objects.create(booked_by=self.user, booked_date=self.day, booked_start_time=time(16))
+        BookedSession.objects.create(
+            booked_by=self.user, booked_date=self.day, booked_start_time=time(14), status="canceled",
+        )
+        self.assertEqual(BookedSession.objects.filter(booked_date=self.day).count(), 3)
+
+    def test_session_spilling_past_midnight_is_still_caught(self):
+        BookedSession.objects.create(
+            booked_by=self.user, booked_date=self.day, booked_start_time=time(23), duration_hours=2,
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            BookedSession.objects.create(
+                booked_by=self.user, booked_date=self.day + timedelta(days=1), booked_start_time=time(0),
+            )
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite triggers only")
+    def test_sqlite_trigger_probes_about_a_day_of_bookings(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "EXPLAIN QUERY PLAN SELECT 1 FROM booked_sessions WHERE status IN ('booked', 'paid') "
+                "AND starts_at < %s AND starts_at > datetime(%s, '-1 day') AND ends_at > %s",
+                ["2030-01-02 10:00:00", "2030-01-02 09:00:00", "2030-01-02 09:00:00"],
+            )
+            plan = " ".join(str(row[-1]) for row in cursor.fetchall())
+            cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'booked_sessions_no_overlap_INSERT'")
+            trigger = cursor.fetchone()[0]
+        self.assertIn("datetime(NEW.starts_at, '-1 day')", trigger)
+        self.assertIn("starts_at>? AND starts_at<?", plan)
+
+    def test_book_hours_reports_constraint_as_booking_error(self):
+        UserMembership.objects.create(user=self.user, active=True, credits=5)
+        # Simulate a check that raced: the day looks empty to book_hours
+        with mock.patch("main.booking.day_availability") as availability:
+            availability.return_value.is_free.return_value = True
+            with self.assertRaises(BookingError):
+                book_hours(self.user, self.day, [15])
+
+
+# ----------------------------------------------------------------------------------
+# REQUEST-SCOPED USER LOADING
+# ----------------------------------------------------------------------------------
+class AccessSnapshotQueryTests(TestCase):
+    """
+    The user, profile, membership and plan arrive in one query, so role
+    and credit checks add nothing on top of session + user loading.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="snapshot")
+        self.user.profile.role = "member"
+        self.user.profile.save()
+        UserMembership.objects.create(user=self.user, active=True, credits=4)
+        self.client.force_login(self.user)
+
+    def test_home_loads_user_in_one_query(self):
+        # session + user (with profile/membership)
+        with self.assertNumQueries(2):
+            self.client.get(reverse("home"))
+
+    def test_member_profile_loads_user_in_one_query(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("member_profile"))
+        self.assertEqual(response.context["membership_status"], "Paid")
+
+    def test_daily_scheduler_adds_only_the_availability_query(self):
+        # session + user + the StudioDay row (validators and page share it)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("daily_scheduler"))
+        self.assertEqual(response.context["max_credits"], 4)
+
+    @override_settings(AUTHENTICATION_BACKENDS=["django.contrib.auth.backends.ModelBackend"])
+    def test_plain_model_backend_needs_extra_queries(self):
+        self.client.force_login(self.user)
+        # ... + lazy profile + lazy membership
+        with self.assertNumQueries(5):
+            self.client.get(reverse("daily_scheduler"))
+
+    def test_admin_dashboard_reads_membership_from_snapshot(self):
+        self.user.profile.role = "admin"
+        self.user.profile.save()
+        response = self.client.get(reverse("admin_dashboard"))
+        self.assertEqual(response.context["membership_status"], "Paid")
+
+    def test_sessions_from_before_studio_backend_stay_signed_in(self):
+        self.client.force_login(self.user, backend="django.contrib.auth.backends.ModelBackend")
+        response = self.client.get(reverse("member_profile"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["user"], self.user)
+
+    def test_snapshot_without_membership(self):
+        user = User.objects.create_user(username="no-membership")
+        snapshot = access_snapshot(User.objects.select_related("profile", "usermembership").get(pk=user.pk))
+        self.assertEqual(snapshot.role, "public")
+        self.assertEqual(snapshot.credits, 0)
+        self.assertFalse(snapshot.has_access)
+
+
+# ----------------------------------------------------------------------------------
+# AVAILABILITY ENGINE
+# ----------------------------------------------------------------------------------
+class AvailabilityEngineTests(TestCase):
+    """
+    Free-slot searches over a day's mask, and how bookings and requests
+    fill that mask.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="engine", first_name="Grace", last_name="Hopper")
+        self.day = date.today() + timedelta(days=20)
+
+    def day_with(self, *hours):
+        availability = DayAvailability(self.day)
+        for hour in hours:
+            availability.occupy(hour, "reserved", None)
+        return availability
+
+    def book(self, day, hour, hours=1, **fields):
+        return BookedSession.objects.create(
+            booked_by=self.user, booked_date=day, booked_start_time=time(hour), duration_hours=hours, **fields,
+        )
+
+    def request(self, hour, hours=1, status="pending"):
+        return PendingSessionRequest.objects.create(
+            requester_name="Req", requester_email="req@example.com",
+            requested_date=self.day, requested_time=time(hour), hours=hours, status=status,
+        )
+
+    def test_free_runs_skip_taken_hours(self):
+        availability = self.day_with(10, 13)
+        self.assertEqual(availability.free_runs(2, 8, 16), [8, 11, 14])
+        self.assertEqual(availability.free_runs(1, 8, 12), [8, 9, 11])
+        self.assertEqual(availability.free_runs(3, 10, 14), [])
+        self.assertEqual(availability.free_runs(0), [])
+
+    def test_free_runs_stop_at_the_window_end(self):
+        availability = self.day_with()
+        self.assertEqual(availability.free_runs(3, 20, 24), [20, 21])
+        self.assertEqual(availability.free_runs(5, 20, 24), [])
+
+    def test_is_range_free_checks_every_hour(self):
+        availability = self.day_with(12)
+        self.assertTrue(availability.is_range_free(9, 3))
+        self.assertFalse(availability.is_range_free(10, 3))
+        self.assertFalse(availability.is_range_free(12, 1))
+        self.assertTrue(availability.is_range_free(22, 2))
+        self.assertFalse(availability.is_range_free(23, 2))
+        self.assertFalse(availability.is_range_free(-1, 2))
+        self.assertFalse(availability.is_range_free(9, 0))
+
+    def test_multi_hour_booking_takes_each_hour(self):
+        self.book(self.day, 10, hours=3)
+        availability = load_availability(self.day, self.day)[self.day]
+        self.assertEqual([h for h in range(8, 16) if not availability.is_free(h)], [10, 11, 12])
+        self.assertEqual(availability.slots[11], ("reserved", "Grace Hopper"))
+
+    def test_back_to_back_bookings_share_no_hour(self):
+        self.book(self.day, 10, hours=2)
+        self.book(self.day, 12, hours=2)
+        availability = load_availability(self.day, self.day)[self.day]
+        self.assertTrue(availability.is_free(9))
+        self.assertTrue(availability.is_free(14))
+        self.assertFalse(availability.is_range_free(13, 2))
+        self.assertTrue(availability.is_range_free(14, 2))
+        self.assertEqual(availability.free_runs(2, 8, 16), [8, 14])
+
+    def test_run_crossing_midnight_spills_into_the_next_day(self):
+        following = self.day + timedelta(days=1)
+        self.book(self.day, 23, hours=2)
+        days = load_availability(self.day, following)
+        self.assertFalse(days[self.day].is_free(23))
+        self.assertFalse(days[following].is_free(0))
+        self.assertTrue(days[following].is_free(1))
+        # A range that starts on the second day still sees the spill
+        self.assertFalse(load_availability(following, following)[following].is_free(0))
+
+    def test_pending_and_booked_statuses(self):
+        self.request(9)
+        self.request(10, status="approved")
+        self.request(11, status="declined")
+        self.book(self.day, 12, status="paid")
+        self.book(self.day, 13, status="canceled")
+        availability = load_availability(self.day, self.day)[self.day]
+        self.assertEqual(availability.slots[9], ("requested", "Requested"))
+        self.assertEqual(availability.slots[10], ("pending", "Pending"))
+        self.assertEqual(availability.slots[12], ("reserved", "Grace Hopper"))
+        self.assertTrue(availability.is_free(11))
+        self.assertTrue(availability.is_free(13))
+
+    def test_booking_wins_an_hour_shared_with_a_request(self):
+        self.request(15, hours=2)
+        self.book(self.day, 16)
+        availability = load_availability(self.day, self.day)[self.day]
+        self.assertEqual(availability.slots[15], ("requested", "Requested"))
+        self.assertEqual(availability.slots[16], ("reserved", "Grace Hopper"))
+
+
+# ----------------------------------------------------------------------------------
+# AVAILABILITY CACHE
+# ----------------------------------------------------------------------------------
+class AvailabilityCacheTests(TestCase):
+    """
+    Cached occupancy is loaded once per miss and dropped by booking writes.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="cached")
+        self.day = date.today() + timedelta(days=6)
+
+    def test_concurrent_misses_load_the_day_once(self):
+        threads = 8
+        barrier = threading.Barrier(threads)
+        loads = []
+
+        def load(day):
+            loads.append(day)
+            sleep(0.1)
+            return mock.Mock(mask=1 << 9, slots={9: ("reserved", None)})
+
+        def read():
+            barrier.wait()
+            results.append(cached_day_availability(self.day).is_free(9))
+
+        results = []
+        with mock.patch("main.availability.day_availability", side_effect=load):
+            workers = [threading.Thread(target=read) for _ in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(loads, [self.day])
+        self.assertEqual(results, [False] * threads)
+
+    def test_locks_do_not_grow_with_the_keys_seen(self):
+        for offset in range(500):
+            cached_day_availability(self.day + timedelta(days=offset))
+        self.assertEqual(len(_local_locks), LOCK_STRIPES)
+
+    def test_booking_write_drops_the_cached_day_and_month(self):
+        self.assertTrue(cached_day_availability(self.day).is_free(14))
+        self.assertTrue(month_occupancy(self.day.year, self.day.month)[self.day].is_free(14))
+        with self.assertNumQueries(0):
+            cached_day_availability(self.day)
+
+        session = BookedSession.objects.create(booked_by=self.user, booked_date=self.day, booked_start_time=time(14))
+        self.assertFalse(cached_day_availability(self.day).is_free(14))
+        self.assertFalse(month_occupancy(self.day.year, self.day.month)[self.day].is_free(14))
+
+        session.delete()
+        self.assertTrue(cached_day_availability(self.day).is_free(14))
+
+
+# ----------------------------------------------------------------------------------
+# AVAILABILITY API
+# ----------------------------------------------------------------------------------
+class AvailabilityApiTests(TestCase):
+    """
+    /api/availability/ returns slot states and revalidates with a weak ETag.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="api", first_name="Ada")
+        self.day = date.today() + timedelta(days=5)
+        self.url = reverse("availability_api") + f"?from={self.day}&to={self.day + timedelta(days=1)}"
+        self.session = BookedSession.objects.create(
+            booked_by=self.user, booked_date=self.day, booked_start_time=time(10), duration_hours=2,
+        )
+
+    def test_returns_slot_states_for_range(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        days = response.json()["days"]
+        self.assertEqual([d["date"] for d in days], [str(self.day), str(self.day + timedelta(days=1))])
+        taken = [slot["hour"] for slot in days[0]["slots"] if slot["status"] != "available"]
+        self.assertEqual(taken, [10, 11])
+        self.assertNotIn("Ada", response.content.decode())
+
+    def test_unchanged_range_answers_304_from_the_stamp(self):
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        PendingSessionRequest.objects.create(
+            requester_name="Guest", requester_email="guest@example.com", requester_phone="555",
+            requested_date=self.day, requested_time=time(15), hours=1,
+        )
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+
+        self.session.delete()
+        self.assertNotEqual(self.client.get(self.url)["ETag"], changed["ETag"])
+
+    def test_invalid_range_is_rejected(self):
+        self.assertEqual(self.client.get(reverse("availability_api") + "?from=tomorrow").status_code, 400)
+        too_long = f"?from={self.day}&to={self.day + timedelta(days=100)}"
+        self.assertEqual(self.client.get(reverse("availability_api") + too_long).status_code, 400)
+
+
+# ----------------------------------------------------------------------------------
+# MONTHLY CALENDAR
+# ----------------------------------------------------------------------------------
+class MonthlyCalendarTests(TestCase):
+    """
+    Each calendar cell shows the day's free hours and flags full days.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="heatmap", first_name="Full")
+        self.client.force_login(self.user)
+        self.day = date.today() + timedelta(days=3)
+
+    def cells(self):
+        response = self.client.get(reverse("monthly_calendar"), {"year": self.day.year, "month": self.day.month})
+        return response, {cell["day"]: cell for cell in response.context["days_to_display"]}
+
+    def test_filled_day_is_flagged_fully_booked(self):
+        BookedSession.objects.create(
+            booked_by=self.user, booked_date=self.day, booked_start_time=time(8), duration_hours=16,
+        )
+        BookedSession.objects.create(
+            booked_by=self.user, booked_date=self.day + timedelta(days=1), booked_start_time=time(10), duration_hours=2,
+        )
+        response, cells = self.cells()
+        self.assertEqual((cells[self.day]["free_hours"], cells[self.day]["fully_booked"]), (0, True))
+        following = cells[self.day + timedelta(days=1)]
+        self.assertEqual((following["free_hours"], following["fully_booked"]), (14, False))
+        self.assertContains(response, "fully-booked\">", count=1)
+
+    def test_request_holds_count_towards_a_full_day(self):
+        PendingSessionRequest.objects.create(
+            requester_name="Req", requester_email="req@example.com",
+            requested_date=self.day, requested_time=time(8), hours=8,
+        )
+        BookedSession.objects.create(
+            booked_by=self.user, booked_date=self.day, booked_start_time=time(16), duration_hours=8,
+        )
+        self.assertTrue(self.cells()[1][self.day]["fully_booked"])
+
+
+# ----------------------------------------------------------------------------------
+# CONDITIONAL PAGES
+# ----------------------------------------------------------------------------------
+class ConditionalPageTests(TestCase):
+    """
+    The scheduler and calendar revalidate with 304 until something they
+    show changes: a booking on the date, or the viewer's credits.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="conditional")
+        self.user.profile.role = "member"
+        self.user.profile.save()
+        self.membership = UserMembership.objects.create(user=self.user, active=True, credits=4)
+        self.client.force_login(self.user)
+        self.day = date.today() + timedelta(days=2)
+        self.url = reverse("daily_scheduler") + f"?date={self.day}"
+        # The first render sets the CSRF cookie, which is part of the validator
+        self.client.get(self.url)
+
+    def test_repeat_visit_is_304_without_loading_availability(self):
+        etag = self.client.get(self.url)["ETag"]
+        # session + user + the date's StudioDay stamp
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_stamps_do_not_depend_on_this_workers_cache(self):
+        etag = self.client.get(self.url)["ETag"]
+        # Another worker's cache: nothing here saw the write or its stamps
+        with mock.patch("main.availability.invalidate_dates"):
+            BookedSession.objects.create(booked_by=self.user, booked_date=self.day, booked_start_time=time(12))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        slots = {slot["hour"]: slot["status"] for slot in response.context["time_slots"]}
+        self.assertEqual(slots[12], "reserved")
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_booking_on_the_date_changes_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        BookedSession.objects.create(booked_by=self.user, booked_date=self.day, booked_start_time=time(12))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_booking_on_another_date_keeps_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        BookedSession.objects.create(
+            booked_by=self.user, booked_date=self.day + timedelta(days=3), booked_start_time=time(12),
+        )
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_credits_change_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        UserMembership.objects.filter(pk=self.membership.pk).update(credits=1)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_monthly_calendar_revalidates(self):
+        url = reverse("monthly_calendar")
+        response = self.client.get(url)
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        BookedSession.objects.create(booked_by=self.user, booked_date=date.today(), booked_start_time=time(23))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+    def test_monthly_calendar_validators_follow_the_month_shown(self):
+        # ?month= alone shows the current month, so that month's writes count
+        following = (date.today().replace(day=1) + timedelta(days=32)).month
+        url = reverse("monthly_calendar") + f"?month={following}"
+        response = self.client.get(url)
+        self.assertEqual(response.context["month"], date.today().month)
+        BookedSession.objects.create(booked_by=self.user, booked_date=date.today(), booked_start_time=time(23))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+
+# ----------------------------------------------------------------------------------
+# LIVE UPDATES
+# ----------------------------------------------------------------------------------
+class LiveUpdateTests(TestCase):
+    """
+    Committed writes reach open scheduler and operator streams.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="live")
+        self.user.profile.role = "operator"
+        self.user.profile.save()
+        UserMembership.objects.create(user=self.user, active=True, credits=5)
+        self.day = date.today() + timedelta(days=4)
+
+    async def _next_frame(self, stream):
+        frame = await asyncio.wait_for(anext(stream), 5)
+        return frame.decode() if isinstance(frame, bytes) else frame
+
+    async def test_booking_is_streamed_to_the_scheduler(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("scheduler_events"), {"date": str(self.day)})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertIn("retry", await self._next_frame(stream))
+
+        def book():
+            with self.captureOnCommitCallbacks(execute=True):
+                book_hours(self.user, self.day, [9])
+
+        await sync_to_async(book)()
+        frame = await self._next_frame(stream)
+        self.assertIn("event: availability", frame)
+        self.assertIn(str(self.day), frame)
+        await stream.aclose()
+
+    async def test_closed_subscriptions_leave_the_broker(self):
+        before = live.broker.subscriber_count()
+        subscription = live.broker.subscribe([live.date_topic(self.day), live.OPERATORS_TOPIC])
+        self.assertEqual(live.broker.subscriber_count(), before + 1)
+        subscription.close()
+        self.assertEqual(live.broker.subscriber_count(), before)
+
+    async def test_operator_stream_accepts_model_backend_sessions(self):
+        # Sessions from before StudioBackend load the profile lazily
+        await self.async_client.aforce_login(self.user, backend="django.contrib.auth.backends.ModelBackend")
+        response = await self.async_client.get(reverse("operator_events"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertIn("retry", await self._next_frame(stream))
+        await stream.aclose()
+
+    async def test_new_request_is_streamed_to_operators(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("operator_events"))
+        stream = aiter(response.streaming_content)
+        await self._next_frame(stream)
+
+        def request_session():
+            with self.captureOnCommitCallbacks(execute=True):
+                return PendingSessionRequest.objects.create(
+                    requester_name="Live", requester_email="live@example.com", requester_phone="555",
+                    requested_date=self.day, requested_time=time(18), hours=1,
+                )
+
+        row = await sync_to_async(request_session)()
+        # The availability notice for the date goes to scheduler topics only
+        frame = await self._next_frame(stream)
+        self.assertIn("event: request", frame)
+        self.assertIn(f'"id": {row.id}', frame)
+        await stream.aclose()
+
+    def redis_fanout(self):
+        redis_module = mock.Mock()
+        with mock.patch.dict("sys.modules", {"redis": redis_module}):
+            fanout = live.RedisFanout(mock.Mock())
+        return fanout, redis_module.Redis.from_url.return_value
+
+    def test_publishing_alone_opens_no_redis_listener(self):
+        fanout, client = self.redis_fanout()
+        fanout.publish(live.date_topic(self.day), {"type": "availability"})
+        client.publish.assert_called_once()
+        client.pubsub.assert_not_called()
+        self.assertIsNone(fanout._listener)
+
+    def test_redis_listener_reconnects_with_backoff(self):
+        fanout, client = self.redis_fanout()
+        connected = mock.Mock()
+        connected.listen.return_value = iter([
+            {"channel": b"studio:live:operators", "data": json.dumps({"type": "request"})},
+        ])
+        client.pubsub.side_effect = [ConnectionError("refused"), ConnectionError("refused"), connected]
+        delays = []
+
+        def sleep(seconds):
+            delays.append(seconds)
+            if len(delays) == 3:
+                raise KeyboardInterrupt
+
+        with mock.patch("main.live.time.sleep", side_effect=sleep), self.assertLogs("main.live", "WARNING"):
+            with self.assertRaises(KeyboardInterrupt):
+                fanout._listen()
+        self.assertEqual(delays, [1, 2, 1])
+        fanout.broker.broadcast.assert_called_once_with({"type": "resync"})
+        fanout.broker.dispatch.assert_called_once_with("operators", {"type": "request"})
+
+    def test_members_cannot_open_the_operator_stream(self):
+        self.user.profile.role = "member"
+        self.user.profile.save()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("operator_events")).status_code, 403)
+
+
+# ----------------------------------------------------------------------------------
+# OPERATOR CONSOLE
+# ----------------------------------------------------------------------------------
+class OperatorConsoleTests(TestCase):
+    """
+    Keyset pages over (created_at, id) and bulk review in one UPDATE.
+    """
+
+    def setUp(self):
+        self.operator = User.objects.create_user(username="console-operator")
+        self.operator.profile.role = "operator"
+        self.operator.profile.save()
+        self.client.force_login(self.operator)
+        self.day = date.today() + timedelta(days=6)
+        created = now()
+        rows = PendingSessionRequest.objects.bulk_create([
+            PendingSessionRequest(
+                requester_name=f"Guest {i}", requester_email=f"guest{i}@example.com", requester_phone="555",
+                requested_date=self.day + timedelta(days=i % 2), requested_time=time(8 + i % 12), hours=1,
+            )
+            for i in range(60)
+        ])
+        # Ties on created_at are what the id tiebreaker is for
+        PendingSessionRequest.objects.filter(id__in=[r.id for r in rows[:30]]).update(created_at=created)
+        self.ids = [r.id for r in rows]
+
+    def test_keyset_pages_cover_every_request_once(self):
+        seen, cursor = [], None
+        while True:
+            rows, cursor = request_page("pending", cursor=cursor, page_size=25)
+            seen.extend(row.id for row in rows)
+            if cursor is None:
+                break
+        self.assertEqual(sorted(seen), sorted(self.ids))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_console_filters_by_date(self):
+        response = self.client.get(reverse("operator_console"), {"date": str(self.day)})
+        self.assertTrue(all(r.requested_date == self.day for r in response.context["pending_requests"]))
+        self.assertIsNotNone(response.context["next_page_query"])
+
+    def test_bulk_reject_is_one_update_and_one_email_insert(self):
+        selected = self.ids[:20]
+        with CaptureQueriesContext(connection) as queries:
+            updated = reject_requests(selected, "Any evening next week")
+        self.assertEqual(len(updated), 20)
+        writes = [q["sql"] for q in queries.captured_queries if q["sql"].startswith(("UPDATE", "INSERT"))]
+        # Plus the insert and update that rewrite the day's StudioDay row
+        self.assertEqual(len(writes), 4, writes)
+        self.assertEqual(sum('"studio_days"' in sql for sql in writes), 2, writes)
+        self.assertEqual(PendingSessionRequest.objects.filter(id__in=selected, status="declined").count(), 20)
+        self.assertEqual(EmailOutbox.objects.count(), 20)
+
+    def test_bulk_post_skips_requests_already_handled(self):
+        PendingSessionRequest.objects.filter(id=self.ids[0]).update(status="declined")
+        response = self.client.post(
+            reverse("operator_console"), {"action": "reject", "request_id": self.ids[:3]}, follow=True,
+        )
+        self.assertContains(response, "2 request(s) rejected")
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+
+
+# ----------------------------------------------------------------------------------
+# PAYMENT LINKS
+# ----------------------------------------------------------------------------------
+class PaymentLinkTests(TestCase):
+    """
+    Approvals create Checkout links concurrently and resends reuse them.
+    """
+
+    def setUp(self):
+        self.server = FakeStripeServer().start().install()
+        self.addCleanup(self.server.stop)
+        self.rows = PendingSessionRequest.objects.bulk_create([
+            PendingSessionRequest(
+                requester_name=f"Payer {i}", requester_email=f"payer{i}@example.com", requester_phone="555",
+                requested_date=date.today() + timedelta(days=8), requested_time=time(8 + i), hours=1,
+            )
+            for i in range(6)
+        ])
+
+    def test_bulk_approval_stores_links_and_queues_emails(self):
+        approved = approve_requests([row.id for row in self.rows])
+        self.assertEqual(len(approved), 6)
+        self.assertEqual(self.server.state.request_count, 6)
+        stored = PendingSessionRequest.objects.filter(status="approved").exclude(checkout_url=None)
+        self.assertEqual(stored.count(), 6)
+        for row in stored:
+            self.assertTrue(
+                EmailOutbox.objects.filter(body__contains=row.checkout_url).exists(), row.checkout_url
+            )
+
+    def test_resend_reuses_the_stored_link(self):
+        ensure_payment_links(self.rows)
+        calls = self.server.state.request_count
+        row = PendingSessionRequest.objects.get(id=self.rows[0].id)
+        send_payment_email_stripe(row)
+        self.assertEqual(self.server.state.request_count, calls)
+        self.assertIn(row.checkout_url, EmailOutbox.objects.get().body)
+
+    def test_expired_link_is_replaced(self):
+        ensure_payment_links(self.rows[:1])
+        row = PendingSessionRequest.objects.get(id=self.rows[0].id)
+        row.checkout_expires_at = now() + timedelta(minutes=5)
+        old_url = row.checkout_url
+        batch = ensure_payment_links([row])
+        self.assertEqual(batch.created, 1)
+        self.assertNotEqual(row.checkout_url, old_url)
+
+    def test_failures_and_batch_timing_are_logged(self):
+        failing = mock.patch(
+            "main.payment_links.create_checkout_session", side_effect=stripe.error.APIConnectionError("down")
+        )
+        with failing, self.assertLogs("main.perf", "INFO") as logs:
+            batch = ensure_payment_links(self.rows[:2])
+        self.assertEqual(sorted(batch.failed), sorted(row.id for row in self.rows[:2]))
+        warnings = [record for record in logs.records if record.levelname == "WARNING"]
+        self.assertEqual(len(warnings), 2)
+        self.assertIn(f"request {self.rows[0].id} failed", warnings[0].getMessage())
+        self.assertIn("0 created, 0 reused, 2 failed", logs.output[-1])
+
+
+# ----------------------------------------------------------------------------------
+# INSTRUMENTATION
+# ----------------------------------------------------------------------------------
+class RequestTimingTests(TestCase):
+    """
+    Requests carry Server-Timing and land in the per-URL rolling window.
+    """
+
+    def setUp(self):
+        timing_window.clear()
+        self.user = User.objects.create_user(username="timed")
+        self.user.profile.role = "admin"
+        self.user.profile.save()
+        self.client.force_login(self.user)
+
+    def test_server_timing_counts_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("daily_scheduler"))
+        header = response["Server-Timing"]
+        self.assertIn("db;dur=", header)
+        self.assertIn(f'desc="{len(queries)} call(s)"', header)
+        self.assertIn("total;dur=", header)
+
+    def test_stripe_calls_are_timed(self):
+        server = FakeStripeServer().start().install()
+        self.addCleanup(server.stop)
+        with track("test.stripe") as timings:
+            create_stripe_customer("timed@example.com", "Timed", "User")
+        self.assertEqual(timings.counts["stripe"], 1)
+        self.assertGreater(timings.seconds["stripe"], 0)
+
+    def test_smtp_sends_are_timed(self):
+        with track("test.smtp") as timings:
+            connection = TimedEmailConnection(get_connection())
+            EmailMessage("Hi", "Body", "a@example.com", ["b@example.com"], connection=connection).send()
+        self.assertEqual(timings.counts["smtp"], 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_performance_page_lists_url_names(self):
+        self.client.get(reverse("home"))
+        self.client.get(reverse("home"))
+        response = self.client.get(reverse("performance"))
+        rows = {row["name"]: row for row in response.context["rows"]}
+        self.assertEqual(rows["home"]["requests"], 2)
+
+
+# ----------------------------------------------------------------------------------
+# METRICS
+# ----------------------------------------------------------------------------------
+@override_settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN="scrape-token")
+class MetricsTests(TestCase):
+    """
+    /metrics is restricted and reports bookings, webhooks and the outbox.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.member = User.objects.create_user(username="counted")
+        self.member.profile.role = "member"
+        self.member.profile.save()
+        UserMembership.objects.create(user=self.member, active=True, credits=5)
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def scrape(self):
+        return self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape-token")
+
+    def test_scrape_needs_token_or_address(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.assertEqual(self.scrape().status_code, 200)
+        with override_settings(METRICS_ALLOWED_IPS=["127.0.0.1"]):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
+
+    def test_booking_counts_sessions_and_credits(self):
+        day = date.today() + timedelta(days=5)
+        bookings = self.sample("studio_bookings_total")
+        credits = self.sample("studio_credits_consumed_total")
+        requests = self.sample("studio_http_requests_total", view="daily_scheduler", method="POST", status="302")
+
+        self.client.force_login(self.member)
+        self.client.post(
+            f"{reverse('daily_scheduler')}?date={day.isoformat()}",
+            {"action": "book_selected", "selected_hours": "10,11"},
+        )
+
+        # Two contiguous hours: one session, two credits
+        self.assertEqual(self.sample("studio_bookings_total") - bookings, 1)
+        self.assertEqual(self.sample("studio_credits_consumed_total") - credits, 2)
+        self.assertEqual(
+            self.sample("studio_http_requests_total", view="daily_scheduler", method="POST", status="302") - requests, 1
+        )
+
+    def test_webhook_deliveries_by_type(self):
+        event = {"id": "evt_metrics", "type": "invoice.paid", "created": 1, "data": {"object": {}}}
+        before = self.sample("studio_stripe_webhook_events_total", type="invoice.paid", outcome="stored")
+        duplicates = self.sample("studio_stripe_webhook_events_total", type="invoice.paid", outcome="duplicate")
+
+        with mock.patch("stripe.Webhook.construct_event"):
+            for _ in range(2):
+                self.client.post(reverse("stripe_webhook"), json.dumps(event), content_type="application/json")
+
+        self.assertEqual(self.sample("studio_stripe_webhook_events_total", type="invoice.paid", outcome="stored") - before, 1)
+        self.assertEqual(
+            self.sample("studio_stripe_webhook_events_total", type="invoice.paid", outcome="duplicate") - duplicates, 1
+        )
+
+    def test_outbox_depth_is_scraped(self):
+        EmailOutbox.objects.create(subject="Hi", body="", from_email="a@example.com", to=["b@example.com"])
+        body = self.scrape().content.decode()
+        self.assertIn('studio_outbox_depth{status="pending"} 1.0', body)
+        self.assertIn("studio_http_request_duration_seconds_bucket", body)
+
+    def test_stripe_backlog_reports_only_event_statuses(self):
+        StripeEvent.objects.create(event_id="evt_backlog", event_type="invoice.paid", payload={})
+        body = self.scrape().content.decode()
+        self.assertIn('studio_stripe_event_backlog{status="pending"} 1.0', body)
+        self.assertNotIn('studio_stripe_event_backlog{status="sending"}', body)
+
+
+# ----------------------------------------------------------------------------------
+# SEED DATA & BENCH
+# ----------------------------------------------------------------------------------
+class SeedAndBenchTests(TestCase):
+    """
+    seed_studio builds a consistent schedule and bench can drive it;
+    stripe_loadtest stays within the data it creates.
+    """
+
+    def test_seed_then_bench(self):
+        call_command("seed_studio", members=20, operators=1, invites=3, days=14, occupancy=0.9, stdout=StringIO())
+        self.assertEqual(UserMembership.objects.filter(user__username__startswith="seed-member-").count(), 20)
+        self.assertEqual(User.objects.get(username="seed-operator-0").profile.role, "operator")
+        self.assertTrue(BookedSession.objects.filter(status__in=BookedSession.ACTIVE_STATUSES).exists())
+
+        # Re-seeding replaces rather than duplicates
+        call_command("seed_studio", members=20, operators=1, invites=3, days=14, stdout=StringIO())
+        self.assertEqual(User.objects.filter(username__startswith="seed-").count(), 22)
+
+        with tempfile.NamedTemporaryFile(suffix=".json") as out:
+            call_command(
+                "bench", iterations=2, warmup=0, only=["home", "daily_scheduler", "member_logout"],
+                json_path=out.name, stdout=StringIO(),
+            )
+            results = json.load(open(out.name))["results"]
+        self.assertEqual(results["home"]["status"], [200])
+        self.assertIn("p95_ms", results["daily_scheduler"])
+        self.assertIn("skipped", results["member_logout"])
+
+    def test_stripe_loadtest_processes_only_its_own_events(self):
+        StripeEvent.objects.create(event_id="evt_real", event_type="invoice.paid", payload={})
+        out = StringIO()
+        call_command("stripe_loadtest", events=6, members=2, process=True, stdout=out)
+        self.assertIn("processing  6 events", out.getvalue())
+        self.assertEqual(list(StripeEvent.objects.values_list("event_id", "status")), [("evt_real", "pending")])
+
+    def test_stripe_loadtest_url_needs_the_servers_fake_stripe(self):
+        with self.assertRaisesMessage(CommandError, "--stripe-api-base"):
+            call_command("stripe_loadtest", url="http://127.0.0.1:8000/stripe/webhook/", stdout=StringIO())
+
+
+# ----------------------------------------------------------------------------------
+# QUERY BUDGETS
+# ----------------------------------------------------------------------------------
+class QueryBudgetTests(TestCase):
+    """
+    Pins the number of queries every page and admin changelist runs, and
+    checks it doesn't move between 10 and 1,000 rows of data, so an N+1
+    fails here instead of in production. Caches are cleared before each
+    request, so these are cold-cache budgets.
+    """
+    SMALL = 10
+    LARGE = 1000
+
+    # url name -> (who, query string, queries)
+    VIEWS = {
+        "home": ("member", "", 2),
+        "monthly_calendar": ("member", "", 3),
+        "daily_scheduler": ("member", "date={day}", 3),
+        "availability_api": ("member", "from={day}&to={end}", 2),
+        "scheduler_events": ("member", "date={day}", 2),
+        "operator_events": ("operator", "", 2),
+        "reservation_form": ("member", "", 2),
+        "operator_dashboard": ("operator", "", 2),
+        "operator_console": ("operator", "", 3),
+        "member_login": (None, "", 0),
+        "guest_login": (None, "", 0),
+        "payment_success": ("member", "", 0),
+        "create_invite": ("admin", "", 2),
+        "register": (None, "", 1),
+        "member_dashboard": ("member", "", 2),
+        "admin_dashboard": ("admin", "", 2),
+        "performance": ("admin", "", 2),
+        "metrics": ("admin", "", 2),
+        "pay_membership": ("member", "", 3),
+        "cancel_membership": ("member", "", 2),
+        "session_manager": ("member", "", 3),
+        "member_profile": ("member", "", 2),
+        "membership_management": ("member", "", 2),
+        "customer_portal": ("member", "", 2),
+        "member_logout": ("member", "", 4),
+    }
+    ADMIN_CHANGELISTS = {
+        "auth_user": 6,
+        "auth_group": 5,
+        "main_pendingsessionrequest": 5,
+        "main_bookedsession": 5,
+        "main_userprofile": 5,
+        "main_membershipplan": 5,
+        "main_usermembership": 5,
+        "main_stripesubscription": 6,
+        "main_invite": 5,
+        "main_emailoutbox": 5,
+        "main_stripeevent": 6,
+    }
+
+    def setUp(self):
+        server = FakeStripeServer().start().install()
+        self.addCleanup(server.stop)
+
+        self.plan = MembershipPlan.objects.create(name="Budget", stripe_product_id="prod_budget")
+        self.users = {}
+        for role in ("member", "operator", "admin"):
+            user = User.objects.create_user(username=f"budget-{role}", first_name="Budget", last_name=role)
+            user.is_staff = user.is_superuser = role == "admin"
+            user.save()
+            user.profile.role = role
+            user.profile.stripe_customer_id = f"cus_budget_{role}"
+            user.profile.save()
+            self.users[role] = user
+        UserMembership.objects.create(user=self.users["member"], plan=self.plan, active=True, credits=5)
+
+        self.day = date.today() + timedelta(days=1)
+        self.rows = 0
+        self.invite = Invite.objects.create(email="budget-invite@example.com", token="budget-token", role="member")
+
+    def _grow(self, total):
+        """
+        Adds rows to every listed table until each holds `total` more than
+        the fixtures. Bookings belong to the member and fill the scheduled
+        day first; requests land on the same days, and their StudioDay rows
+        are rebuilt.
+        """
+        new = range(self.rows, total)
+        sessions = []
+        for i in new:
+            day, start = self.day + timedelta(days=i // 16), time(8 + i % 16)
+            sessions.append(BookedSession(
+                booked_by=self.users["member"], booked_date=day, booked_start_time=start, status="booked",
+            ))
+            sessions[-1].fill_range()
+        BookedSession.objects.bulk_create(sessions)
+        PendingSessionRequest.objects.bulk_create([
+            PendingSessionRequest(
+                requester_name=f"Requester {i}", requester_email=f"r{i}@example.com",
+                requested_date=self.day + timedelta(days=i // 16), requested_time=time(8 + i % 16), hours=1,
+            )
+            for i in new
+        ])
+        users = User.objects.bulk_create([User(username=f"budget-user-{i}") for i in new])
+        UserProfile.objects.bulk_create([UserProfile(user=user, role="member") for user in users])
+        UserMembership.objects.bulk_create([UserMembership(user=user, plan=self.plan) for user in users])
+        Invite.objects.bulk_create([Invite(email=f"i{i}@example.com", token=f"token-{i}", role="member") for i in new])
+        EmailOutbox.objects.bulk_create([
+            EmailOutbox(subject=f"Email {i}", body="", from_email="a@example.com", to=["b@example.com"]) for i in new
+        ])
+        StripeEvent.objects.bulk_create([
+            StripeEvent(event_id=f"evt_{i}", event_type="invoice.paid", payload={}) for i in new
+        ])
+        StripeSubscription.objects.bulk_create([StripeSubscription(subscription_id=f"sub_{i}") for i in new])
+        MembershipPlan.objects.bulk_create([MembershipPlan(name=f"Plan {i}") for i in new])
+        # bulk_create skips the save hooks that keep StudioDay current
+        refresh_days({session.booked_date for session in sessions})
+        self.rows = total
+
+    def _url(self, name, query):
+        path = reverse("register", args=[self.invite.token]) if name == "register" else reverse(name)
+        query = query.format(day=self.day, end=self.day + timedelta(days=30))
+        return f"{path}?{query}" if query else path
+
+    def _assert_budgets(self):
+        for name, (who, query, budget) in self.VIEWS.items():
+            with self.subTest(view=name, rows=self.rows):
+                self.client.logout()
+                if who:
+                    self.client.force_login(self.users[who])
+                cache.clear()
+                with self.assertNumQueries(budget):
+                    response = self.client.get(self._url(name, query))
+                self.assertLess(response.status_code, 400)
+
+        self.client.force_login(self.users["admin"])
+        for model, budget in self.ADMIN_CHANGELISTS.items():
+            with self.subTest(changelist=model, rows=self.rows):
+                with self.assertNumQueries(budget):
+                    self.client.get(reverse(f"admin:{model}_changelist"))
+
+    def test_every_view_has_a_budget(self):
+        named = {p.name for p in get_resolver().url_patterns if isinstance(p, URLPattern) and p.name}
+        self.assertEqual(named, set(self.VIEWS) | {"stripe_webhook"})
+
+    def test_webhook_budget(self):
+        # One insert wrapped in a savepoint (so duplicates can be detected)
+        event = {"id": "evt_budget", "type": "invoice.paid", "created": 1, "data": {"object": {}}}
+        with mock.patch("stripe.Webhook.construct_event"), self.assertNumQueries(3):
+            self.client.post(reverse("stripe_webhook"), json.dumps(event), content_type="application/json")
+
+    def test_every_admin_model_has_a_budget(self):
+        registered = {f"{m._meta.app_label}_{m._meta.model_name}" for m in admin.site._registry}
+        self.assertEqual(registered, set(self.ADMIN_CHANGELISTS))
+
+    def test_budgets_hold_as_data_grows(self):
+        self._grow(self.SMALL)
+        self._assert_budgets()
+        self._grow(self.LARGE)
+        self._assert_budgets()
+
+
+# ----------------------------------------------------------------------------------
+# CONTIGUOUS BOOKINGS
+# ----------------------------------------------------------------------------------
+class ContiguousBookingTests(TestCase):
+    """
+    A run of back-to-back hours is one BookedSession; coalesce_bookings
+    merges the one-row-per-hour bookings made before that.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.day = date.today() + timedelta(days=3)
+        self.user = User.objects.create_user(username="runner")
+        self.other = User.objects.create_user(username="neighbour")
+        UserMembership.objects.create(user=self.user, active=True, credits=10)
+
+    def hourly(self, user, hours, status="booked", day=None):
+        for hour in hours:
+            BookedSession.objects.create(
+                booked_by=user, booked_date=day or self.day, booked_start_time=time(hour), status=status,
+            )
+
+    def test_contiguous_selection_is_one_row(self):
+        sessions = book_hours(self.user, self.day, [14, 10, 11, 12, 13, 20])
+        self.assertEqual(
+            sorted((s.booked_start_time.hour, s.duration_hours) for s in sessions), [(10, 5), (20, 1)]
+        )
+        self.assertEqual(UserMembership.objects.get(user=self.user).credits, 4)
+        self.assertEqual(localtime(BookedSession.objects.get(booked_start_time=time(10)).ends_at).hour, 15)
+
+        free = cached_day_availability(self.day)
+        self.assertFalse(any(free.is_free(h) for h in (10, 11, 12, 13, 14, 20)))
+        self.assertTrue(free.is_free(15))
+
+    def test_coalesce_merges_adjacent_rows_of_one_member(self):
+        self.hourly(self.user, [9, 10, 11])
+        self.hourly(self.user, [12], status="paid")  # different status
+        self.hourly(self.other, [13, 14])
+        self.hourly(self.user, [16, 17])
+        self.hourly(self.user, [20, 21], day=self.day + timedelta(days=40))  # a later batch
+        before = load_availability(self.day, self.day)[self.day]
+
+        call_command("coalesce_bookings", batch_days=7, stdout=StringIO())
+
+        spans = sorted(
+            (s.booked_date, s.booked_by.username, s.booked_start_time.hour, s.duration_hours, s.status)
+            for s in BookedSession.objects.select_related("booked_by")
+        )
+        self.assertEqual(spans, [
+            (self.day, "neighbour", 13, 2, "booked"),
+            (self.day, "runner", 9, 3, "booked"),
+            (self.day, "runner", 12, 1, "paid"),
+            (self.day, "runner", 16, 2, "booked"),
+            (self.day + timedelta(days=40), "runner", 20, 2, "booked"),
+        ])
+        after = load_availability(self.day, self.day)[self.day]
+        self.assertEqual(
+            [after.is_free(h) for h in range(24)], [before.is_free(h) for h in range(24)]
+        )
+
+    def test_coalesce_dry_run_changes_nothing(self):
+        self.hourly(self.user, [9, 10])
+        out = StringIO()
+        call_command("coalesce_bookings", dry_run=True, stdout=out)
+        self.assertIn("Would merge 1 rows into 1 sessions", out.getvalue())
+        self.assertEqual(BookedSession.objects.count(), 2)
+
+
+# ----------------------------------------------------------------------------------
+# PAID RESERVATIONS
+# ----------------------------------------------------------------------------------
+class PaidReservationTests(TestCase):
+    """
+    Paying for a request books it: the calendar reads the BookedSession,
+    and open requests are only holds.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.day = date.today() + timedelta(days=4)
+        self.member = User.objects.create_user(username="payer", email="payer@example.com")
+        self.request_row = PendingSessionRequest.objects.create(
+            requester_name="Pay Er", requester_email="Payer@example.com", requester_phone="555",
+            requested_date=self.day, requested_time=time(18), hours=2, status="approved",
+        )
+
+    def pay(self):
+        handle_reservation_payment({"metadata": {"reservation_id": self.request_row.id}})
+        self.request_row.refresh_from_db()
+
+    def test_payment_creates_linked_session(self):
+        self.pay()
+        self.assertEqual(self.request_row.status, "paid")
+        session = self.request_row.booked_session
+        self.assertEqual((session.status, session.booked_by, session.duration_hours), ("paid", self.member, 2))
+        self.assertTrue(EmailOutbox.objects.filter(subject="Reservation Confirmed").exists())
+
+        rows = list(_occupying_rows(self.day, self.day))
+        self.assertEqual([row[7] for row in rows], ["booked"])
+        self.assertEqual(cached_day_availability(self.day).slots[19][0], "reserved")
+
+    def test_replayed_payment_books_once(self):
+        self.pay()
+        self.pay()
+        self.assertEqual(BookedSession.objects.filter(source_request=self.request_row).count(), 1)
+
+    def test_paying_for_taken_hours_alerts_the_operators(self):
+        operator = User.objects.create_user(username="op", email="op@example.com")
+        operator.groups.add(Group.objects.get_or_create(name="Operator")[0])
+        # Booked between the approval and the payment
+        BookedSession.objects.create(booked_by=self.member, booked_date=self.day, booked_start_time=time(19))
+        self.pay()
+        self.pay()  # a replayed event alerts only once
+
+        self.assertEqual(self.request_row.status, "paid_conflict")
+        self.assertFalse(BookedSession.objects.filter(source_request=self.request_row).exists())
+        alerts = EmailOutbox.objects.filter(subject=f"Paid reservation #{self.request_row.id} needs attention")
+        self.assertEqual([alert.to for alert in alerts], [["op@example.com"]])
+        self.assertFalse(EmailOutbox.objects.filter(subject="Reservation Confirmed").exists())
+
+    def test_migration_promotes_historical_paid_requests(self):
+        PendingSessionRequest.objects.filter(id=self.request_row.id).update(status="paid")
+        promote = import_module("main.migrations.0024_promote_paid_requests").promote_paid_requests
+        promote(django_apps, None)
+        promote(django_apps, None)  # resumable: nothing left to do
+        session = BookedSession.objects.get(source_request=self.request_row)
+        self.assertEqual((session.booked_by, session.status), (self.member, "paid"))
+        self.assertEqual(localtime(session.ends_at).hour, 20)
+
+    def test_migration_flags_paid_requests_overlapping_legacy_bookings(self):
+        PendingSessionRequest.objects.filter(id=self.request_row.id).update(status="paid")
+        legacy = BookedSession.objects.create(booked_by=self.member, booked_date=self.day, booked_start_time=time(19))
+        # As written before migration 0021
+        BookedSession.objects.filter(id=legacy.id).update(starts_at=None, ends_at=None, booked_datetime=None)
+
+        migration = import_module("main.migrations.0024_promote_paid_requests")
+        with mock.patch("builtins.print"):
+            migration.backfill_ranges(django_apps, None)
+            migration.promote_paid_requests(django_apps, None)
+
+        self.request_row.refresh_from_db()
+        self.assertEqual(self.request_row.status, "paid_conflict")
+        self.assertFalse(BookedSession.objects.filter(source_request=self.request_row).exists())
+        legacy.refresh_from_db()
+        self.assertEqual(localtime(legacy.starts_at).hour, 19)
+
+
+# ----------------------------------------------------------------------------------
+# BOOKING RANGES
+# ----------------------------------------------------------------------------------
+class BookingRangeBackfillTests(TestCase):
+    """
+    starts_at/ends_at are what every booking query reads; rows saved
+    before they existed are filled in batches by backfill_booking_ranges.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.day = date.today() + timedelta(days=2)
+        self.member = User.objects.create_user(username="legacy", password="pw")
+
+    def legacy(self, hour, hours=1):
+        session = BookedSession.objects.create(
+            booked_by=self.member, booked_date=self.day, booked_start_time=time(hour), duration_hours=hours,
+        )
+        # As written before migration 0010 and 0021
+        BookedSession.objects.filter(id=session.id).update(starts_at=None, ends_at=None, booked_datetime=None)
+        return session
+
+    def test_backfill_fills_in_batches_and_resumes(self):
+        sessions = [self.legacy(hour) for hour in (9, 11, 13)]
+        call_command("backfill_booking_ranges", start_id=sessions[1].id, batch_size=1, stdout=StringIO())
+        self.assertEqual(BookedSession.objects.filter(starts_at__isnull=True).count(), 1)
+
+        out = StringIO()
+        call_command("backfill_booking_ranges", stdout=out)
+        self.assertIn("Filled 1 bookings; 0 overlapping left empty; 0 still missing.", out.getvalue())
+        session = BookedSession.objects.get(id=sessions[0].id)
+        self.assertEqual(localtime(session.starts_at).hour, 9)
+        self.assertEqual(session.booked_datetime, session.starts_at)
+        self.assertEqual(session.ends_at - session.starts_at, timedelta(hours=1))
+
+    def test_backfilled_rows_show_up_everywhere(self):
+        self.legacy(20, hours=2)
+        self.client.login(username="legacy", password="pw")
+        self.assertTrue(load_availability(self.day, self.day)[self.day].is_free(21))
+        self.assertEqual(len(self.client.get(reverse("session_manager")).context["booked_sessions"]), 0)
+
+        call_command("backfill_booking_ranges", stdout=StringIO())
+        self.assertFalse(load_availability(self.day, self.day)[self.day].is_free(21))
+        self.assertEqual(len(self.client.get(reverse("session_manager")).context["booked_sessions"]), 1)
+
+    def test_backfill_refreshes_the_day_a_late_booking_spills_into(self):
+        self.legacy(23, hours=2)
+        next_day = self.day + timedelta(days=1)
+        refresh_days([self.day, next_day])  # without a range the row counts nowhere yet
+        self.assertEqual(StudioDay.objects.get(date=next_day).mask, 0)
+
+        call_command("backfill_booking_ranges", stdout=StringIO())
+        self.assertEqual(StudioDay.objects.get(date=next_day).mask, 1)
+
+    def test_overlapping_legacy_rows_are_reported(self):
+        self.legacy(10, hours=2)
+        BookedSession.objects.create(booked_by=self.member, booked_date=self.day, booked_start_time=time(11))
+        err = StringIO()
+        call_command("backfill_booking_ranges", stdout=StringIO(), stderr=err)
+        self.assertIn("overlaps another; left empty", err.getvalue())
+        self.assertEqual(BookedSession.objects.filter(starts_at__isnull=True).count(), 1)
+
+    def test_migration_backfills(self):
+        session = self.legacy(15)
+        backfill = import_module("main.migrations.0024_promote_paid_requests").backfill_ranges
+        backfill(django_apps, None)
+        backfill(django_apps, None)  # resumable: nothing left to do
+        session.refresh_from_db()
+        self.assertEqual(localtime(session.starts_at).hour, 15)
+        self.assertEqual(localtime(session.ends_at).hour, 16)
+
+
+# ----------------------------------------------------------------------------------
+# STUDIO DAY OCCUPANCY INDEX
+# ----------------------------------------------------------------------------------
+class StudioDayTests(TestCase):
+    """
+    Every booking, cancellation, review and payment rewrites the StudioDay
+    row of the dates it touches; rebuild_occupancy finds and fixes drift.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.day = date.today() + timedelta(days=6)
+        self.member = User.objects.create_user(username="occupant", first_name="Oc", password="pw")
+        UserMembership.objects.create(user=self.member, active=True, credits=10)
+
+    def slots(self, day=None):
+        return StudioDay.objects.get(date=day or self.day).slots
+
+    def hold(self, hour, status="pending"):
+        return PendingSessionRequest.objects.create(
+            requester_name="Guest", requester_email="guest@example.com", requester_phone="555",
+            requested_date=self.day, requested_time=time(hour), hours=1, status=status,
+        )
+
+    def test_booking_and_cancelling_rewrite_the_day(self):
+        session, = book_hours(self.member, self.day, [10, 11])
+        row = StudioDay.objects.get(date=self.day)
+        self.assertEqual(row.mask, 0b11 << 10)
+        self.assertEqual(row.slots["10"], ["reserved", "Oc", session.id])
+
+        self.client.login(username="occupant", password="pw")
+        self.client.post(reverse("session_manager"), {"session_id": session.id})
+        self.assertEqual(StudioDay.objects.get(date=self.day).mask, 0)
+
+    def test_requests_reviews_and_payments_rewrite_the_day(self):
+        declined, paid = self.hold(9), self.hold(18, status="approved")
+        self.assertEqual(self.slots()["9"], ["requested", "Requested", declined.id])
+        self.assertEqual(self.slots()["18"], ["pending", "Pending", paid.id])
+
+        reject_requests([declined.id], "")
+        self.assertNotIn("9", self.slots())
+
+        handle_reservation_payment({"metadata": {"reservation_id": paid.id}})
+        session = BookedSession.objects.get(source_request=paid)
+        self.assertEqual(self.slots()["18"], ["reserved", None, session.id])  # guest: no account
+
+    def test_late_session_marks_the_next_day(self):
+        BookedSession.objects.create(
+            booked_by=self.member, booked_date=self.day, booked_start_time=time(23), duration_hours=2,
+        )
+        self.assertEqual(StudioDay.objects.get(date=self.day + timedelta(days=1)).mask, 1)
+        self.assertFalse(cached_day_availability(self.day + timedelta(days=1)).is_free(0))
+
+    def test_pages_read_the_index(self):
+        book_hours(self.member, self.day, [14])
+        # Drift the index on purpose: the pages follow it, not the bookings
+        StudioDay.objects.filter(date=self.day).update(mask=0, slots={})
+        cache.clear()
+        self.assertTrue(cached_day_availability(self.day).is_free(14))
+        self.assertEqual(book_hours(self.member, self.day, [15])[0].booked_start_time, time(15))
+
+    def test_rebuild_checks_and_repairs(self):
+        book_hours(self.member, self.day, [12])
+        self.hold(20)
+        StudioDay.objects.filter(date=self.day).update(mask=0, slots={})
+        StudioDay.objects.create(date=self.day + timedelta(days=2), mask=1 << 9)
+
+        with self.assertRaisesMessage(CommandError, "2 of"):
+            call_command("rebuild_occupancy", check=True, stdout=StringIO())
+        call_command("rebuild_occupancy", stdout=StringIO())
+        out = StringIO()
+        call_command("rebuild_occupancy", check=True, stdout=out)
+        self.assertIn("match", out.getvalue())
+        self.assertEqual(StudioDay.objects.get(date=self.day).mask, (1 << 12) | (1 << 20))
+        self.assertEqual(StudioDay.objects.get(date=self.day + timedelta(days=2)).mask, 0)
+
+    def test_deferred_refresh_rewrites_each_day_once(self):
+        for hour in (8, 9, 10):
+            self.hold(hour)
+        with CaptureQueriesContext(connection) as queries, deferred_refresh():
+            PendingSessionRequest.objects.all().delete()
+        self.assertEqual(sum('"studio_days"' in q["sql"] for q in queries.captured_queries), 3)
+        self.assertEqual(StudioDay.objects.get(date=self.day).mask, 0)
+
+    def test_migration_builds_the_same_rows(self):
+        book_hours(self.member, self.day, [8, 9])
+        self.hold(16, status="approved")
+        expected = {row.date: (row.mask, row.slots) for row in StudioDay.objects.all()}
+        StudioDay.objects.all().delete()
+        import_module("main.migrations.0026_studioday").build_studio_days(django_apps, None)
+        self.assertEqual({row.date: (row.mask, row.slots) for row in StudioDay.objects.all()}, expected)
+
+
+# ----------------------------------------------------------------------------------
+# OUTBOX
+# ----------------------------------------------------------------------------------
+class OutboxTests(TestCase):
+    """
+    Queued emails are claimed, sent outside the claiming transaction and
+    retried with backoff when delivery fails.
+    """
+    SEND = "django.core.mail.backends.locmem.EmailBackend.send_messages"
+
+    def queue(self, subject="Hello"):
+        return enqueue(EmailMessage(subject, "Body", "studio@example.com", ["guest@example.com"]))
+
+    def test_enqueue_rolls_back_with_its_transaction(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.queue()
+            raise RuntimeError("booking failed")
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_drain_sends_due_rows(self):
+        row = self.queue()
+        self.assertEqual(drain(), (1, 0))
+        self.assertEqual([message.subject for message in mail.outbox], ["Hello"])
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), ("sent", 1))
+        self.assertIsNotNone(row.sent_at)
+        self.assertEqual(drain(), (0, 0))
+
+    def test_rows_are_claimed_before_the_smtp_conversation(self):
+        row = self.queue()
+        seen = []
+
+        def send(messages):
+            seen.append(EmailOutbox.objects.get(pk=row.pk).status)
+            return len(messages)
+
+        with mock.patch(self.SEND, side_effect=send):
+            drain()
+        self.assertEqual(seen, ["sending"])
+
+    def test_failed_send_is_retried_after_backoff(self):
+        row = self.queue()
+        with mock.patch(self.SEND, side_effect=OSError("connection reset")):
+            self.assertEqual(drain(), (0, 1))
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts, row.last_error), ("pending", 1, "connection reset"))
+        self.assertGreater(row.next_attempt_at, now() + backoff(1) - timedelta(seconds=5))
+        # Not due yet
+        self.assertEqual(drain(), (0, 0))
+
+        EmailOutbox.objects.filter(pk=row.pk).update(next_attempt_at=now())
+        self.assertEqual(drain(), (1, 0))
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), ("sent", 2))
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        self.assertEqual(backoff(1), timedelta(seconds=30))
+        self.assertEqual(backoff(3), timedelta(seconds=120))
+        self.assertEqual(backoff(20), timedelta(hours=1))
+
+    def test_gives_up_after_the_last_attempt(self):
+        row = self.queue()
+        EmailOutbox.objects.filter(pk=row.pk).update(attempts=OUTBOX_MAX_ATTEMPTS - 1)
+        with mock.patch(self.SEND, side_effect=OSError("mailbox full")):
+            drain()
+        row.refresh_from_db()
+        self.assertEqual(row.status, "failed")
+
+    def test_expired_lease_is_claimed_again(self):
+        stuck = self.queue("Stuck")
+        leased = self.queue("Leased")
+        EmailOutbox.objects.filter(pk=stuck.pk).update(status="sending", next_attempt_at=now() - timedelta(seconds=1))
+        EmailOutbox.objects.filter(pk=leased.pk).update(status="sending", next_attempt_at=now() + timedelta(minutes=5))
+        self.assertEqual(drain(), (1, 0))
+        self.assertEqual([message.subject for message in mail.outbox], ["Stuck"])
+
+
+# ----------------------------------------------------------------------------------
+# STRIPE EVENTS
+# ----------------------------------------------------------------------------------
+class StripeEventProcessingTests(TestCase):
+    """
+    Webhook deliveries are stored once by event id and applied once; a
+    handler that fails is retried with backoff instead of being dropped.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="subscriber", email="sub@example.com")
+        self.membership = UserMembership.objects.create(
+            user=self.user, active=True, credits=0, stripe_subscription_id="sub_renew",
+        )
+
+    def renewal(self, event_id, created=100):
+        period_end = int((now() + timedelta(days=30)).timestamp())
+        return {
+            "id": event_id,
+            "type": "invoice.payment_succeeded",
+            "created": created,
+            "data": {"object": {
+                "object": "invoice",
+                "subscription": "sub_renew",
+                "customer": "cus_1",
+                "lines": {"data": [{"period": {"end": period_end}}]},
+            }},
+        }
+
+    def deliver(self, event):
+        with mock.patch("stripe.Webhook.construct_event"):
+            self.client.post(reverse("stripe_webhook"), json.dumps(event), content_type="application/json")
+
+    def credits(self):
+        return UserMembership.objects.get(pk=self.membership.pk).credits
+
+    def test_redelivered_event_grants_credits_once(self):
+        event = self.renewal("evt_renew")
+        self.deliver(event)
+        self.deliver(event)
+        self.assertEqual(process_events(), (1, 0))
+        self.assertEqual(process_events(), (0, 0))
+        self.assertEqual(StripeEvent.objects.get(event_id="evt_renew").status, "processed")
+        self.assertEqual(self.credits(), 100)
+
+    def test_failed_handler_is_retried_after_backoff(self):
+        self.deliver(self.renewal("evt_first"))
+        lookup_down = mock.patch(
+            "main.payments_subscription.get_subscription", side_effect=stripe.error.APIConnectionError("down")
+        )
+        with lookup_down, self.assertLogs("main.stripe_events", "ERROR"):
+            self.assertEqual(process_events(), (0, 1))
+        row = StripeEvent.objects.get(event_id="evt_first")
+        self.assertEqual((row.status, row.attempts), ("failed", 1))
+        self.assertGreater(row.next_attempt_at, now())
+        self.assertEqual(self.credits(), 0)
+
+        # Not due yet, and it holds back later events for the subscription
+        self.deliver(self.renewal("evt_second", created=200))
+        self.assertEqual(process_events(), (0, 0))
+
+        StripeEvent.objects.filter(pk=row.pk).update(next_attempt_at=now() - timedelta(seconds=1))
+        self.assertEqual(process_events(), (2, 0))
+        self.assertEqual(self.credits(), 200)
+
+    def test_backlog_behind_a_failing_subscription_does_not_stall_others(self):
+        StripeEvent.objects.create(
+            event_id="evt_failed", event_type="invoice.payment_succeeded", subscription_id="sub_stuck",
+            stripe_created=1, status="failed", attempts=1, next_attempt_at=now() + timedelta(hours=1), payload={},
+        )
+        StripeEvent.objects.bulk_create([
+            StripeEvent(
+                event_id=f"evt_stuck_{i}", event_type="invoice.payment_succeeded", subscription_id="sub_stuck",
+                stripe_created=2 + i, payload={},
+            )
+            for i in range(5)
+        ])
+        self.deliver(self.renewal("evt_other", created=100))
+        self.assertEqual(process_events(batch_size=2), (1, 0))
+        self.assertEqual(StripeEvent.objects.get(event_id="evt_other").status, "processed")
+        self.assertEqual(StripeEvent.objects.filter(subscription_id="sub_stuck", status="pending").count(), 5)
+
+
+# ----------------------------------------------------------------------------------
+# SUBSCRIPTION MIRROR
+# ----------------------------------------------------------------------------------
+class SubscriptionMirrorTests(TestCase):
+    """
+    StripeSubscription follows the newest event per subscription and falls
+    back to the API only for ids it has never seen in full.
+    """
+
+    def event(self, status, created, period_end=2_000_000):
+        return {
+            "type": "customer.subscription.updated",
+            "created": created,
+            "data": {"object": {
+                "id": "sub_mirror", "customer": "cus_1", "status": status,
+                "current_period_end": period_end, "cancel_at_period_end": False,
+            }},
+        }
+
+    def test_event_updates_the_mirror(self):
+        sync_subscription_mirror(self.event("active", created=100))
+        mirror = StripeSubscription.objects.get(subscription_id="sub_mirror")
+        self.assertEqual((mirror.status, mirror.current_period_end, mirror.source_created), ("active", 2_000_000, 100))
+
+    def test_older_event_arriving_late_is_ignored(self):
+        sync_subscription_mirror(self.event("canceled", created=200))
+        sync_subscription_mirror(self.event("active", created=100, period_end=3_000_000))
+        mirror = StripeSubscription.objects.get(subscription_id="sub_mirror")
+        self.assertEqual((mirror.status, mirror.current_period_end), ("canceled", 2_000_000))
+
+    def test_mirrored_subscription_needs_no_api_call(self):
+        sync_subscription_mirror(self.event("active", created=100))
+        with mock.patch("stripe.Subscription.retrieve") as retrieve:
+            self.assertEqual(get_subscription("sub_mirror").status, "active")
+        retrieve.assert_not_called()
+
+    def test_miss_loads_from_the_api_stamped_with_stripe_time(self):
+        subscription = {
+            "id": "sub_mirror", "customer": "cus_1", "status": "past_due", "created": 50,
+            "current_period_start": 90, "current_period_end": 2_000_000,
+        }
+        with mock.patch("stripe.Subscription.retrieve", return_value=subscription) as retrieve:
+            mirror = get_subscription("sub_mirror")
+        retrieve.assert_called_once_with("sub_mirror")
+        self.assertEqual((mirror.status, mirror.source_created), ("past_due", 90))
+
+        # An event Stripe created after that state still applies
+        sync_subscription_mirror(self.event("active", created=100))
+        self.assertEqual(get_subscription("sub_mirror").status, "active")
+
+
+# ----------------------------------------------------------------------------------
+# PRICE CACHE
+# ----------------------------------------------------------------------------------
+@override_settings(STRIPE_PRICE_CACHE_SECONDS=60)
+class PriceCacheTests(TestCase):
+    """
+    Checkout reuses a plan's cached price until it is older than
+    STRIPE_PRICE_CACHE_SECONDS; catalog events refresh it sooner.
+    """
+
+    def setUp(self):
+        self.plan = MembershipPlan.objects.create(
+            name="Monthly", stripe_product_id="prod_1", stripe_price_id="price_old", price_synced_at=now(),
+        )
+        self.prices = mock.patch("stripe.Price.list", return_value={"data": [{"id": "price_new"}]})
+
+    def price_id(self):
+        return MembershipPlan.objects.get(pk=self.plan.pk).stripe_price_id
+
+    def test_fresh_price_needs_no_api_call(self):
+        with self.prices as prices:
+            self.assertEqual(get_checkout_price("prod_1")[1], "price_old")
+        prices.assert_not_called()
+
+    def test_expired_price_is_looked_up_again(self):
+        MembershipPlan.objects.filter(pk=self.plan.pk).update(price_synced_at=now() - timedelta(seconds=61))
+        with self.prices as prices:
+            self.assertEqual(get_checkout_price("prod_1")[1], "price_new")
+            self.assertEqual(get_checkout_price("prod_1")[1], "price_new")
+        prices.assert_called_once_with(product="prod_1", active=True)
+
+    def test_new_active_price_event_replaces_the_cached_price(self):
+        event = {"type": "price.created", "data": {"object": {"id": "price_event", "product": "prod_1", "active": True}}}
+        with self.prices as prices:
+            handle_catalog_event(event)
+        prices.assert_not_called()
+        self.assertEqual(self.price_id(), "price_event")
+
+    def test_price_and_product_updates_refresh_from_the_api(self):
+        for event in (
+            {"type": "price.updated", "data": {"object": {"id": "price_old", "product": "prod_1", "active": False}}},
+            {"type": "product.updated", "data": {"object": {"id": "prod_1"}}},
+        ):
+            MembershipPlan.objects.filter(pk=self.plan.pk).update(stripe_price_id="price_old")
+            with self.subTest(event=event["type"]), self.prices as prices:
+                handle_catalog_event(event)
+                prices.assert_called_once_with(product="prod_1", active=True)
+                self.assertEqual(self.price_id(), "price_new")
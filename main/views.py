@@ -5,16 +5,22 @@ from django.core.mail import EmailMessage
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponseForbidden
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
 from django.utils.timezone import localtime, now, timedelta, make_aware
 from django.conf import settings
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
 from django.urls import reverse
+from urllib.parse import urlencode
+from django.db import transaction
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
 from datetime import datetime
-import calendar
+import hashlib
+import hmac
 import stripe
-from decouple import config
 
 # Models & Forms
 from .models import (
@@ -26,6 +32,20 @@ from .models import (
     MembershipPlan
 )
 from .forms import ProfileUpdateForm
+from .catalog import get_checkout_price
+from .booking import book_hours, BookingError
+from .auth import access_snapshot
+from .instrumentation import window as timing_window
+from . import metrics
+from .operator_console import STATUS_FILTERS, approve_requests, reject_requests, request_page
+from .live import OPERATORS_TOPIC, date_topic, event_stream
+from .availability import (
+    availability_stamp,
+    month_grid,
+    studio_days,
+    OPEN_HOUR,
+    CLOSE_HOUR,
+)
 
 # Services & Emails
 from .services import (
@@ -34,8 +54,6 @@ from .services import (
     create_stripe_customer
 )
 from .emails import (
-    send_rejection_email,
-    send_payment_email_stripe,
     send_cancelation_confirmation_email,
     send_invite_email,
     notify_operators_of_new_request
@@ -49,7 +67,7 @@ def role_required(role):
     """
     def decorator(view_func):
         def _wrapped_view(request, *args, **kwargs):
-            if request.user.is_authenticated and request.user.profile.has_minimum_role(role):
+            if request.user.is_authenticated and access_snapshot(request.user).has_minimum_role(role):
                 return view_func(request, *args, **kwargs)
             return HttpResponseForbidden("You do not have permission to access this page.")
         return _wrapped_view
@@ -70,14 +88,13 @@ def home_view(request):
     is_member = False
 
     if user.is_authenticated:
-        profile = getattr(user, "profile", None)
-        if profile:
-            # Check for admin role
-            is_admin = profile.has_minimum_role("admin")
-            # Check for operator role
-            is_operator = profile.has_minimum_role("operator")
-            # Check for member role
-            is_member = profile.has_minimum_role("member")
+        access = access_snapshot(user)
+        # Check for admin role
+        is_admin = access.has_minimum_role("admin")
+        # Check for operator role
+        is_operator = access.has_minimum_role("operator")
+        # Check for member role
+        is_member = access.has_minimum_role("member")
 
     context = {
         'is_logged_in': user.is_authenticated,
@@ -152,7 +169,8 @@ def member_profile(request):
     """
     Display/Edit the member's profile.
     """
-    if request.user.profile.role == "public":
+    access = access_snapshot(request.user)
+    if access.role == "public":
         return HttpResponseForbidden("You are not authorized to access this page.")
 
     if request.method == "POST":
@@ -172,11 +190,7 @@ def member_profile(request):
         return redirect("member_profile")
 
     # On GET, add user to context so template can fill in existing values
-    try:
-        membership = request.user.usermembership
-        membership_status = "Paid" if membership.active else "Unpaid"
-    except UserMembership.DoesNotExist:
-        membership_status = "Unpaid"
+    membership_status = "Paid" if access.active else "Unpaid"
 
     context = {
         "user": request.user,  # so template can do {{ user.first_name }}, etc.
@@ -239,16 +253,18 @@ def session_manager_view(request):
     booked_sessions = BookedSession.objects.filter(
         booked_by=user,
         status='booked',
-        booked_datetime__gte=now()
-    ).order_by('booked_datetime')
+        starts_at__gte=now()
+    ).order_by('starts_at')
 
     if request.method == "POST":
         session_id = request.POST.get('session_id')
         if session_id:
             try:
-                booked_session = BookedSession.objects.get(id=session_id, booked_by=user)
-                booked_session.status = "canceled"
-                booked_session.save()
+                # One transaction, so the session and its StudioDay row change together
+                with transaction.atomic():
+                    booked_session = BookedSession.objects.get(id=session_id, booked_by=user)
+                    booked_session.status = "canceled"
+                    booked_session.save()
                 messages.success(request, "Session successfully canceled.")
             except BookedSession.DoesNotExist:
                 messages.error(request, "Session could not be found.")
@@ -303,23 +319,18 @@ def pay_membership(request):
     
     # Determine which product to use based on discount eligibility
     if user.profile.discount:
-        stripe_product_id = config('STRIPE_DISCOUNT_PRODUCT_ID')
+        stripe_product_id = settings.STRIPE_DISCOUNT_PRODUCT_ID
     else:
-        stripe_product_id = config('STRIPE_PRODUCT_ID')
+        stripe_product_id = settings.STRIPE_PRODUCT_ID
 
     stripe.api_key = settings.STRIPE_SECRET_KEY
 
     try:
-        # Retrieve the membership plan
-        plan = MembershipPlan.objects.get(stripe_product_id=stripe_product_id)
-
-        # Fetch active prices for the product from Stripe
-        product_prices = stripe.Price.list(product=stripe_product_id, active=True)
-        if not product_prices['data']:
+        # Membership plan + its cached active price (Stripe only on a stale cache)
+        plan, stripe_price_id = get_checkout_price(stripe_product_id)
+        if not stripe_price_id:
             messages.error(request, "No active prices found for this product.")
             return redirect("membership_management")
-            
-        stripe_price_id = product_prices['data'][0]['id']  # Use the first active price
 
         # Create a Stripe Checkout session for recurring subscription
         checkout_session = stripe.checkout.Session.create(
@@ -356,11 +367,12 @@ def cancel_membership(request):
             # Cancel on Stripe
             success = cancel_stripe_subscription(user)
             if success:
-                membership.active = False
-                membership.stripe_subscription_id = None
-                membership.save()
-                # Email confirmation
-                send_cancelation_confirmation_email(user)
+                with transaction.atomic():
+                    membership.active = False
+                    membership.stripe_subscription_id = None
+                    membership.save()
+                    # Email confirmation
+                    send_cancelation_confirmation_email(user)
                 messages.success(request, "Your membership has been successfully canceled.")
             else:
                 messages.error(request, "There was an issue canceling your membership. Please try again.")
@@ -420,41 +432,148 @@ def reservation_form_view(request):
             messages.error(request, "Invalid date/time format.")
             return redirect("reservation_form")
 
-        # Create a PendingSessionRequest
-        new_request = PendingSessionRequest.objects.create(
-            requester_name=name,
-            requester_email=email,
-            requester_phone=phone,
-            requested_date=requested_date,
-            requested_time=requested_time,
-            hours=hours,
-            notes=notes,
-            status="pending",
-        )
-
-        # Notify operators
-        operators = User.objects.filter(groups__name="Operator")
-        operator_emails = [op.email for op in operators if op.email]
-
-        if operator_emails:
-            # Instead of building the email inline, call our new function
-            notify_operators_of_new_request(
-                name=name,
-                email=email,
-                phone=phone,
-                date_str=date,       # pass the raw string or use requested_date.isoformat()
-                time_str=time_,      # pass the raw time string
+        with transaction.atomic():
+            # Create a PendingSessionRequest
+            new_request = PendingSessionRequest.objects.create(
+                requester_name=name,
+                requester_email=email,
+                requester_phone=phone,
+                requested_date=requested_date,
+                requested_time=requested_time,
                 hours=hours,
                 notes=notes,
-                operator_emails=operator_emails
+                status="pending",
             )
 
+            # Notify operators (queued in the outbox with the request)
+            operators = User.objects.filter(groups__name="Operator")
+            operator_emails = [op.email for op in operators if op.email]
+
+            if operator_emails:
+                # Instead of building the email inline, call our new function
+                notify_operators_of_new_request(
+                    name=name,
+                    email=email,
+                    phone=phone,
+                    date_str=date,       # pass the raw string or use requested_date.isoformat()
+                    time_str=time_,      # pass the raw time string
+                    hours=hours,
+                    notes=notes,
+                    operator_emails=operator_emails
+                )
+
         messages.success(request, "Your reservation request has been submitted.")
         return redirect("home")
 
     return render(request, "main/reservation_form.html")
 
 
+# ------------------------------------------
+# CONDITIONAL PAGES
+# ------------------------------------------
+# The calendar and scheduler answer repeat visits with 304 Not Modified.
+# Validators come from the StudioDay rows of the dates shown (every booking
+# or request write rewrites them) plus everything else the page shows: the
+# viewer, their role and credits, the current hour (past hours are hidden
+# today) and the CSRF cookie baked into forms. The page is rendered from
+# the same rows, so an ETag never describes other data than the body.
+# `no-cache` makes browsers revalidate instead of guessing a lifetime.
+
+def _page_days(request, dates):
+    """
+    {date: DayAvailability} for `dates` from their StudioDay rows, loaded
+    once per request for both the validators and the page.
+    """
+    if not hasattr(request, "_page_days"):
+        request._page_days = studio_days(min(dates), max(dates))
+    return request._page_days
+
+
+def _page_validators(request, dates):
+    """
+    Returns (etag, last_modified) for a page showing `dates`, memoized on
+    the request because condition() asks for each separately.
+    """
+    if not hasattr(request, "_page_validators"):
+        if len(messages.get_messages(request)):
+            # Flash messages are shown once; always render them
+            request._page_validators = (None, None)
+            return request._page_validators
+
+        stamps = {
+            day: availability.updated_at.timestamp() if availability.updated_at else 0
+            for day, availability in _page_days(request, dates).items()
+        }
+        access = access_snapshot(request.user)
+        current = localtime(now())
+        key = repr((
+            sorted(stamps.items()),
+            request.user.pk,
+            access.role,
+            access.credits,
+            current.date(),
+            current.hour,
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+        ))
+        etag = f'W/"{hashlib.md5(key.encode()).hexdigest()}"'
+        hour_start = current.replace(minute=0, second=0, microsecond=0)
+        last_modified = max([hour_start.timestamp(), *stamps.values()])
+        request._page_validators = (etag, datetime.fromtimestamp(last_modified, tz=current.tzinfo))
+    return request._page_validators
+
+
+def _requested_month(request):
+    """
+    The (year, month) named by ?year=&month=. Both are needed; otherwise,
+    or if they don't name a month, the current one.
+    """
+    today = localtime(now()).date()
+    try:
+        year, month = int(request.GET.get("year", "")), int(request.GET.get("month", ""))
+        today.replace(year=year, month=month, day=1)
+    except ValueError:
+        return today.year, today.month
+    return year, month
+
+
+def _calendar_month(request):
+    """
+    The (year, month) monthly_calendar_view will render, or None when it
+    would redirect instead.
+    """
+    today = localtime(now()).date()
+    year, month = _requested_month(request)
+    latest = (today + timedelta(days=60)).replace(day=1)
+    if not today.replace(day=1) <= date(year, month, 1) <= latest:
+        return None
+    return year, month
+
+
+def _calendar_validators(request):
+    year_month = _calendar_month(request)
+    if year_month is None:
+        return None, None
+    return _page_validators(request, month_grid(*year_month))
+
+
+def _scheduler_validators(request):
+    if not request.user.is_authenticated:
+        return None, None
+    today = localtime(now()).date()
+    try:
+        selected_date = datetime.strptime(request.GET.get('date', today.isoformat()), '%Y-%m-%d').date()
+    except ValueError:
+        return None, None
+    if selected_date < today:
+        return None, None
+    return _page_validators(request, [selected_date])
+
+
+@cache_control(private=True, no_cache=True)
+@condition(
+    etag_func=lambda request: _calendar_validators(request)[0],
+    last_modified_func=lambda request: _calendar_validators(request)[1],
+)
 def monthly_calendar_view(request):
     """
     Shows a monthly calendar, limited to 2 months in the future.
@@ -462,19 +581,7 @@ def monthly_calendar_view(request):
     today = localtime(now()).date()
     two_months_from_now = today + timedelta(days=60)
 
-    year = request.GET.get("year")
-    month = request.GET.get("month")
-    if year and month:
-        try:
-            year = int(year)
-            month = int(month)
-        except ValueError:
-            year = today.year
-            month = today.month
-    else:
-        year = today.year
-        month = today.month
-
+    year, month = _requested_month(request)
     requested_date = today.replace(year=year, month=month, day=1)
 
     # Bounds
@@ -483,17 +590,22 @@ def monthly_calendar_view(request):
     elif requested_date > two_months_from_now.replace(day=1):
         return redirect(f'/monthly-calendar/?year={two_months_from_now.year}&month={two_months_from_now.month}')
 
-    cal = calendar.Calendar(firstweekday=6)
-    month_days = cal.itermonthdates(year, month)
+    # Occupancy for the whole grid: the rows the validators were built from
+    occupancy = _page_days(request, month_grid(year, month))
+    current_hour = localtime(now()).hour
 
     days_to_display = []
-    for day in month_days:
+    for day, availability in occupancy.items():
         in_current_month = (day.month == month)
         is_in_range = (today <= day <= two_months_from_now)
+        start_hour = current_hour if day == today else OPEN_HOUR
+        free_hours = availability.free_count(start_hour)
         days_to_display.append({
             'day': day,
             'in_current_month': in_current_month,
             'is_in_range': is_in_range,
+            'free_hours': free_hours,
+            'fully_booked': free_hours == 0,
         })
 
     month_name = requested_date.strftime("%B %Y")
@@ -527,6 +639,11 @@ def monthly_calendar_view(request):
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(
+    etag_func=lambda request: _scheduler_validators(request)[0],
+    last_modified_func=lambda request: _scheduler_validators(request)[1],
+)
 def daily_scheduler_view(request):
     """
     Displays a day-by-day schedule:
@@ -543,40 +660,20 @@ def daily_scheduler_view(request):
 
     # Handle POST to instantly book multiple hours
     if request.method == "POST" and request.POST.get("action") == "book_selected":
-        if request.user.profile.has_minimum_role('member'):
+        if access_snapshot(request.user).has_minimum_role('member'):
             selected_hours_str = request.POST.get("selected_hours", "")
             if selected_hours_str:
                 hours_list = [int(h) for h in selected_hours_str.split(",") if h.isdigit()]
 
-                # Check membership
+                # One transaction: credit check + deduction, conflict check, inserts
                 try:
-                    membership = request.user.usermembership
-                except UserMembership.DoesNotExist:
-                    membership = None
-
-                active_member = has_membership_access(request.user)
-                if membership and active_member and membership.credits >= len(hours_list):
-                    # Book each selected hour
-                    for hour in hours_list:
-                        booked_start_time = datetime.strptime(f"{hour}:00", "%H:%M").time()
-                        booked_datetime = datetime.combine(selected_date, booked_start_time)
-                        booked_datetime_aware = make_aware(booked_datetime)
-
-                        BookedSession.objects.create(
-                            booked_by=request.user,
-                            booked_date=selected_date,
-                            booked_start_time=booked_start_time,
-                            booked_datetime=booked_datetime_aware,
-                            duration_hours=1,
-                            status="booked"
-                        )
-                    # Subtract credits
-                    membership.credits -= len(hours_list)
-                    membership.save()
-
-                    messages.success(request, f"You booked {len(hours_list)} hour(s) on {selected_date}!")
-                else:
-                    messages.error(request, "You do not have enough credits or your membership is not active.")
+                    sessions = book_hours(request.user, selected_date, hours_list)
+                    booked_hours = sum(s.duration_hours for s in sessions)
+                    metrics.observe_booking(len(sessions), booked_hours)
+                    messages.success(request, f"You booked {booked_hours} hour(s) on {selected_date}!")
+                except BookingError as e:
+                    metrics.booking_attempts.labels("refused").inc()
+                    messages.error(request, str(e))
             else:
                 messages.error(request, "No hours were selected.")
         else:
@@ -584,71 +681,17 @@ def daily_scheduler_view(request):
 
         return redirect(f"/daily-scheduler/?date={selected_date.isoformat()}")
 
-    # Gather booked sessions
-    booked_sessions = BookedSession.objects.filter(
-        booked_date=selected_date,
-        status__in=["booked", "paid"]
-    )
-    booked_map = {}
-    for session in booked_sessions:
-        h = session.booked_start_time.hour
-        user_name = session.booked_by.get_full_name() or session.booked_by.username if session.booked_by else None
-        booked_map[h] = {
-            "status": "reserved",
-            "booked_by_name": user_name
-        }
-
-    # Gather pending requests
-    pending_requests = PendingSessionRequest.objects.filter(
-        requested_date=selected_date,
-        status__in=["pending", "approved", "paid"]
-    )
-    pending_map = {}
-    for req in pending_requests:
-        start_hour = req.requested_time.hour
-        end_hour = start_hour + req.hours
-        for h in range(start_hour, end_hour):
-            if req.status == "approved":
-                pending_map[h] = {"status": "pending", "booked_by_name": "Pending"}
-            elif req.status == "paid":
-                pending_map[h] = {"status": "reserved", "booked_by_name": "Paid"}
-            else:
-                pending_map[h] = {"status": "requested", "booked_by_name": "Requested"}
-
-    start_hour = localtime(now()).hour if selected_date == today else 8
-    time_slots = []
-    for hour in range(start_hour, 24):
-        if hour in booked_map:
-            info = booked_map[hour]
-            time_slots.append({
-                "hour": hour,
-                "status": info["status"],
-                "booked_by_name": info["booked_by_name"]
-            })
-        elif hour in pending_map:
-            info = pending_map[hour]
-            time_slots.append({
-                "hour": hour,
-                "status": info["status"],
-                "booked_by_name": info["booked_by_name"]
-            })
-        else:
-            time_slots.append({
-                "hour": hour,
-                "status": "available",
-                "booked_by_name": None
-            })
+    # Occupancy for the day: the row the validators were built from
+    availability = _page_days(request, [selected_date])[selected_date]
+    start_hour = localtime(now()).hour if selected_date == today else OPEN_HOUR
+    time_slots = availability.time_slots(start_hour)
 
     previous_date = (selected_date - timedelta(days=1)).isoformat()
     next_date = (selected_date + timedelta(days=1)).isoformat()
     can_go_previous = (selected_date > today)
-    is_member = request.user.profile.has_minimum_role('member')
-    user_credits = 0
-    if is_member:
-        try:
-            user_credits = request.user.usermembership.credits
-        except UserMembership.DoesNotExist:
-            user_credits = 0
+    access = access_snapshot(request.user)
+    is_member = access.has_minimum_role('member')
+    user_credits = access.credits if is_member else 0
 
     context = {
         "selected_date": selected_date,
@@ -662,6 +705,109 @@ def daily_scheduler_view(request):
     return render(request, "main/daily_scheduler.html", context)
 
 
+# ------------------------------------------
+# AVAILABILITY API
+# ------------------------------------------
+API_MAX_DAYS = 62
+
+
+def _availability_range(request):
+    """
+    Parses ?from=YYYY-MM-DD&to=YYYY-MM-DD (to defaults to from, from to today).
+    Returns (start, end) or None if the range is invalid or too long.
+    """
+    try:
+        start = datetime.strptime(request.GET["from"], "%Y-%m-%d").date() if request.GET.get("from") \
+            else localtime(now()).date()
+        end = datetime.strptime(request.GET["to"], "%Y-%m-%d").date() if request.GET.get("to") else start
+    except ValueError:
+        return None
+    if end < start or (end - start).days >= API_MAX_DAYS:
+        return None
+    return start, end
+
+
+def _availability_etag(request):
+    date_range = _availability_range(request)
+    if date_range is None:
+        return None
+    return f'W/"{availability_stamp(*date_range)}"'
+
+
+@require_GET
+@condition(etag_func=_availability_etag)
+def availability_api_view(request):
+    """
+    Slot states for every date in ?from=..&to=.. as JSON. Unchanged ranges
+    answer 304 from the ETag alone, before anything is loaded.
+    """
+    date_range = _availability_range(request)
+    if date_range is None:
+        return JsonResponse(
+            {"error": f"Use ?from=YYYY-MM-DD&to=YYYY-MM-DD spanning at most {API_MAX_DAYS} days."},
+            status=400,
+        )
+
+    days = studio_days(*date_range)
+    return JsonResponse({
+        "from": date_range[0].isoformat(),
+        "to": date_range[1].isoformat(),
+        "open_hour": OPEN_HOUR,
+        "close_hour": CLOSE_HOUR,
+        "days": [
+            {
+                "date": day.isoformat(),
+                "free_hours": availability.free_count(),
+                # Statuses only: this endpoint is public, like the calendar
+                "slots": [
+                    {"hour": slot["hour"], "status": slot["status"]}
+                    for slot in availability.time_slots()
+                ],
+            }
+            for day, availability in days.items()
+        ],
+    })
+
+
+# ------------------------------------------
+# LIVE UPDATES (Server-Sent Events, ASGI only)
+# ------------------------------------------
+def _event_stream_response(request, topics):
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be tied up for the life of the stream;
+        # 204 tells EventSource not to reconnect
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(event_stream(topics), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let a proxy buffer the stream
+    return response
+
+
+@login_required
+async def scheduler_events_view(request):
+    """
+    Streams availability changes for ?date=YYYY-MM-DD to the daily scheduler.
+    """
+    try:
+        day = datetime.strptime(request.GET.get("date", ""), "%Y-%m-%d").date()
+    except ValueError:
+        return HttpResponse("Invalid date.", status=400)
+    return _event_stream_response(request, [date_topic(day)])
+
+
+@login_required
+async def operator_events_view(request):
+    """
+    Streams new and updated reservation requests to the operator console.
+    """
+    user = await request.auser()
+    # The profile may still be lazy (e.g. ModelBackend sessions); load it off the loop
+    snapshot = await sync_to_async(access_snapshot)(user)
+    if not snapshot.has_minimum_role("operator"):
+        return HttpResponseForbidden("You do not have permission to access this page.")
+    return _event_stream_response(request, [OPERATORS_TOPIC])
+
+
 # ------------------------------------------
 # OPERATOR DASHBOARD
 # ------------------------------------------
@@ -677,38 +823,58 @@ def operator_dashboard_view(request):
 @role_required("operator")
 def operator_console_view(request):
     """
-    Shows pending session requests. Operators can approve or reject.
-    If approved, sends payment link; if rejected, sends rejection email.
+    Lists session requests, newest first, one keyset page at a time
+    (?status=, ?date=, ?cursor=). Operators approve or reject one request
+    or a selection: approvals send a payment link, rejections an email.
     """
-    pending_requests = PendingSessionRequest.objects.filter(status='pending').order_by('-created_at')
+    status = request.GET.get("status", "pending")
+    if status not in STATUS_FILTERS:
+        status = "pending"
+    date_filter = request.GET.get("date", "")
+    try:
+        requested_date = datetime.strptime(date_filter, "%Y-%m-%d").date() if date_filter else None
+    except ValueError:
+        requested_date, date_filter = None, ""
 
     if request.method == "POST":
-        request_id = request.POST.get('request_id')
         action = request.POST.get('action')
         suggested_times = request.POST.get('suggested_times', "").strip()
+        # The single-request buttons post one request_id, the bulk form several
+        request_ids = [int(i) for i in request.POST.getlist('request_id') if i.isdigit()]
 
-        if request_id and action:
+        if request_ids and action in ("accept", "reject"):
             try:
-                pending_req = PendingSessionRequest.objects.get(id=request_id)
                 if action == "accept":
-                    pending_req.status = "approved"
-                    pending_req.save()
-                    send_payment_email_stripe(pending_req)
-                    messages.success(request, "Request approved. Payment email sent.")
-                elif action == "reject":
-                    pending_req.status = "declined"
-                    pending_req.save()
-                    send_rejection_email(pending_req, suggested_times)
-                    messages.success(request, "Request rejected and client notified.")
-            except PendingSessionRequest.DoesNotExist:
-                messages.error(request, "Request could not be found.")
+                    updated = approve_requests(request_ids)
+                    messages.success(request, f"{len(updated)} request(s) approved. Payment emails queued.")
+                else:
+                    updated = reject_requests(request_ids, suggested_times)
+                    messages.success(request, f"{len(updated)} request(s) rejected and clients notified.")
+                skipped = len(set(request_ids)) - len(updated)
+                if skipped:
+                    messages.info(
+                        request,
+                        f"{skipped} request(s) were skipped: already handled, or their payment link "
+                        "could not be created.",
+                    )
             except Exception as e:
                 print(f"Error processing request: {e}")
                 messages.error(request, "Error processing the request. Please try again.")
+        else:
+            messages.error(request, "Select at least one request.")
 
-        return redirect('operator_console')
+        return redirect(request.get_full_path())
 
-    context = {'pending_requests': pending_requests}
+    pending_requests, next_cursor = request_page(status, requested_date, request.GET.get("cursor"))
+    filters = {"status": status, "date": date_filter}
+    context = {
+        'pending_requests': pending_requests,
+        'status': status,
+        'status_filters': STATUS_FILTERS,
+        'date_filter': date_filter,
+        'next_page_query': urlencode({**filters, "cursor": next_cursor}) if next_cursor else None,
+        'first_page_query': urlencode(filters) if request.GET.get("cursor") else None,
+    }
     return render(request, 'operator/console.html', context)
 
 
@@ -752,10 +918,11 @@ def create_invite_view(request):
 
         # Create a new invite
         token = get_random_string(length=64)
-        invite = Invite.objects.create(email=email, role=role, token=token)
+        with transaction.atomic():
+            invite = Invite.objects.create(email=email, role=role, token=token)
 
-        # Instead of building the email inline, call our new function
-        send_invite_email(invite=invite, role=role)
+            # Instead of building the email inline, call our new function
+            send_invite_email(invite=invite, role=role)
 
         messages.success(request, f"Invite sent to {email}!")
         return redirect('create_invite')
@@ -866,11 +1033,7 @@ def admin_dashboard(request):
         messages.success(request, "Your profile has been updated.")
         return redirect('admin_dashboard')
 
-    try:
-        membership = request.user.usermembership
-        membership_status = "Paid" if membership.active else "Unpaid"
-    except UserMembership.DoesNotExist:
-        membership_status = "Unpaid"
+    membership_status = "Paid" if access_snapshot(request.user).active else "Unpaid"
 
     admin_url = settings.ADMIN_URL
     create_invite_url = reverse("create_invite")
@@ -881,3 +1044,45 @@ def admin_dashboard(request):
         'admin_url': admin_url,
     }
     return render(request, 'admin/dashboard.html', context)
+
+
+@login_required
+def performance_view(request):
+    """
+    Per-URL timings over the last minutes, from this process's rolling window.
+    """
+    if not access_snapshot(request.user).has_minimum_role("admin"):
+        return HttpResponseForbidden("You are not authorized to access this page.")
+
+    context = {
+        "rows": timing_window.snapshot(),
+        "window_minutes": timing_window.seconds // 60,
+    }
+    return render(request, "admin/performance.html", context)
+
+
+# ----------------------------------------------------------------------------------
+# METRICS
+# ----------------------------------------------------------------------------------
+def _metrics_allowed(request):
+    """
+    Scrapers are let in by source address or bearer token; signed-in
+    admins may also look.
+    """
+    if request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS:
+        return True
+    token = settings.METRICS_TOKEN
+    auth = request.META.get("HTTP_AUTHORIZATION", "")
+    if token and auth.startswith("Bearer ") and hmac.compare_digest(auth[7:], token):
+        return True
+    return request.user.is_authenticated and access_snapshot(request.user).has_minimum_role("admin")
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint.
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden("You are not authorized to access this page.")
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
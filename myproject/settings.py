@@ -59,6 +59,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.instrumentation.RequestTimingMiddleware',  # first, so it times everything below
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -101,6 +102,69 @@ DATABASES = {
 }
 
 
+# Cache
+# Local memory works for a single process. Set CACHE_URL (e.g. redis://...) so
+# every gunicorn worker shares cached availability and invalidations.
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# Live scheduler/console updates (main/live.py). With several workers, events
+# must reach every process: use Redis pub/sub (defaults to CACHE_URL).
+LIVE_FANOUT_URL = config('LIVE_FANOUT_URL', default=CACHE_URL)
+LIVE_FANOUT_BACKEND = config(
+    'LIVE_FANOUT_BACKEND',
+    default='main.live.RedisFanout' if LIVE_FANOUT_URL else 'main.live.LocalFanout',
+)
+
+
+# Logging
+# main.perf gets one JSON line per request / worker batch (see main/instrumentation.py).
+# Those are INFO records, shown with DEBUG on or PERF_LOG_LEVEL=INFO; otherwise
+# (tests included) only its warnings get through.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'main.perf': {
+            'handlers': ['console'],
+            'level': config('PERF_LOG_LEVEL', default='INFO' if DEBUG else 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+
+# Prometheus scrape endpoint (/metrics, see main/metrics.py): allowed from these
+# addresses, with "Authorization: Bearer <METRICS_TOKEN>", or for signed-in admins.
+# For several gunicorn workers also set PROMETHEUS_MULTIPROC_DIR in the environment.
+METRICS_ALLOWED_IPS = [ip.strip() for ip in config('METRICS_ALLOWED_IPS', default='127.0.0.1,::1').split(',') if ip.strip()]
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+
+# Loads profile + membership with the user in one query (see main/auth.py).
+# ModelBackend stays listed so sessions created before StudioBackend existed
+# (which name ModelBackend) still resolve; new logins go through StudioBackend.
+AUTHENTICATION_BACKENDS = [
+    'main.auth.StudioBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -147,7 +211,7 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # Enable serving of static files with WhiteNoise (optional, for production)
 INSTALLED_APPS += ['whitenoise.runserver_nostatic']
-MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
+MIDDLEWARE.insert(2, 'whitenoise.middleware.WhiteNoiseMiddleware')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -173,5 +237,15 @@ PAYPAL_MODE = config("PAYPAL_MODE", default="sandbox")  # Change to 'live' in pr
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY')
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY')
 STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET')
+STRIPE_PRODUCT_ID = config('STRIPE_PRODUCT_ID', default='')
+STRIPE_DISCOUNT_PRODUCT_ID = config('STRIPE_DISCOUNT_PRODUCT_ID', default='')
+STRIPE_PRICE_CACHE_SECONDS = config('STRIPE_PRICE_CACHE_SECONDS', default=6 * 60 * 60, cast=int)
+# Concurrent Checkout Session creations when approving requests in bulk
+STRIPE_CHECKOUT_WORKERS = config('STRIPE_CHECKOUT_WORKERS', default=8, cast=int)
 
 stripe.api_key = STRIPE_SECRET_KEY  # Set the API key for all Stripe calls
+
+# Offline testing: point the Stripe client at the fake API (manage.py fake_stripe)
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='')
+if STRIPE_API_BASE:
+    stripe.api_base = STRIPE_API_BASE
@@ -0,0 +1,49 @@
+# myproject/settings_offline.py
+#
+# Self-contained settings for benchmarks and local experiments: SQLite,
+# in-memory email and fake Stripe keys, so no .env is needed.
+#
+#   export DJANGO_SETTINGS_MODULE=myproject.settings_offline
+#   python manage.py migrate
+#   python manage.py seed_studio
+#   python manage.py bench --json bench.json
+#
+# Any variable already set in the environment still wins, e.g.
+# OFFLINE_DB=/tmp/studio.sqlite3 to keep the database elsewhere.
+
+import os
+
+OFFLINE_ENV = {
+    'SECRET_KEY': 'offline-not-secret',
+    'DEBUG': 'False',
+    'DOMAIN': 'http://localhost:8000',
+    'ADMIN_URL': 'admin/',
+    'ALLOWED_HOSTS': 'localhost,127.0.0.1,testserver',
+    'CSRF_TRUSTED_ORIGINS': 'http://localhost:8000',
+    'DATABASE_URL': 'sqlite:///offline.sqlite3',
+    'TZ': 'America/New_York',
+    'SENDGRID_API_KEY': 'offline',
+    'DEFAULT_FROM_EMAIL': 'studio@example.com',
+    'PAYPAL_CLIENT_ID': 'offline',
+    'PAYPAL_CLIENT_SECRET': 'offline',
+    'STRIPE_SECRET_KEY': 'sk_test_offline',
+    'STRIPE_PUBLISHABLE_KEY': 'pk_test_offline',
+    'STRIPE_WEBHOOK_SECRET': 'whsec_offline',
+    'STRIPE_PRODUCT_ID': 'prod_offline',
+    'STRIPE_DISCOUNT_PRODUCT_ID': 'prod_offline_discount',
+    'WEBHOOK_URL': 'stripe/webhook/',
+}
+for key, value in OFFLINE_ENV.items():
+    os.environ.setdefault(key, value)
+
+from .settings import *  # noqa: E402,F401,F403
+from .settings import BASE_DIR  # noqa: E402
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('OFFLINE_DB', BASE_DIR / 'offline.sqlite3'),
+    }
+}
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
@@ -12,6 +12,9 @@ urlpatterns = [
     path('', home_view, name='home'),
     path('monthly-calendar/', monthly_calendar_view, name='monthly_calendar'),
     path('daily-scheduler/', daily_scheduler_view, name='daily_scheduler'),
+    path('api/availability/', availability_api_view, name='availability_api'),
+    path('live/scheduler/', scheduler_events_view, name='scheduler_events'),
+    path('live/operators/', operator_events_view, name='operator_events'),
     path('reservation/', reservation_form_view, name='reservation_form'),
     path('operator-dashboard/', operator_dashboard_view, name='operator_dashboard'),
     path('operator-console/', operator_console_view, name='operator_console'),
@@ -24,6 +27,8 @@ urlpatterns = [
     path('register/<str:token>/', register_view, name='register'),
     path('member-dashboard/', member_dashboard_view, name='member_dashboard'),
     path("admin-dashboard/", admin_dashboard, name="admin_dashboard"),
+    path("admin-dashboard/performance/", performance_view, name="performance"),
+    path("metrics", metrics_view, name="metrics"),
     path("pay-membership/", pay_membership, name="pay_membership"),
     path("cancel-membership/", cancel_membership, name="cancel_membership"),
     path('session-manager/', session_manager_view, name='session_manager'),